@@ -0,0 +1,152 @@
+"""
+Benchmarks for the time to import the PUBGIS modules, and to load the map assets the first time
+they are used.
+
+Every measurement is made in a new interpreter, so that nothing has been imported beforehand.
+The results are reported in the same way as run_benchmarks.py, and can be saved as a baseline
+and compared against in the same way.
+
+Example:
+    python benchmarks/import_time.py --repeat 5 --compare benchmarks/import_baseline.json
+    python benchmarks/import_time.py --detail pubgis.gui
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from run_benchmarks import StageTimer, DEFAULT_TOLERANCE, print_results, compare_results
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MODULES = ("pubgis.support",
+                  "pubgis.output.pubgis_json",
+                  "pubgis.map_cache",
+                  "pubgis.match",
+                  "pubgis.parallel",
+                  "pubgis.cli",
+                  "pubgis.gui")
+
+# Loading the map assets is timed separately from importing, as it is deferred until first use.
+FIRST_USE_STATEMENTS = {"first_use_full_map": "PUBGISMatch.full_map",
+                        "first_use_land_mask": "PUBGISMatch.land_mask"}
+
+TIMING_SCRIPT = """
+import time
+{setup}
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+DETAIL_COUNT = 15
+
+
+def time_statement(statement, setup=""):
+    """
+    :return: seconds taken to run statement in a new interpreter, or None if it failed
+    """
+    result = subprocess.run([sys.executable,
+                             "-c",
+                             TIMING_SCRIPT.format(setup=setup, statement=statement)],
+                            cwd=ROOT_DIR,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+
+    if result.returncode != 0:
+        return None
+
+    return float(result.stdout.split()[-1])
+
+
+def run_benchmarks(repeat):
+    timer = StageTimer()
+    unavailable = []
+
+    for module in IMPORT_MODULES:
+        for _ in range(repeat):
+            seconds = time_statement(f"import {module}")
+            if seconds is None:
+                # Optional dependencies (PyQt5 for the GUI) may not be installed.
+                unavailable.append(module)
+                break
+            timer.add(f"import {module}", seconds)
+
+    for stage, statement in FIRST_USE_STATEMENTS.items():
+        for _ in range(repeat):
+            seconds = time_statement(statement, setup="from pubgis.match import PUBGISMatch")
+            if seconds is None:
+                unavailable.append(stage)
+                break
+            timer.add(stage, seconds)
+
+    return timer.results(), unavailable
+
+
+def print_import_detail(module, count=DETAIL_COUNT):
+    # -X importtime reports the time spent importing every module, which shows which
+    # dependencies are responsible for a slow import.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT_DIR,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.rstrip()))
+
+    print(f"slowest imports (cumulative) for {module}:")
+    for cumulative, name in sorted(imports, reverse=True)[:count]:
+        print(f"{cumulative / 1000:>10.2f} ms {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import time of PUBGIS.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of times to measure each import (default: 5)")
+    parser.add_argument("--detail", metavar="MODULE",
+                        help="show the slowest imports made when importing MODULE")
+    parser.add_argument("--save-baseline", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results to this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed median slowdown before an import is considered a regression "
+                             f"(default: {DEFAULT_TOLERANCE})")
+    options = parser.parse_args(argv)
+
+    if options.detail:
+        print_import_detail(options.detail)
+        return 0
+
+    results, unavailable = run_benchmarks(options.repeat)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['stages']
+
+    print_results(results, baseline)
+    for stage in unavailable:
+        print(f"{stage}: failed, dependencies may not be installed")
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as baseline_file:
+            json.dump({'python': sys.version, 'stages': results}, baseline_file, indent=2)
+
+    if baseline:
+        regressions = compare_results(results, baseline, options.tolerance)
+        for stage, baseline_p50, p50_ms in regressions:
+            print(f"REGRESSION: {stage} median {p50_ms:.2f} ms, baseline {baseline_p50:.2f} ms")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Benchmarks for each stage of the matching pipeline.
+
+Each stage is run on the minimaps in tests/ and on synthetic minimaps cut from the full map, and
+the latency percentiles and throughput of each stage are reported.  Results can be saved as a
+baseline, and later runs compared against it to find regressions.  benchmarks/baseline.json (and
+benchmarks/import_baseline.json for import_time.py) are the recorded baselines, which include
+the platform and versions they were recorded with.
+
+Example:
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# The benchmarks are run as scripts, so the repository root needs to be on the path to import
+# pubgis without installing it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from pubgis import __version__
+from pubgis.color import Color
+from pubgis.match import PUBGISMatch, FULL_SCALE_MINIMAP, IND_OUTER_CIRCLE_RATIO, \
+    IND_INNER_CIRCLE_RATIO
+from pubgis.minimap_iterators.generic import GenericIterator
+from pubgis.minimap_iterators.images import ImageIterator
+from pubgis.minimap_iterators.video import VideoIterator
+from pubgis.support import create_slice, coordinate_offset
+# pylint: enable=wrong-import-position
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+BAD_MINIMAP_DIR = os.path.join(TESTS_DIR, "bad")
+TEST_IMAGE = os.path.join(TESTS_DIR, "test_new_image.jpg")
+
+MINIMAP_SIZE = 255
+FRAME_SIZE = (1920, 1080)
+MINIMAP_OFFSET = (1628, 796)
+
+# A stage is considered to have regressed if its median latency is this much slower than the
+# baseline.
+DEFAULT_TOLERANCE = 0.2
+
+PERCENTILES = (50, 90, 99)
+
+
+class MockIterator(GenericIterator):
+    def __init__(self, minimaps, time_step=1):
+        super().__init__()
+        self.size = MINIMAP_SIZE
+        self.time_step = time_step
+        self.minimaps = minimaps
+
+    def __iter__(self):
+        for i, minimap in enumerate(self.minimaps):
+            self.check_for_stop()
+            yield i * 100 / len(self.minimaps), i * self.time_step, minimap
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        yield
+        self.add(stage, time.perf_counter() - start)
+
+    def time_iterator(self, stage, iterator):
+        # Each item produced is timed separately.  The final call that ends the iteration
+        # isn't included.
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            if next(iterator, None) is None:
+                return
+            self.add(stage, time.perf_counter() - start)
+
+    def results(self):
+        results = {}
+
+        for stage, samples in self.samples.items():
+            samples = np.array(samples)
+            results[stage] = {'count': len(samples),
+                              'mean_ms': float(np.mean(samples) * 1000),
+                              'throughput': float(len(samples) / np.sum(samples))}
+            for percentile in PERCENTILES:
+                results[stage][f'p{percentile}_ms'] = float(np.percentile(samples, percentile)
+                                                           * 1000)
+
+        return results
+
+
+def create_synthetic_minimap(position, size=MINIMAP_SIZE):
+    # Cut the area around position out of the full map, scale it to minimap resolution and add
+    # a player indicator in the center, the same as a minimap from the game would have.
+    map_slice = create_slice(coordinate_offset(position, -(FULL_SCALE_MINIMAP // 2)),
+                             FULL_SCALE_MINIMAP)
+    minimap = cv2.resize(PUBGISMatch.full_map[map_slice], (size, size))
+    center = (size // 2, size // 2)
+    cv2.circle(minimap, center, int(size * IND_OUTER_CIRCLE_RATIO), (255, 255, 255), thickness=2)
+    cv2.circle(minimap, center, int(size * IND_INNER_CIRCLE_RATIO), (255, 255, 255), thickness=1)
+    return minimap
+
+
+def create_synthetic_path(count, seed=0):
+    # A random walk on land, with a typical on-foot speed between each position.
+    rng = np.random.RandomState(seed)
+    land_y, land_x = np.nonzero(PUBGISMatch.land_mask)
+    start = rng.randint(len(land_x))
+    scale = len(PUBGISMatch.full_map) / len(PUBGISMatch.land_mask)
+    position = np.array([land_x[start], land_y[start]]) * scale
+
+    border = FULL_SCALE_MINIMAP
+    path = []
+    for _ in range(count):
+        position = np.clip(position + rng.normal(0, 15, 2),
+                           border,
+                           len(PUBGISMatch.full_map) - border)
+        path.append(tuple(int(coord) for coord in position))
+
+    return path
+
+
+def load_fixture_minimaps():
+    minimaps = []
+    for image in sorted(os.listdir(BAD_MINIMAP_DIR)):
+        minimap = cv2.imread(os.path.join(BAD_MINIMAP_DIR, image))
+        minimaps.append(cv2.resize(minimap, (MINIMAP_SIZE, MINIMAP_SIZE)))
+    return minimaps
+
+
+def benchmark_color_diff(timer, minimaps):
+    masks = PUBGISMatch._create_masks(MINIMAP_SIZE)  # pylint: disable=protected-access
+
+    for minimap in minimaps:
+        with timer.time("color_diff"):
+            Color.calculate_color_diff(minimap, *masks)
+
+
+def benchmark_template_matching(timer, path, minimaps):
+    # pylint: disable=protected-access
+    match = PUBGISMatch(MockIterator(minimaps))
+
+    for position, minimap in zip(path, minimaps):
+        match.last_known_position = None
+        with timer.time("template_match_full_map"):
+            match._perform_template_matching(minimap)
+
+        match.pyramid_search = False
+        with timer.time("template_match_full_map_exhaustive"):
+            match._perform_template_matching(minimap)
+
+        match.fft_search = False
+        with timer.time("template_match_full_map_spatial"):
+            match._perform_template_matching(minimap)
+        match.pyramid_search = True
+        match.fft_search = True
+
+        match.last_known_position = position
+        with timer.time("template_match_context"):
+            match._perform_template_matching(minimap)
+
+
+def benchmark_process_match(timer, minimaps):
+    with timer.time("match_init"):
+        match = PUBGISMatch(MockIterator(minimaps))
+
+    timer.time_iterator("process_match", match.process_match())
+
+
+def benchmark_image_iterator(timer, temp_dir):
+    image_dir = os.path.join(temp_dir, "images")
+    os.makedirs(image_dir)
+    for i in range(20):
+        shutil.copy(TEST_IMAGE, os.path.join(image_dir, f"{i}.jpg"))
+
+    timer.time_iterator("image_iterator_minimaps", ImageIterator(BAD_MINIMAP_DIR, 1, True))
+    timer.time_iterator("image_iterator_full_frame", ImageIterator(image_dir, 1))
+
+
+def benchmark_video_iterator(timer, temp_dir, minimaps, fps=30):
+    video_file = os.path.join(temp_dir, "video.avi")
+    writer = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*'MJPG'), fps, FRAME_SIZE)
+    frame = np.zeros(FRAME_SIZE[::-1] + (3,), np.uint8)
+    minimap_slice = create_slice(MINIMAP_OFFSET, MINIMAP_SIZE)
+
+    for minimap in minimaps:
+        frame[minimap_slice] = minimap
+        writer.write(frame)
+    writer.release()
+
+    for stage, time_step in [("video_iterator_every_frame", 1 / fps),
+                             ("video_iterator_1s_step", 1)]:
+        timer.time_iterator(stage, VideoIterator(video_file=video_file, time_step=time_step))
+
+
+def run_benchmarks(num_synthetic):
+    timer = StageTimer()
+    path = create_synthetic_path(num_synthetic)
+    synthetic_minimaps = [create_synthetic_minimap(position) for position in path]
+    fixture_minimaps = load_fixture_minimaps()
+
+    benchmark_color_diff(timer, fixture_minimaps + synthetic_minimaps)
+    benchmark_template_matching(timer, path, synthetic_minimaps)
+    benchmark_process_match(timer, synthetic_minimaps)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        benchmark_image_iterator(timer, temp_dir)
+        benchmark_video_iterator(timer, temp_dir, synthetic_minimaps)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return timer.results()
+
+
+def compare_results(results, baseline, tolerance):
+    regressions = []
+
+    for stage, stage_results in results.items():
+        if stage in baseline:
+            baseline_p50 = baseline[stage]['p50_ms']
+            if stage_results['p50_ms'] > baseline_p50 * (1 + tolerance):
+                regressions.append((stage, baseline_p50, stage_results['p50_ms']))
+
+    return regressions
+
+
+def print_results(results, baseline=None):
+    header = f"{'stage':<36}{'count':>7}{'mean ms':>10}" + \
+             "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES) + f"{'per sec':>10}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+
+    for stage, stage_results in results.items():
+        line = f"{stage:<36}{stage_results['count']:>7}{stage_results['mean_ms']:>10.2f}" + \
+               "".join(f"{stage_results[f'p{p}_ms']:>10.2f}" for p in PERCENTILES) + \
+               f"{stage_results['throughput']:>10.1f}"
+        if baseline and stage in baseline:
+            line += f"{stage_results['p50_ms'] / baseline[stage]['p50_ms']:>9.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PUBGIS matching pipeline.")
+    parser.add_argument("--synthetic", type=int, default=50,
+                        help="number of synthetic minimaps to generate (default: 50)")
+    parser.add_argument("--save-baseline", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results to this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed median slowdown before a stage is considered a regression "
+                             f"(default: {DEFAULT_TOLERANCE})")
+    options = parser.parse_args(argv)
+
+    results = run_benchmarks(options.synthetic)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['stages']
+
+    print_results(results, baseline)
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as baseline_file:
+            json.dump({'version': __version__,
+                       'platform': platform.platform(),
+                       'python': platform.python_version(),
+                       'opencv': cv2.__version__,
+                       'stages': results},
+                      baseline_file,
+                      indent=2)
+
+    if baseline:
+        regressions = compare_results(results, baseline, options.tolerance)
+        for stage, baseline_p50, p50_ms in regressions:
+            print(f"REGRESSION: {stage} median {p50_ms:.2f} ms, baseline {baseline_p50:.2f} ms")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from pubgis.color import Color
+
+# process_batch matches the minimaps of a batch speculatively in this many threads.  A minimap is
+# only matched speculatively if its speculative context is no more than SPECULATIVE_MAX_SIZE_RATIO
+# times the size of the first minimap's context, as the speculative contexts grow with the
+# uncertainty of where the player will be, and the work wasted on them grows faster.
+BATCH_WORKERS = os.cpu_count()
+SPECULATIVE_MAX_SIZE_RATIO = 1.5
+
+
+class BatchMatchMixin:
+    """
+    Processing a batch of minimaps at once, for PUBGISMatch.  The minimaps are prepared together
+    and, once the player's position is known, matched speculatively in a thread pool.
+    """
+
+    def process_batch(self, minimaps, timestamps=None):
+        """
+        Find the player in each of a stack of minimaps (N x S x S x 3), continuing from the
+        current state of the match, as if process_match had processed them in order.
+
+        The color differences and grayscale minimaps of the whole stack are calculated at once,
+        and the minimaps without the player indicator are rejected before any matching.  If the
+        position is already known, the remaining minimaps are matched speculatively in a thread
+        pool, each against the context it is expected to need, which is then cut down to the
+        context it does need as the minimaps are processed in order.  cv2.matchTemplate results
+        vary very slightly with the size of the context, so positions can differ by a pixel or
+        two from process_match where matches are almost equally good.
+
+        :return: list of unscaled positions (None if the player wasn't found), in order
+        """
+        size = self.minimap_iter.size
+        minimaps = np.asarray(minimaps)
+        timestamps = [None] * len(minimaps) if timestamps is None else timestamps
+
+        color_diffs = Color.calculate_color_diffs(minimaps, *self.masks)
+        indicator_present = self._is_indicator_present(color_diffs)
+
+        gray_minimaps = np.zeros(minimaps.shape[:3], np.uint8)
+        if np.any(indicator_present):
+            # The minimaps are converted as a single image, stacked vertically.
+            gray_minimaps[indicator_present] = cv2.cvtColor(
+                np.ascontiguousarray(minimaps[indicator_present]).reshape(-1, size, 3),
+                cv2.COLOR_RGB2GRAY).reshape(-1, size, size)
+
+        positions = []
+
+        with ThreadPoolExecutor(max_workers=max(self.batch_workers or 1, 1)) as executor:
+            speculative_matches = self._submit_speculative_matches(executor,
+                                                                   gray_minimaps,
+                                                                   indicator_present,
+                                                                   timestamps)
+
+            for i, minimap in enumerate(minimaps):
+                self.current_timestamp = timestamps[i]
+                unscaled_position = self._find_position(
+                    minimap,
+                    color_diff=color_diffs[i],
+                    gray_minimap=gray_minimaps[i],
+                    speculative_match=speculative_matches[i])
+
+                self._update_missed_frames(unscaled_position)
+                self._update_last_unscaled_position(unscaled_position)
+                positions.append(unscaled_position)
+
+        return positions
+
+    def _submit_speculative_matches(self, executor, gray_minimaps, indicator_present, timestamps):
+        # Until the player has been found, the whole map is searched, and the first position
+        # found changes the context of every later minimap, so nothing can be matched ahead.
+        if self.batch_workers is None or self.batch_workers <= 1 or \
+                self.last_known_position is None:
+            return [None] * len(gray_minimaps)
+
+        speculative_matches = [None] * len(gray_minimaps)
+        max_size = None
+
+        for i, (gray_minimap, present) in enumerate(zip(gray_minimaps, indicator_present)):
+            speculative_slice = self._get_speculative_context(i, timestamps)
+            speculative_size = speculative_slice[0].stop - speculative_slice[0].start
+
+            if max_size is None:
+                max_size = speculative_size * SPECULATIVE_MAX_SIZE_RATIO
+            elif speculative_size > max_size:
+                break
+
+            if present:
+                speculative_matches[i] = (speculative_slice,
+                                          executor.submit(self._match_context,
+                                                          speculative_slice,
+                                                          gray_minimap))
+
+        return speculative_matches
+
+    def _get_speculative_context(self, index, timestamps):
+        # The context of the first minimap of the batch is already known.
+        if index == 0:
+            self.current_timestamp = timestamps[0]
+            return self._get_scaled_context()
+
+        # Later contexts depend on where the player is found in the minimaps before them.  If
+        # the tracker can predict the position, the context will be centered on a prediction
+        # made from the previous position, so it is expected to be within the uncertainty of
+        # the prediction from the current position, plus the uncertainty of a prediction one
+        # minimap ahead.  Otherwise, every position found is inside the context it was found
+        # in, so the context is inside the worst case context for index more missed frames.
+        # Either way, it's only an expectation (contexts are also pushed inwards at the edges of
+        # the map), so each speculative match is checked before being used.
+        context_center = self.last_known_position
+        context_size = self._calculate_max_travel_distance(self.missed_frames + index,
+                                                           timestamps[index])
+
+        prediction = self._predict_position(timestamps[index])
+        previous_prediction = self._predict_position(timestamps[index - 1])
+        if prediction is not None and previous_prediction is not None:
+            predicted_position, predicted_radius = prediction
+            step_radius = predicted_radius - previous_prediction[1]
+            predicted_size = 2 * int((predicted_radius + step_radius) * self.scale) + \
+                self.minimap_iter.size
+
+            if predicted_size < context_size:
+                context_center = self._clip_to_map(predicted_position)
+                context_size = predicted_size
+
+        return self._create_context_slice(context_center, context_size)
+
+    def _get_speculative_template_match(self, context_slice, speculative_match):
+        # :return: the part of the speculative match for context_slice, or None if context_slice
+        #          isn't inside the speculative context
+        if speculative_match is None or context_slice == slice(None):
+            return None
+
+        speculative_slice, template_match_future = speculative_match
+        if any(context.start < speculative.start or context.stop > speculative.stop
+               for context, speculative in zip(context_slice, speculative_slice)):
+            return None
+
+        # Each position in a template match is the top left corner of the minimap, so the
+        # match for a context is smaller than the context by the size of the minimap.
+        match_size = self.minimap_iter.size - 1
+        template_match = template_match_future.result()
+        return np.copy(template_match[tuple(slice(context.start - speculative.start,
+                                                  context.stop - speculative.start - match_size)
+                                            for context, speculative in zip(context_slice,
+                                                                            speculative_slice))])
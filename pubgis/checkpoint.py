@@ -0,0 +1,128 @@
+"""
+Checkpoints of a video being processed, so that a match that was interrupted can be resumed
+where the last checkpoint was saved, instead of from the landing time.
+
+A checkpoint holds everything needed to continue with the same output as an uninterrupted run:
+the positions and timestamps found so far, the frame of the video the last of them was read
+from, the time step at that point, and the state of the match that can't be rebuilt from the
+positions (the thumbnail used by the static frame check).  The last known position and missed
+frames are saved as well, so that the checkpoint can be inspected.
+
+Checkpoints are saved with numpy's .npz format, to a temporary file that then replaces the
+previous checkpoint, so an interruption while saving leaves the previous checkpoint intact.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from pubgis.output.pubgis_binary import create_binary_data, trajectory_to_lists
+
+# Seconds between checkpoints.  Saving writes every position found so far, so checkpoints
+# shouldn't be much more frequent than this for long videos.
+CHECKPOINT_INTERVAL = 60
+
+CHECKPOINT_EXTENSION = ".checkpoint.npz"
+
+
+class MatchCheckpoint:  # pylint: disable=too-many-instance-attributes
+    """
+    MatchCheckpoint is the saved state of a PUBGISMatch reading from a VideoIterator.  key
+    identifies the video and the options it was being processed with, so a checkpoint is never
+    resumed with different ones.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 key,
+                 map_name,
+                 positions,
+                 timestamps,
+                 frame_number,
+                 time_step,
+                 last_known_position=None,
+                 missed_frames=0,
+                 static_thumbnail=None):
+        self.key = key
+        self.map_name = map_name
+        self.positions = positions
+        self.timestamps = timestamps
+        self.frame_number = frame_number
+        self.time_step = time_step
+        self.last_known_position = last_known_position
+        self.missed_frames = missed_frames
+        self.static_thumbnail = static_thumbnail
+
+    @classmethod
+    def create(cls, key, match, video_iter, positions, timestamps):
+        """
+        Create a checkpoint of match just after it returned the last of positions.  video_iter
+        is the VideoIterator the match is reading from, which may be wrapped in another
+        iterator (a PrefetchIterator for example), so its position isn't used directly.
+        """
+        return cls(key,
+                   match.game_map.name,
+                   list(positions),
+                   list(timestamps),
+                   video_iter.get_frame_number(timestamps[-1]),
+                   video_iter.current_time_step,
+                   last_known_position=match.last_known_position,
+                   missed_frames=match.missed_frames,
+                   static_thumbnail=match.last_processed_thumbnail)
+
+    def resume(self, match, video_iter):
+        """
+        Put match and video_iter (which must not have been iterated yet) into the state they
+        were in when the checkpoint was created.
+        """
+        video_iter.resume_after(self.frame_number, self.time_step)
+        match.restore_state(self.positions,
+                            self.timestamps,
+                            last_processed_thumbnail=self.static_thumbnail)
+
+    def save(self, checkpoint_file):
+        checkpoint_dir = os.path.dirname(os.path.abspath(checkpoint_file))
+        temp_fd, temp_file = tempfile.mkstemp(dir=checkpoint_dir, suffix=".tmp")
+
+        try:
+            # Saving to an open file stops numpy adding .npz to the name.
+            with os.fdopen(temp_fd, 'wb') as checkpoint_output_file:
+                arrays = {'key': self.key,
+                          'map_name': self.map_name,
+                          'trajectory': create_binary_data(self.positions, self.timestamps),
+                          'frame_number': self.frame_number,
+                          'time_step': self.time_step,
+                          'missed_frames': self.missed_frames}
+                if self.last_known_position is not None:
+                    arrays['last_known_position'] = self.last_known_position
+                if self.static_thumbnail is not None:
+                    arrays['static_thumbnail'] = self.static_thumbnail
+
+                np.savez(checkpoint_output_file, **arrays)
+
+            os.replace(temp_file, checkpoint_file)
+        except OSError:
+            os.remove(temp_file)
+            raise
+
+    @classmethod
+    def load(cls, checkpoint_file):
+        """
+        :return: the MatchCheckpoint saved in checkpoint_file
+        """
+        with np.load(checkpoint_file) as checkpoint:
+            positions, timestamps = trajectory_to_lists(checkpoint['trajectory'])
+            last_known_position = None
+            if 'last_known_position' in checkpoint:
+                last_known_position = tuple(int(coord)
+                                            for coord in checkpoint['last_known_position'])
+
+            return cls(str(checkpoint['key']),
+                       str(checkpoint['map_name']),
+                       positions,
+                       timestamps,
+                       int(checkpoint['frame_number']),
+                       float(checkpoint['time_step']),
+                       last_known_position=last_known_position,
+                       missed_frames=int(checkpoint['missed_frames']),
+                       static_thumbnail=checkpoint['static_thumbnail']
+                       if 'static_thumbnail' in checkpoint else None)
@@ -0,0 +1,404 @@
+"""
+Headless command line interface for processing videos without the GUI.
+
+This module must not import PyQt5 (directly or through pubgis.gui), so that it can be used on
+machines without a display.
+
+Example:
+    python -m pubgis.cli videos/*.mp4 --landing-time 2:30 --time-step 0.5 --output json cropped
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from pubgis.checkpoint import MatchCheckpoint, CHECKPOINT_INTERVAL, CHECKPOINT_EXTENSION
+from pubgis.color import Color, Space
+from pubgis.map_cache import MapCache, DEFAULT_CACHE_DIR
+from pubgis.maps import MAPS, AUTO_MAP, DEFAULT_MAP, get_map, get_available_maps, use_map_store, \
+    set_registered_maps
+from pubgis.match import PUBGISMatch
+from pubgis.match_stats import MatchStats
+from pubgis.minimap_iterators.generic import ResolutionNotSupportedException
+from pubgis.minimap_iterators.prefetch import PrefetchIterator
+from pubgis.minimap_iterators.video import VideoIterator, DEFAULT_STEP
+from pubgis.output.output_enum import OutputFlags
+from pubgis.output.plotting import PATH_COLOR, PATH_THICKNESS, plot_path, create_output_opencv
+from pubgis.output.pubgis_binary import output_binary, create_binary_data, BINARY_EXTENSION
+from pubgis.output.pubgis_json import output_json, create_json_data
+from pubgis.parallel import SegmentedVideoMatch
+from pubgis.result_cache import ResultCache, create_result_key, DEFAULT_RESULT_CACHE_SIZE
+
+OUTPUT_CHOICES = {'cropped': OutputFlags.CROPPED_MAP,
+                  'full': OutputFlags.FULL_MAP,
+                  'json': OutputFlags.JSON,
+                  'binary': OutputFlags.BINARY}
+
+
+def parse_time(time_string):
+    """
+    Convert a time given as seconds ("90"), minutes:seconds ("1:30")
+    or hours:minutes:seconds ("0:01:30") to seconds.
+    """
+    try:
+        seconds = 0
+        for part in time_string.split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time: {time_string}")
+
+    return seconds
+
+
+def parse_color(color_string):
+    try:
+        colors = tuple(int(c) for c in color_string.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid color: {color_string}")
+
+    if len(colors) != 3 or not all(0 <= c <= 255 for c in colors):
+        raise argparse.ArgumentTypeError(f"color must be R,G,B with values 0-255: {color_string}")
+
+    return colors
+
+
+def expand_video_paths(video_args):
+    # Shells on Windows don't expand wildcards, so globs are expanded here as well.
+    video_files = []
+    for video_arg in video_args:
+        video_files.extend(sorted(glob.glob(video_arg)) or [video_arg])
+    return video_files
+
+
+def get_output_file(video_file, output_dir):
+    video_name = os.path.splitext(os.path.basename(video_file))[0]
+    return os.path.join(output_dir or os.path.dirname(video_file), video_name + ".jpg")
+
+
+def write_outputs(output_file,  # pylint: disable=too-many-arguments
+                  positions,
+                  timestamps,
+                  output_flags,
+                  path_color=PATH_COLOR,
+                  thickness=PATH_THICKNESS,
+                  game_map=None):
+    if output_flags & (OutputFlags.FULL_MAP | OutputFlags.CROPPED_MAP):
+        full_map = (game_map or get_map(DEFAULT_MAP)).full_map
+        path_map = np.copy(full_map)
+        plot_path(path_map, positions, path_color(), thickness)
+        alpha = path_color.alpha
+        # The path map isn't needed after blending, so the result replaces it in place.
+        blended = cv2.addWeighted(full_map, 1 - alpha, path_map, alpha, 0, dst=path_map)
+        create_output_opencv(blended,
+                             positions,
+                             output_file,
+                             full_map=bool(output_flags & OutputFlags.FULL_MAP))
+
+    if output_flags & OutputFlags.JSON:
+        pre, _ = os.path.splitext(output_file)
+        output_json(pre + ".json", create_json_data(positions, timestamps))
+
+    if output_flags & OutputFlags.BINARY:
+        pre, _ = os.path.splitext(output_file)
+        output_binary(pre + BINARY_EXTENSION, create_binary_data(positions, timestamps))
+
+
+def create_options_key(video_file, options):
+    # Only the options that change the positions found are part of the key.  The number of
+    # processes is included because segments are matched independently.
+    return create_result_key(video_file,
+                             landing_time=options.landing_time,
+                             death_time=options.death_time,
+                             time_step=options.time_step,
+                             max_time_step=options.max_time_step,
+                             game_map=options.map,
+                             processes=options.processes)
+
+
+def match_video(video_file, options, checkpoint_file=None):
+    """
+    Find the player's positions in a single video.  With a checkpoint_file, a checkpoint is
+    saved to it every options.checkpoint_interval seconds, and with options.resume, matching
+    continues from the checkpoint already in it.
+
+    :return: (positions, timestamps, GameMap, MatchStats or None)
+    """
+    stats = None
+    positions = []
+    timestamps = []
+
+    if options.cache_dir:
+        use_map_store(MapCache(options.cache_dir))
+
+    if options.processes > 1:
+        match = SegmentedVideoMatch(video_file,
+                                    landing_time=options.landing_time,
+                                    time_step=options.time_step,
+                                    death_time=options.death_time,
+                                    processes=options.processes,
+                                    cache_dir=options.cache_dir,
+                                    game_map=options.map)
+        checkpoint_file = None
+    else:
+        checkpoint = None
+        if checkpoint_file:
+            checkpoint_key = create_options_key(video_file, options)
+
+            if options.resume and os.path.exists(checkpoint_file):
+                checkpoint = MatchCheckpoint.load(checkpoint_file)
+                if checkpoint.key != checkpoint_key:
+                    raise ValueError("the checkpoint was saved with different options")
+
+        video_iter = VideoIterator(video_file=video_file,
+                                   landing_time=options.landing_time,
+                                   time_step=options.time_step,
+                                   death_time=options.death_time,
+                                   max_time_step=options.max_time_step)
+        minimap_iter = video_iter
+
+        # Reading ahead would delay the time step adapting to the player's movement.
+        if options.max_time_step is None:
+            minimap_iter = PrefetchIterator(video_iter)
+
+        stats = MatchStats() if options.stats else None
+        match = PUBGISMatch(minimap_iter,
+                            cache_dir=options.cache_dir,
+                            stats=stats,
+                            game_map=checkpoint.map_name if checkpoint else options.map)
+
+        # The iterator must be resumed before PrefetchIterator starts reading from it, which is
+        # when process_match starts.
+        if checkpoint:
+            checkpoint.resume(match, video_iter)
+            positions.extend(checkpoint.positions)
+            timestamps.extend(checkpoint.timestamps)
+
+    last_checkpoint_time = time.monotonic()
+
+    for _, timestamp, position in match.process_match():
+        positions.append(position)
+        timestamps.append(timestamp)
+
+        if checkpoint_file and \
+                time.monotonic() - last_checkpoint_time >= options.checkpoint_interval:
+            MatchCheckpoint.create(checkpoint_key,
+                                   match,
+                                   video_iter,
+                                   positions,
+                                   timestamps).save(checkpoint_file)
+            last_checkpoint_time = time.monotonic()
+
+    # The match finished, so there's nothing left to resume.
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    return positions, timestamps, match.game_map, stats
+
+
+def process_video(video_file, output_file, options):
+    """
+    Process a single video and write the requested outputs.  With a result cache, the positions
+    are taken from the cache if the video was already processed with the same parameters.
+
+    :return: (number of time steps processed, number of positions found, name of the map)
+    """
+    cached_result = None
+
+    if options.result_cache:
+        result_cache = ResultCache(options.result_cache,
+                                   max_size=int(options.result_cache_size * 1024 * 1024))
+        result_key = create_options_key(video_file, options)
+
+        # Statistics are only collected while matching, so a cached result can't be used.
+        if not options.stats:
+            cached_result = result_cache.load(result_key)
+
+    if cached_result is not None:
+        positions, timestamps, map_name = cached_result
+        game_map = get_map(map_name)
+        stats = None
+    else:
+        checkpoint_file = None
+        if options.checkpoint_interval is not None:
+            checkpoint_file = os.path.splitext(output_file)[0] + CHECKPOINT_EXTENSION
+
+        positions, timestamps, game_map, stats = match_video(video_file, options, checkpoint_file)
+
+        if options.result_cache:
+            result_cache.store(result_key, positions, timestamps, game_map.name)
+
+    write_outputs(output_file,
+                  positions,
+                  timestamps,
+                  options.output_flags,
+                  path_color=Color([c / 255 for c in options.color], alpha=options.alpha),
+                  thickness=options.thickness,
+                  game_map=game_map)
+
+    if stats:
+        pre, _ = os.path.splitext(output_file)
+        if options.stats == 'csv':
+            stats.output_csv(pre + ".stats.csv")
+        else:
+            stats.output_json(pre + ".stats.json")
+
+    return len(positions), sum(position is not None for position in positions), game_map.name
+
+
+def _process_video_job(video_file, output_file, options, game_maps=None):
+    # A job running in another process is given the maps registered in the main process, as
+    # they aren't inherited by processes that are spawned.
+    if game_maps is not None:
+        set_registered_maps(game_maps)
+
+    try:
+        steps, found, map_name = process_video(video_file, output_file, options)
+        return f"{video_file}: {found}/{steps} positions found on {map_name} -> {output_file}", \
+            True
+    except FileNotFoundError:
+        return f"{video_file}: video file not found", False
+    except ValueError as error:
+        return f"{video_file}: {error}", False
+    except ResolutionNotSupportedException:
+        return f"{video_file}: resolution not supported", False
+    except Exception as error:  # pylint: disable=broad-except
+        # Anything else (a cv2.error from a corrupt video, for example) only fails this video,
+        # the rest of the videos are still processed.
+        return f"{video_file}: {type(error).__name__}: {error}", False
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pubgis.cli",
+                                     description="Process PUBG videos without the GUI.")
+    parser.add_argument("videos", nargs='+', help="video files or glob patterns")
+    parser.add_argument("--landing-time", type=parse_time, default=0,
+                        help="time of landing, as seconds, M:SS or H:MM:SS (default: 0)")
+    parser.add_argument("--death-time", type=parse_time, default=0,
+                        help="time of death, as seconds, M:SS or H:MM:SS (default: end of video)")
+    parser.add_argument("--map",
+                        choices=[AUTO_MAP] + [game_map.name for game_map in get_available_maps()],
+                        default=AUTO_MAP,
+                        help="map the videos were recorded on, or auto to identify the map of "
+                             "each video from its first minimaps (default: auto)")
+    parser.add_argument("--time-step", type=float, default=DEFAULT_STEP,
+                        help=f"seconds between processed frames (default: {DEFAULT_STEP})")
+    parser.add_argument("--max-time-step", type=float,
+                        help="adapt the seconds between processed frames to the player's "
+                             "movement, from --time-step up to this while the player is barely "
+                             "moving (not available with --processes)")
+    parser.add_argument("--output", nargs='+', choices=OUTPUT_CHOICES, default=['cropped'],
+                        help="outputs to create for each video (default: cropped)")
+    parser.add_argument("--output-dir",
+                        help="directory for output files (default: next to each video)")
+    parser.add_argument("--color",
+                        type=parse_color,
+                        default=tuple(int(c) for c in PATH_COLOR(space=Space.RGB)),
+                        help="path color as R,G,B (default: red)")
+    parser.add_argument("--alpha", type=float, default=PATH_COLOR.alpha,
+                        help=f"path opacity, 0-1 (default: {PATH_COLOR.alpha})")
+    parser.add_argument("--thickness", type=int, default=PATH_THICKNESS,
+                        help=f"path thickness in pixels (default: {PATH_THICKNESS})")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of videos to process at the same time (default: 1)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of processes to split each video across (default: 1)")
+    parser.add_argument("--stats", choices=['json', 'csv'],
+                        help="write per-frame processing statistics next to each output "
+                             "(not available with --processes)")
+    parser.add_argument("--cache-dir",
+                        help="directory to cache the decoded and scaled maps in between runs "
+                             "(default: none, or ~/.pubgis/cache with --jobs or --processes, "
+                             "so that all processes share one copy of the map)")
+    parser.add_argument("--result-cache",
+                        help="directory to cache the positions found for each video in, so "
+                             "videos processed again with the same matching options only need "
+                             "their outputs created (default: none)")
+    parser.add_argument("--result-cache-size", type=float,
+                        default=DEFAULT_RESULT_CACHE_SIZE / (1024 * 1024),
+                        help=f"size in MB the result cache is limited to, by removing the least "
+                             f"recently used results "
+                             f"(default: {DEFAULT_RESULT_CACHE_SIZE // (1024 * 1024)})")
+    parser.add_argument("--checkpoint-interval", type=float,
+                        help=f"save a checkpoint next to each output every this many seconds, "
+                             f"so an interrupted video can be resumed with --resume (default: "
+                             f"no checkpoints, or {CHECKPOINT_INTERVAL} with --resume; not "
+                             f"available with --processes)")
+    parser.add_argument("--resume", action='store_true',
+                        help="continue each video from its checkpoint, if it has one")
+    return parser
+
+
+def _validate_options(parser, options):
+    """
+    Exit with a usage error (from parser) if options can't be used together, and fill in the
+    options implied by others.
+    """
+    if options.jobs < 1 or options.processes < 1:
+        parser.error("--jobs and --processes must be at least 1")
+
+    if options.jobs > 1 and options.processes > 1:
+        parser.error("--jobs and --processes can't both be greater than 1")
+
+    if options.stats and options.processes > 1:
+        parser.error("--stats isn't available with --processes")
+
+    if options.max_time_step is not None:
+        if options.max_time_step < options.time_step:
+            parser.error("--max-time-step must be at least --time-step")
+
+        if options.processes > 1:
+            parser.error("--max-time-step isn't available with --processes")
+
+    if options.resume and options.checkpoint_interval is None:
+        options.checkpoint_interval = CHECKPOINT_INTERVAL
+
+    if options.checkpoint_interval is not None and options.processes > 1:
+        parser.error("--checkpoint-interval and --resume aren't available with --processes")
+
+    if options.output_dir and not os.path.isdir(options.output_dir):
+        parser.error(f"output directory doesn't exist: {options.output_dir}")
+
+
+def main(argv=None):
+    parser = build_parser()
+    options = parser.parse_args(argv)
+
+    _validate_options(parser, options)
+
+    # Each process would otherwise decode its own private copy of the full map.
+    if options.cache_dir is None and (options.jobs > 1 or options.processes > 1):
+        options.cache_dir = DEFAULT_CACHE_DIR
+
+    options.output_flags = OutputFlags.NO_OUTPUT
+    for output in options.output:
+        options.output_flags |= OUTPUT_CHOICES[output]
+
+    video_files = expand_video_paths(options.videos)
+    jobs = [(video_file, get_output_file(video_file, options.output_dir), options)
+            for video_file in video_files]
+
+    if options.jobs > 1:
+        with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+            results = executor.map(_process_video_job,
+                                   *zip(*jobs),
+                                   [list(MAPS.values())] * len(jobs))
+            results = list(_print_results(results))
+    else:
+        results = list(_print_results(_process_video_job(*job) for job in jobs))
+
+    return 0 if all(results) else 1
+
+
+def _print_results(results):
+    for message, success in results:
+        print(message, file=sys.stdout if success else sys.stderr, flush=True)
+        yield success
+
+
+if __name__ == "__main__":
+    sys.exit(main())
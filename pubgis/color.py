@@ -2,6 +2,7 @@ from enum import IntFlag
 from math import sqrt
 
 import cv2
+import numpy as np
 
 
 class Space(IntFlag):
@@ -66,3 +67,24 @@ class Color:
         color_diff = sqrt(sum([(c1 - c2) ** 2 for c1, c2 in zip(color_1(), color_2())]))
 
         return color_diff
+
+    @staticmethod
+    def calculate_color_diffs(images, mask_1, mask_2):
+        """
+        The same as calculate_color_diff, for every image in a stack of images (N x H x W x 3)
+        at once.
+
+        :return: array of the N color differences
+        """
+        masks = np.stack((mask_1.reshape(-1), mask_2.reshape(-1)), axis=1) > 0
+
+        # Only the pixels inside either mask are needed for the means.
+        masked_pixels = np.flatnonzero(masks.any(axis=1))
+        weights = masks[masked_pixels].astype(np.float64)
+        weights /= np.maximum(weights.sum(axis=0), 1)
+
+        pixels = np.asarray(images).reshape(len(images), -1, 3)[:, masked_pixels]
+        # means has the mean of each channel inside each mask, (N x 3 x 2)
+        means = np.matmul(pixels.transpose(0, 2, 1), weights)
+
+        return np.sqrt(np.sum(np.square(means[:, :, 0] - means[:, :, 1]), axis=1))
@@ -0,0 +1,23 @@
+"""
+Compile pubgis_gui.ui to a Python module, so the GUI doesn't need to parse the .ui file with uic
+every time it starts.  The GUI falls back to loading the .ui file if the compiled module is
+missing or older than the .ui file.
+
+Example:
+    python -m pubgis.compile_ui
+"""
+from os.path import join, dirname
+
+from PyQt5 import uic
+
+UI_FILE = join(dirname(__file__), "pubgis_gui.ui")
+UI_MODULE_FILE = join(dirname(__file__), "pubgis_gui_ui.py")
+
+
+def compile_ui(ui_file=UI_FILE, module_file=UI_MODULE_FILE):
+    with open(module_file, 'w') as ui_module:
+        uic.compileUi(ui_file, ui_module)
+
+
+if __name__ == "__main__":
+    compile_ui()
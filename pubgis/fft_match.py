@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# The image is split into square tiles of FFT_TILE_SIZE for the DFT.  Larger tiles waste less of
+# each tile on the overlap between tiles, but use more memory for each tile.
+FFT_TILE_SIZE = 1024
+
+# Bytes of tiles kept by each FFTTemplateMatcher.  This is enough for the tiles around the
+# player's recent positions, without keeping every tile of the map (over 300 MB for a 1080p
+# video) once the whole map has been searched.
+FFT_TILE_CACHE_SIZE = 128 * 1024 * 1024
+
+# The same thresholds cv2.matchTemplate uses to handle windows and templates with (almost) no
+# variation, so the results for them are the same.
+FLT_EPSILON = np.finfo(np.float32).eps
+DBL_EPSILON = np.finfo(np.float64).eps
+
+
+class FFTTemplateMatcher:  # pylint: disable=too-many-instance-attributes
+    """
+    FFTTemplateMatcher gives the same result as cv2.matchTemplate with cv2.TM_CCOEFF_NORMED for
+    an image and square templates of template_size, by cross-correlating them in the frequency
+    domain.
+
+    The image is split into overlapping tiles.  The DFT of each tile, and the norm of every
+    template sized window in it, only depend on the image, so they are calculated the first time
+    a tile is used and kept for every later match.  Each match then only needs the DFT of the
+    template and an inverse DFT for each tile, instead of transforming the image every time as
+    cv2.matchTemplate does.  This is faster for large search areas, but every tile kept uses
+    about 6 bytes for each pixel of the tile, so only the most recently used tiles are kept, up
+    to cache_size bytes.
+
+    The tiles are shared by every thread using the matcher.
+    """
+
+    def __init__(self, image, template_size, tile_size=FFT_TILE_SIZE,
+                 cache_size=FFT_TILE_CACHE_SIZE):
+        self.image = image
+        self.template_size = template_size
+        self.tile_size = max(tile_size, cv2.getOptimalDFTSize(2 * template_size))
+
+        # Each tile gives the results for tile_step positions in each direction.  The rest of the
+        # tile is the overlap needed for the template at the last of those positions.
+        self.tile_step = self.tile_size - template_size + 1
+        self.cache_size = cache_size
+        self.tiles = OrderedDict()
+        self.tiles_size = 0
+        self.lock = threading.Lock()
+
+    def _get_tile(self, tile_y, tile_x):
+        key = (tile_y, tile_x)
+
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+
+        # The tile is created without holding the lock, so other threads can use the tiles that
+        # are already kept in the meantime.
+        tile_y_coord = tile_y * self.tile_step
+        tile_x_coord = tile_x * self.tile_step
+        image_tile = np.zeros((self.tile_size, self.tile_size), np.float32)
+        image_part = self.image[tile_y_coord:tile_y_coord + self.tile_size,
+                                tile_x_coord:tile_x_coord + self.tile_size]
+        image_tile[:image_part.shape[0], :image_part.shape[1]] = image_part
+
+        tile = cv2.dft(image_tile), self._calculate_window_norms(image_tile)
+
+        with self.lock:
+            # Another thread may have created the same tile first.
+            if key not in self.tiles:
+                self.tiles[key] = tile
+                self.tiles_size += sum(array.nbytes for array in tile)
+
+                # The tile that was just created is always kept, even if it's larger than the
+                # cache, as it's about to be used.
+                while self.tiles_size > self.cache_size and len(self.tiles) > 1:
+                    _, evicted_tile = self.tiles.popitem(last=False)
+                    self.tiles_size -= sum(array.nbytes for array in evicted_tile)
+
+        return tile
+
+    def _calculate_window_norms(self, image_tile):
+        # The norm of each window (minus its mean) is calculated from the integral images, the
+        # same way as cv2.matchTemplate.
+        size = self.template_size
+        step = self.tile_step
+        tile_sum, tile_sq_sum = cv2.integral2(image_tile, sdepth=cv2.CV_64F)
+
+        def window_sums(integral):
+            return integral[size:, size:] - integral[:step, size:] - \
+                integral[size:, :step] + integral[:step, :step]
+
+        window_sq_sums = window_sums(tile_sq_sum)
+        window_variances = np.maximum(window_sq_sums - np.square(window_sums(tile_sum)) /
+                                      (size * size), 0)
+
+        window_norms = np.sqrt(window_variances)
+        window_norms[window_variances <= np.minimum(0.5, 10 * FLT_EPSILON * window_sq_sums)] = 0
+        return window_norms.astype(np.float32)
+
+    def match(self, template, region_slice=slice(None)):
+        """
+        Match template against the region of the image in region_slice.
+
+        :return: the same as cv2.matchTemplate(image[region_slice], template,
+                 cv2.TM_CCOEFF_NORMED)
+        """
+        if not isinstance(region_slice, tuple):
+            region_slice = (region_slice, region_slice)
+
+        region_start, result_shape = self._get_region(region_slice)
+        template_dft, template_norm = self._transform_template(template)
+
+        if template_dft is None:
+            return np.ones(result_shape, np.float32)
+
+        result = np.empty(result_shape, np.float32)
+
+        for tile_y in range(region_start[0] // self.tile_step,
+                            (region_start[0] + result_shape[0] - 1) // self.tile_step + 1):
+            for tile_x in range(region_start[1] // self.tile_step,
+                                (region_start[1] + result_shape[1] - 1) // self.tile_step + 1):
+                tile_dft, window_norms = self._get_tile(tile_y, tile_x)
+
+                # Correlating with the zero mean template gives the numerator of the normalized
+                # correlation coefficient directly, as the window mean multiplied by the
+                # template sums to 0.
+                correlation = cv2.idft(cv2.mulSpectrums(tile_dft, template_dft, 0, conjB=True),
+                                       flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+
+                tile_slice, result_slice = self._get_tile_slices((tile_y, tile_x),
+                                                                 region_start,
+                                                                 result_shape)
+                result[result_slice] = _normalize(correlation[tile_slice],
+                                                  cv2.multiply(window_norms[tile_slice],
+                                                               template_norm))
+
+        return result
+
+    def _get_region(self, region_slice):
+        """
+        :return: the (y, x) start of the region of the image in region_slice, and the shape of the
+                 match result for it
+        """
+        region_start = []
+        result_shape = []
+
+        for axis_slice, image_size in zip(region_slice, self.image.shape):
+            start, stop, _ = axis_slice.indices(image_size)
+            region_start.append(start)
+            result_shape.append(stop - start - self.template_size + 1)
+
+        return tuple(region_start), tuple(result_shape)
+
+    def _transform_template(self, template):
+        """
+        :return: the DFT of the zero mean template (padded to the tile size) and its norm.  The
+                 DFT is None if the template has no variation.
+        """
+        zero_mean_template = template.astype(np.float32)
+        zero_mean_template -= np.mean(zero_mean_template)
+        template_norm = np.sqrt(np.sum(np.square(zero_mean_template, dtype=np.float64)))
+
+        if template_norm < DBL_EPSILON:
+            return None, template_norm
+
+        padded_template = np.zeros((self.tile_size, self.tile_size), np.float32)
+        padded_template[:self.template_size, :self.template_size] = zero_mean_template
+        return cv2.dft(padded_template), template_norm
+
+    def _get_tile_slices(self, tile_index, region_start, result_shape):
+        """
+        :return: the slices of the tile at tile_index (y, x) and of the result, for the part of
+                 the region the tile has results for
+        """
+        tile_slice = []
+        result_slice = []
+
+        for tile, start, size in zip(tile_index, region_start, result_shape):
+            # The part of the region this tile has results for, in image coordinates.
+            tile_start = tile * self.tile_step
+            coords = (max(start, tile_start), min(start + size, tile_start + self.tile_step))
+            tile_slice.append(slice(*(coord - tile_start for coord in coords)))
+            result_slice.append(slice(*(coord - start for coord in coords)))
+
+        return tuple(tile_slice), tuple(result_slice)
+
+def _normalize(numerator, denominator):
+    # This is how cv2.matchTemplate normalizes, including results that are slightly out of range
+    # due to rounding, and windows without any variation, which are 0.  Older versions of
+    # cv2.divide give 0 for those, newer versions give NaN or infinity.
+    normalized = cv2.divide(numerator, denominator)
+    normalized[denominator == 0] = 0
+    out_of_range = np.abs(normalized) >= 1
+
+    if np.any(out_of_range):
+        out_of_range_values = normalized[out_of_range]
+        normalized[out_of_range] = np.where(np.abs(out_of_range_values) < 1.125,
+                                            np.sign(out_of_range_values),
+                                            0)
+
+    return normalized
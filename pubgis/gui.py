@@ -1,11 +1,12 @@
 import os
+import tempfile
+import time
 from datetime import datetime
 from enum import IntEnum, Flag, auto
 
 import cv2
-import mss
 import numpy as np
-from PyQt5 import QtCore, uic
+from PyQt5 import QtCore
 from PyQt5.QtCore import QThread, QTime, Qt, QRectF, QDir
 from PyQt5.QtGui import QPixmap, QImage, QColor, QIcon
 from PyQt5.QtWidgets import QMainWindow, QFileDialog, QGraphicsScene, QColorDialog, QMessageBox
@@ -14,16 +15,34 @@ from pubgis import __version__
 from pubgis.color import Color, Scaling
 from pubgis.match import PUBGISMatch
 from pubgis.minimap_iterators.generic import ResolutionNotSupportedException
-from pubgis.minimap_iterators.live import LiveFeed
+from pubgis.minimap_iterators.prefetch import PrefetchIterator
 from pubgis.minimap_iterators.video import VideoIterator
+from pubgis.output.pubgis_binary import TrajectoryWriter, BINARY_EXTENSION, trajectory_to_lists, \
+    input_binary
 from pubgis.output.pubgis_json import output_json, create_json_data
 from pubgis.output.output_enum import OutputFlags
 from pubgis.output.plotting import PATH_COLOR, PATH_THICKNESS
 from pubgis.output.plotting import plot_coordinate_line, create_output_opencv
-from pubgis.support import find_path_bounds, create_slice
+from pubgis.support import find_path_bounds, create_slice, find_line_bounds, update_path_extent
+
+# pubgis_gui_ui is created from the .ui file by pubgis.compile_ui, and is faster to load than
+# parsing the .ui file.
+try:
+    from pubgis import pubgis_gui_ui
+except ImportError:
+    pubgis_gui_ui = None  # pylint: disable=invalid-name
+
+UI_FILE = os.path.join(os.path.dirname(__file__), "pubgis_gui.ui")
 
 PATH_PREVIEW_POINTS = [(0, 0), (206, 100), (50, 50), (10, 180)]
 
+# The live preview isn't updated more often than a typical display refreshes.
+PREVIEW_MAX_FPS = 60
+
+# Live sessions write their positions to this file in the output directory, so that a session
+# that was interrupted by a crash can be resumed by the next one.
+LIVE_TRAJECTORY_FILE = "pubgis_live" + BINARY_EXTENSION
+
 
 class ProcessMode(IntEnum):
     VIDEO = 0
@@ -40,81 +59,176 @@ class PUBGISWorkerThread(QThread):  # pylint: disable=too-many-instance-attribut
     percent_max_update = QtCore.pyqtSignal(int)
     minimap_update = QtCore.pyqtSignal(np.ndarray)
 
-    def __init__(self, parent, minimap_iterator, output_file, output_flags):
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 parent,
+                 minimap_iterator,
+                 output_file,
+                 output_flags,
+                 trajectory_file=None,
+                 resume=False):
         super(PUBGISWorkerThread, self).__init__(parent)
         self.parent = parent
         self.minimap_iterator = minimap_iterator
         self.output_file = output_file
-        self.full_positions = []
-        self.timestamps = []
-        self.base_map_alpha = cv2.cvtColor(PUBGISMatch.full_map, cv2.COLOR_BGR2BGRA)
-        self.preview_map = cv2.cvtColor(PUBGISMatch.full_map, cv2.COLOR_BGR2BGRA)
+        # Positions are written to the trajectory file as they're found rather than kept in
+        # memory, so nothing is lost if processing crashes, and a live session that crashed can
+        # be resumed from the file.  Without a trajectory_file, a temporary file next to the
+        # output is used.  Once processing finishes, the file is only kept (moved to binary_file)
+        # if the binary output is selected, so an existing binary output is never overwritten
+        # otherwise.
+        pre, _ = os.path.splitext(output_file)
+        self.binary_file = pre + BINARY_EXTENSION
+        self.trajectory_file = trajectory_file
+        self.resume = resume
+        # The full map is only read, so it's used directly as the base instead of a copy.
+        self.base_map = PUBGISMatch.full_map
+        self.preview_map = np.copy(self.base_map)
+        # The composite is the base map blended with the path.  Only the area around each new
+        # line is blended as it's drawn, rather than blending the whole path every frame.
+        self.composite_map = np.copy(self.base_map)
+        self.last_valid_position = None
+        self.path_extent = None
+        self.last_preview_time = None
         self.output_flags = output_flags
 
+    def _draw_position(self, full_position, color, thickness, alpha):
+        if full_position is None:
+            return
+
+        if self.last_valid_position is not None:
+            plot_coordinate_line(self.preview_map,
+                                 [self.last_valid_position],
+                                 full_position,
+                                 color,
+                                 thickness)
+
+            line_slice = find_line_bounds(self.last_valid_position,
+                                          full_position,
+                                          thickness,
+                                          self.preview_map.shape[0])
+            cv2.addWeighted(self.base_map[line_slice],
+                            1 - alpha,
+                            self.preview_map[line_slice],
+                            alpha,
+                            0,
+                            dst=self.composite_map[line_slice])
+
+        self.last_valid_position = full_position
+        self.path_extent = update_path_extent(self.path_extent, full_position)
+
+    def _emit_preview(self, force=False):
+        """
+        :return: True if the preview was emitted, False if it was skipped by the rate limit
+        """
+        # Emitting more often than the display can refresh just queues up images for the GUI
+        # thread to convert and draw.
+        now = time.monotonic()
+        if not force and self.last_preview_time is not None and \
+                now - self.last_preview_time < 1 / PREVIEW_MAX_FPS:
+            return False
+
+        self.last_preview_time = now
+        path_corners = list(self.path_extent) if self.path_extent else None
+        preview_coords, preview_size = find_path_bounds(self.composite_map.shape[0], path_corners)
+
+        # The composite keeps changing after the signal is emitted, so the GUI thread gets a copy.
+        self.minimap_update.emit(np.copy(self.composite_map[create_slice(preview_coords,
+                                                                         preview_size)]))
+        return True
+
     def run(self):
         self.percent_max_update.emit(0)
         self.percent_update.emit(0)
 
         match = PUBGISMatch(self.minimap_iterator)
 
-        self.minimap_update.emit(self.preview_map)
-
-        for percent, timestamp, full_position in match.process_match():
-            if percent is not None:
-                self.percent_max_update.emit(100)
-                self.percent_update.emit(percent)
+        color = self.parent.path_color()
+        alpha = self.parent.path_color.alpha
+        thickness = self.parent.thickness_spinbox.value()
+        preview_pending = False
 
-            plot_coordinate_line(self.preview_map,
-                                 self.full_positions,
-                                 full_position,
-                                 self.parent.path_color(),
-                                 self.parent.thickness_spinbox.value())
+        if self.trajectory_file is None:
+            # The temporary file is in the output directory, so it can be moved to binary_file.
+            trajectory_fd, self.trajectory_file = tempfile.mkstemp(
+                suffix=BINARY_EXTENSION,
+                dir=os.path.dirname(os.path.abspath(self.output_file)))
+            os.close(trajectory_fd)
 
-            self.full_positions.append(full_position)
-            self.timestamps.append(timestamp)
+        with TrajectoryWriter(self.trajectory_file, resume=self.resume) as trajectory_writer:
+            self._restore_trajectory(match, trajectory_writer.previous, color, thickness, alpha)
 
-            if self.output_flags & OutputFlags.LIVE_PREVIEW:
-                preview_coords, preview_size = find_path_bounds(PUBGISMatch.full_map.shape[0],
-                                                                self.full_positions)
+            for percent, timestamp, full_position in match.process_match():
+                if percent is not None:
+                    self.percent_max_update.emit(100)
+                    self.percent_update.emit(percent)
 
-                preview_slice = create_slice(preview_coords, preview_size)
+                self._draw_position(full_position, color, thickness, alpha)
+                trajectory_writer.write(timestamp, full_position)
 
-                alpha = self.parent.path_color.alpha
-                blended = cv2.addWeighted(self.base_map_alpha[preview_slice],
-                                          1 - alpha,
-                                          self.preview_map[preview_slice],
-                                          alpha,
-                                          0)
+                if self.output_flags & OutputFlags.LIVE_PREVIEW:
+                    preview_pending = not self._emit_preview()
 
-                self.minimap_update.emit(blended)
+                if self.isInterruptionRequested():
+                    self.minimap_iterator.stop()
 
-            if self.isInterruptionRequested():
-                self.minimap_iterator.stop()
+        # The last positions may have been skipped by the rate limit.
+        if preview_pending:
+            self._emit_preview(force=True)
 
         if self.isInterruptionRequested():
             self.percent_max_update.emit(100)
 
         self.percent_update.emit(100)
 
-        alpha = self.parent.path_color.alpha
+        self._write_outputs()
+
+    def _restore_trajectory(self,  # pylint: disable=too-many-arguments
+                            match,
+                            previous_trajectory,
+                            color,
+                            thickness,
+                            alpha):
+        # A resumed session continues from (and draws) the positions already in the trajectory.
+        if len(previous_trajectory):
+            previous_positions, previous_timestamps = trajectory_to_lists(previous_trajectory)
+            match.restore_state(previous_positions, previous_timestamps)
+            for full_position in previous_positions:
+                self._draw_position(full_position, color, thickness, alpha)
+            self.minimap_update.emit(np.copy(self.composite_map))
+        else:
+            self.minimap_update.emit(self.preview_map)
+
+    def _write_outputs(self):
+        # The corners of the path have the same bounds as the whole path.
+        path_corners = list(self.path_extent) if self.path_extent else None
 
         if self.output_flags & OutputFlags.FULL_MAP:
-            blended = cv2.addWeighted(self.base_map_alpha, 1 - alpha, self.preview_map, alpha, 0)
-            create_output_opencv(blended,
-                                 self.full_positions,
+            create_output_opencv(self.composite_map,
+                                 path_corners,
                                  self.output_file,
                                  full_map=True)
         elif self.output_flags & OutputFlags.CROPPED_MAP:
-            blended = cv2.addWeighted(self.base_map_alpha, 1 - alpha, self.preview_map, alpha, 0)
-            create_output_opencv(blended,
-                                 self.full_positions,
+            create_output_opencv(self.composite_map,
+                                 path_corners,
                                  self.output_file)
 
         if self.output_flags & OutputFlags.JSON:
             pre, _ = os.path.splitext(self.output_file)
             json_file = pre + ".json"
-            data = create_json_data(self.full_positions, self.timestamps)
-            output_json(json_file, data)
+            _, trajectory, _, _ = input_binary(self.trajectory_file)
+            full_positions, timestamps = trajectory_to_lists(trajectory)
+            data = create_json_data(full_positions, timestamps)
+            # The positions were written by this worker, so they don't need to be validated.
+            output_json(json_file, data, validate=False)
+            # The trajectory is memory-mapped, so it must be closed before the file is moved or
+            # removed (on Windows).
+            del trajectory
+
+        if self.output_flags & OutputFlags.BINARY:
+            if self.trajectory_file != self.binary_file:
+                os.replace(self.trajectory_file, self.binary_file)
+        else:
+            os.remove(self.trajectory_file)
 
 
 class PUBGISMainWindow(QMainWindow):
@@ -123,7 +237,7 @@ class PUBGISMainWindow(QMainWindow):
 
     def __init__(self):
         super().__init__()
-        uic.loadUi(os.path.join(os.path.dirname(__file__), "pubgis_gui.ui"), self)
+        self._load_ui()
 
         # connect buttons to functions
         self.color_select_button.released.connect(self._select_path_color)
@@ -145,8 +259,8 @@ class PUBGISMainWindow(QMainWindow):
         self.map_creation_view.setScene(QGraphicsScene())
         self.map_creation_view.scene().addPixmap(QPixmap())
 
-        # instantiate MSS now
-        self.sct = mss.mss()
+        # MSS is only needed for live processing, so it's created the first time it's used.
+        self._sct = None
 
         # set window name and icon
         self.setWindowTitle("PUBGIS (v{})".format(__version__))
@@ -178,7 +292,8 @@ class PUBGISMainWindow(QMainWindow):
                                  self.thickness_spinbox,
                                  self.disable_preview_checkbox,
                                  self.output_full_map_checkbox,
-                                 self.output_json_checkbox]
+                                 self.output_json_checkbox,
+                                 self.output_binary_checkbox]
 
         self.buttons = {ButtonGroups.PREPROCESS: configuration_buttons,
                         ButtonGroups.PROCESSING: [self.cancel_button]}
@@ -189,6 +304,28 @@ class PUBGISMainWindow(QMainWindow):
         self.thickness_spinbox.setValue(PATH_THICKNESS)
         self._update_path_color_preview()
 
+    def _load_ui(self):
+        try:
+            compiled_ui_current = pubgis_gui_ui is not None and \
+                os.path.getmtime(pubgis_gui_ui.__file__) >= os.path.getmtime(UI_FILE)
+        except OSError:
+            # The files may not be available to compare (a frozen executable, for example), in
+            # which case the compiled module is assumed to be up to date.
+            compiled_ui_current = True
+
+        if compiled_ui_current:
+            pubgis_gui_ui.Ui_PUBGIS_GUI().setupUi(self)
+        else:
+            from PyQt5 import uic
+            uic.loadUi(UI_FILE, self)
+
+    @property
+    def sct(self):
+        if self._sct is None:
+            import mss
+            self._sct = mss.mss()
+        return self._sct
+
     @staticmethod
     def _get_starting_directory():
         user_dir = os.path.expanduser('~')
@@ -366,24 +503,54 @@ class PUBGISMainWindow(QMainWindow):
 
         return True
 
+    def _resume_live_session(self, trajectory_file):
+        """
+        :return: the last timestamp of the interrupted live session in trajectory_file if the
+                 user wants to resume it, otherwise None
+        """
+        if not os.path.exists(trajectory_file):
+            return None
+
+        if QMessageBox.question(self,
+                                "Resume",
+                                "The last live session was interrupted, resume it?",
+                                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return None
+
+        _, trajectory, _, _ = input_binary(trajectory_file)
+        return float(trajectory["timestamp"][-1]) if len(trajectory) else None
+
     def process_match(self):
         map_iter = None
         output_file = None
+        trajectory_file = None
+        resume = False
 
         try:
             if self.tabWidget.currentIndex() == ProcessMode.VIDEO:
                 if self._validate_inputs(ProcessMode.VIDEO):
                     zero = QTime(0, 0, 0)
-                    map_iter = VideoIterator(video_file=self.video_file_edit.text(),
-                                             landing_time=zero.secsTo(self.landing_time.time()),
-                                             death_time=zero.secsTo(self.death_time.time()),
-                                             time_step=float(self.time_step.currentText()))
+                    video_iter = VideoIterator(video_file=self.video_file_edit.text(),
+                                               landing_time=zero.secsTo(self.landing_time.time()),
+                                               death_time=zero.secsTo(self.death_time.time()),
+                                               time_step=float(self.time_step.currentText()))
+                    map_iter = PrefetchIterator(video_iter)
                     output_file = self.output_file_edit.text()
 
             elif self.tabWidget.currentIndex() == ProcessMode.LIVE:
                 if self._validate_inputs(ProcessMode.LIVE):
-                    map_iter = LiveFeed(time_step=float(self.time_step.currentText()),
-                                        monitor=self.monitor_combo.currentIndex() + 1)
+                    # mss is only needed (and imported by LiveFeed) for live processing.
+                    from pubgis.minimap_iterators.live import LiveFeed
+                    time_step = float(self.time_step.currentText())
+                    trajectory_file = os.path.join(self.output_directory_edit.text(),
+                                                   LIVE_TRAJECTORY_FILE)
+                    last_timestamp = self._resume_live_session(trajectory_file)
+                    resume = last_timestamp is not None
+
+                    # The timestamps of a resumed session continue from the interrupted one.
+                    map_iter = LiveFeed(time_step=time_step,
+                                        monitor=self.monitor_combo.currentIndex() + 1,
+                                        start_time=last_timestamp + time_step if resume else 0)
 
                     output_file = os.path.join(self.output_directory_edit.text(),
                                                self.generate_output_file_name())
@@ -404,10 +571,15 @@ class PUBGISMainWindow(QMainWindow):
                 if self.output_full_map_checkbox.isChecked():
                     output_flags |= OutputFlags.FULL_MAP
 
+                if self.output_binary_checkbox.isChecked():
+                    output_flags |= OutputFlags.BINARY
+
                 match_thread = PUBGISWorkerThread(self,
                                                   map_iter,
                                                   output_file,
-                                                  output_flags)
+                                                  output_flags,
+                                                  trajectory_file=trajectory_file,
+                                                  resume=resume)
 
                 self._update_button_state(ButtonGroups.PROCESSING)
                 match_thread.percent_update.connect(self.progress_bar.setValue)
@@ -0,0 +1,294 @@
+"""
+Aggregate the trajectories of many matches into a heatmap.
+
+The map is divided into square cells, and a float32 grid holds a count for each cell.  By default
+every position counts once in its cell, which shows where players spend their time.  With paths,
+each trajectory counts once in every cell its path passes through, which shows the routes taken
+(a composite of the paths).
+
+The grid can be saved as a state file and loaded again, so new trajectories can be added to it
+without processing the ones already added.
+
+Example:
+    python -m pubgis.heatmap results/*.json --output heatmap.jpg --state heatmap.npz --processes 4
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import cv2
+import numpy as np
+
+from pubgis.maps import DEFAULT_MAP, get_map, get_available_maps
+from pubgis.output.pubgis_binary import input_binary, valid_positions, BINARY_EXTENSION
+from pubgis.output.pubgis_json import input_json
+
+HEATMAP_CELL_SIZE = 8
+HEATMAP_ALPHA = 0.6
+HEATMAP_COLORMAP = cv2.COLORMAP_JET
+
+
+def load_positions(filename, validate=True):
+    """
+    Load the positions found in a JSON or binary trajectory file.
+
+    :return: (N, 2) array of the x, y of every position that was found
+    """
+    if filename.endswith(BINARY_EXTENSION):
+        _, trajectory, _, _ = input_binary(filename)
+        return valid_positions(trajectory)
+
+    _, positions, _, _, _ = input_json(filename, validate=validate)
+    if positions is None:
+        raise ValueError(f"invalid trajectory file: {filename}")
+
+    return np.array([position for position in positions if position is not None],
+                    dtype=np.int64).reshape(-1, 2)
+
+
+def interpolate_path(positions, spacing):
+    """
+    Create points along the lines between consecutive positions (the same lines plot_path
+    draws), no more than spacing apart.
+
+    :return: (N, 2) float array of points, including the positions themselves
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if len(positions) < 2:
+        return positions
+
+    starts = positions[:-1]
+    deltas = positions[1:] - starts
+    steps = np.maximum(np.ceil(np.hypot(deltas[:, 0], deltas[:, 1]) / spacing), 1).astype(np.intp)
+
+    # For every point, the line it's on, and how far along the line it is.
+    lines = np.repeat(np.arange(len(steps)), steps)
+    line_offsets = np.arange(len(lines)) - np.repeat(np.cumsum(steps) - steps, steps)
+    fractions = (line_offsets / steps[lines])[:, np.newaxis]
+
+    return np.vstack((starts[lines] + deltas[lines] * fractions, positions[-1:]))
+
+
+class HeatmapAccumulator:
+    """
+    HeatmapAccumulator counts the positions of many trajectories in a grid of cells covering a
+    map of map_size.  files holds the absolute paths of the files that have been added.
+    """
+
+    def __init__(self, map_size, cell_size=HEATMAP_CELL_SIZE, paths=False):
+        self.map_size = map_size
+        self.cell_size = cell_size
+        self.paths = paths
+        self.grid_size = -(-map_size // cell_size)
+        self.grid = np.zeros((self.grid_size, self.grid_size), np.float32)
+        self.files = set()
+        self.trajectories = 0
+
+    def _cell_indices(self, positions):
+        if self.paths:
+            # Half a cell apart, so that a line can't cross a cell without a point in it.
+            positions = interpolate_path(positions, self.cell_size / 2)
+
+        cells = np.clip(np.asarray(positions).reshape(-1, 2) // self.cell_size,
+                        0,
+                        self.grid_size - 1).astype(np.intp)
+        indices = cells[:, 1] * self.grid_size + cells[:, 0]
+
+        if self.paths:
+            # A path that loops back through a cell only counts once in it.
+            indices = np.unique(indices)
+
+        return indices
+
+    def add_positions(self, positions):
+        # Positions can fall in the same cell, so np.add.at is used to count each of them.
+        np.add.at(self.grid.reshape(-1), self._cell_indices(positions), 1)
+        self.trajectories += 1
+
+    def add_files(self, filenames, processes=1, validate=True):
+        """
+        Add the trajectories in filenames that haven't already been added, in processes
+        processes.
+
+        :return: list of the files that couldn't be read
+        """
+        new_files = []
+        for filename in filenames:
+            filename = os.path.abspath(filename)
+            if filename not in self.files and filename not in new_files:
+                new_files.append(filename)
+
+        if processes > 1 and len(new_files) > 1:
+            # Each process accumulates its share of the files into its own grid, so that only
+            # one grid per process has to be sent back.
+            file_groups = [new_files[i::processes] for i in range(processes)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(_accumulate_files,
+                                            repeat(self.map_size),
+                                            repeat(self.cell_size),
+                                            repeat(self.paths),
+                                            file_groups,
+                                            repeat(validate)))
+        else:
+            results = [_accumulate_files(self.map_size,
+                                         self.cell_size,
+                                         self.paths,
+                                         new_files,
+                                         validate)]
+
+        failed_files = []
+        for grid, trajectories, group_failed_files in results:
+            self.grid += grid
+            self.trajectories += trajectories
+            failed_files.extend(group_failed_files)
+
+        self.files.update(filename for filename in new_files if filename not in failed_files)
+        return failed_files
+
+    def save(self, state_file):
+        # Saving to an open file stops numpy adding .npz to the name.
+        with open(state_file, 'wb') as state_output_file:
+            np.savez_compressed(state_output_file,
+                                grid=self.grid,
+                                map_size=self.map_size,
+                                cell_size=self.cell_size,
+                                paths=self.paths,
+                                trajectories=self.trajectories,
+                                files=np.array(sorted(self.files), dtype=str))
+
+    @classmethod
+    def load(cls, state_file):
+        with np.load(state_file) as state:
+            accumulator = cls(int(state['map_size']),
+                              cell_size=int(state['cell_size']),
+                              paths=bool(state['paths']))
+            accumulator.grid = state['grid']
+            accumulator.trajectories = int(state['trajectories'])
+            accumulator.files = set(state['files'].tolist())
+
+        return accumulator
+
+
+def _accumulate_files(map_size, cell_size, paths, filenames, validate):
+    accumulator = HeatmapAccumulator(map_size, cell_size=cell_size, paths=paths)
+    failed_files = []
+
+    for filename in filenames:
+        try:
+            accumulator.add_positions(load_positions(filename, validate=validate))
+        except (OSError, ValueError):
+            failed_files.append(filename)
+
+    return accumulator.grid, accumulator.trajectories, failed_files
+
+
+def render_heatmap(grid, base_map, alpha=HEATMAP_ALPHA, colormap=HEATMAP_COLORMAP):
+    """
+    Color the cells of base_map that have a count, blended with alpha.
+
+    :return: new image the size of base_map
+    """
+    output = np.copy(base_map)
+    if not grid.any():
+        return output
+
+    # Counts vary by orders of magnitude between cells, so they are shown on a log scale.
+    intensity = np.log1p(grid)
+    intensity *= 255 / intensity.max()
+    intensity = cv2.resize(intensity.astype(np.uint8),
+                           (base_map.shape[1], base_map.shape[0]),
+                           interpolation=cv2.INTER_NEAREST)
+
+    heat = cv2.applyColorMap(intensity, colormap)
+    blended = cv2.addWeighted(base_map, 1 - alpha, heat, alpha, 0, dst=heat)
+
+    counted = intensity > 0
+    output[counted] = blended[counted]
+    return output
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pubgis.heatmap",
+                                     description="Aggregate the trajectories of many matches "
+                                                 "into a heatmap.")
+    parser.add_argument("trajectories", nargs='*',
+                        help=f"JSON or binary ({BINARY_EXTENSION}) trajectory files "
+                             f"or glob patterns")
+    parser.add_argument("--output", help="image to draw the heatmap on the map to")
+    parser.add_argument("--state",
+                        help="file to keep the heatmap in, so later runs only need to add new "
+                             "trajectories (created if it doesn't exist)")
+    parser.add_argument("--map",
+                        choices=[game_map.name for game_map in get_available_maps()],
+                        default=DEFAULT_MAP,
+                        help=f"map the trajectories are on (default: {DEFAULT_MAP})")
+    parser.add_argument("--cell-size", type=int, default=HEATMAP_CELL_SIZE,
+                        help=f"size of the heatmap cells in map pixels "
+                             f"(default: {HEATMAP_CELL_SIZE})")
+    parser.add_argument("--paths", action='store_true',
+                        help="count the paths through each cell instead of the positions in it")
+    parser.add_argument("--alpha", type=float, default=HEATMAP_ALPHA,
+                        help=f"heatmap opacity, 0-1 (default: {HEATMAP_ALPHA})")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of processes to read the trajectories with (default: 1)")
+    parser.add_argument("--no-validate", action='store_true',
+                        help="don't validate JSON files (only for files written by PUBGIS)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    options = parser.parse_args(argv)
+
+    if options.processes < 1:
+        parser.error("--processes must be at least 1")
+
+    if not options.output and not options.state:
+        parser.error("at least one of --output and --state is required")
+
+    try:
+        game_map = get_map(options.map)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+
+    if options.state and os.path.exists(options.state):
+        accumulator = HeatmapAccumulator.load(options.state)
+        if (accumulator.map_size, accumulator.cell_size, accumulator.paths) != \
+                (game_map.size, options.cell_size, options.paths):
+            parser.error(f"--map, --cell-size and --paths must be the same as when "
+                         f"{options.state} was created")
+    else:
+        accumulator = HeatmapAccumulator(game_map.size,
+                                         cell_size=options.cell_size,
+                                         paths=options.paths)
+
+    trajectory_files = []
+    for trajectory_arg in options.trajectories:
+        trajectory_files.extend(sorted(glob.glob(trajectory_arg)) or [trajectory_arg])
+
+    added_before = len(accumulator.files)
+    failed_files = accumulator.add_files(trajectory_files,
+                                         processes=options.processes,
+                                         validate=not options.no_validate)
+
+    for filename in failed_files:
+        print(f"{filename}: could not be read", file=sys.stderr)
+    print(f"{len(accumulator.files) - added_before} trajectories added, "
+          f"{accumulator.trajectories} in total")
+
+    if options.state:
+        accumulator.save(options.state)
+
+    if options.output:
+        cv2.imwrite(options.output, render_heatmap(accumulator.grid,
+                                                   game_map.full_map,
+                                                   alpha=options.alpha))
+
+    return 1 if failed_files else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
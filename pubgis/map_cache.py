@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# CACHE_VERSION must be incremented whenever the way any of the cached arrays are generated
+# changes, so that stale arrays from a previous version are never loaded.  Constants the arrays
+# depend on (such as the pyramid scale) are passed as parameters, which are part of the key.
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pubgis", "cache")
+
+MAP_CACHE_ARRAYS = ("gray_map", "coarse_gray_map", "land_mask", "indicator_mask", "area_mask")
+
+# The decoded full map doesn't depend on the minimap size, so it has a single entry per map.
+FULL_MAP_ENTRY = "full"
+FULL_MAP_ARRAYS = ("full_map",)
+
+
+@lru_cache(maxsize=None)
+def _hash_file(filename, mtime, file_size):  # pylint: disable=unused-argument
+    # mtime and file_size are only part of the lru_cache key, so that the file is hashed again
+    # if it changes while the process is running.
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_file(filename):
+    stat = os.stat(filename)
+    return _hash_file(os.path.abspath(filename), stat.st_mtime, stat.st_size)
+
+
+class MapCache:
+    """
+    MapCache stores the arrays derived from a map image (scaled grayscale maps, land mask and
+    minimap masks) on disk so they don't need to be recomputed by every PUBGISMatch.
+
+    Each set of arrays is stored in its own directory, keyed by the map name, a hash of the map
+    and land mask files and of the parameters the arrays were created with, the minimap size and
+    the cache version.  The arrays are stored as .npy files and loaded
+    memory-mapped, so only the parts of the map that are actually used are read from disk.
+
+    The memory-mapped arrays are read-only, and every process that loads the same entry shares
+    the same pages of memory, so processing several videos at once doesn't need a copy of the
+    maps for each process.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def get_entry_dir(self,  # pylint: disable=too-many-arguments
+                      map_name,
+                      map_file,
+                      size,
+                      land_mask_file=None,
+                      parameters=()):
+        key_parts = [hash_file(map_file)]
+        if land_mask_file is not None:
+            key_parts.append(hash_file(land_mask_file))
+        key_parts.extend(repr(parameter) for parameter in parameters)
+
+        key = hashlib.sha1("_".join(key_parts).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{map_name}_{key}_{size}_v{CACHE_VERSION}")
+
+    def load(self,  # pylint: disable=too-many-arguments
+             map_name,
+             map_file,
+             size,
+             land_mask_file=None,
+             parameters=()):
+        return self._load_arrays(self.get_entry_dir(map_name,
+                                                    map_file,
+                                                    size,
+                                                    land_mask_file=land_mask_file,
+                                                    parameters=parameters),
+                                 MAP_CACHE_ARRAYS)
+
+    def store(self,  # pylint: disable=too-many-arguments
+              map_name,
+              map_file,
+              size,
+              arrays,
+              land_mask_file=None,
+              parameters=()):
+        self._store_arrays(self.get_entry_dir(map_name,
+                                              map_file,
+                                              size,
+                                              land_mask_file=land_mask_file,
+                                              parameters=parameters),
+                           MAP_CACHE_ARRAYS,
+                           arrays)
+
+    def load_full_map(self, map_name, map_file):
+        """
+        Load the decoded full map.  If it isn't in the cache yet, map_file is decoded and stored
+        first.
+
+        :return: the full map as a read-only memory-mapped BGR array
+        """
+        entry_dir = self.get_entry_dir(map_name, map_file, FULL_MAP_ENTRY)
+        arrays = self._load_arrays(entry_dir, FULL_MAP_ARRAYS)
+
+        if arrays is None:
+            full_map = cv2.imread(map_file)
+            if full_map is None:
+                raise FileNotFoundError(f"map file could not be read: {map_file}")
+
+            self._store_arrays(entry_dir, FULL_MAP_ARRAYS, {"full_map": full_map})
+            arrays = self._load_arrays(entry_dir, FULL_MAP_ARRAYS) or {"full_map": full_map}
+
+        return arrays["full_map"]
+
+    @staticmethod
+    def _load_arrays(entry_dir, names):
+        try:
+            return {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r')
+                    for name in names}
+        except (OSError, ValueError):
+            return None
+
+    def _store_arrays(self, entry_dir, names, arrays):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # The arrays are written to a temporary directory first which is then renamed, so that
+        # other processes never see a partially written entry.
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            for name in names:
+                np.save(os.path.join(temp_dir, f"{name}.npy"), arrays[name])
+            os.replace(temp_dir, entry_dir)
+        except OSError:
+            # Another process may have stored the same entry first, which is fine.
+            shutil.rmtree(temp_dir, ignore_errors=True)
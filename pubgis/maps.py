@@ -0,0 +1,216 @@
+"""
+Registry of the maps that minimaps can be matched against.
+
+Each map is a GameMap, registered by name in MAPS.  A map is only available for matching if its
+full map and land mask images exist.
+"""
+import os
+import threading
+from os.path import join, dirname
+
+import cv2
+from PIL import Image
+
+IMAGES = join(dirname(__file__), "images")
+
+DEFAULT_MAP = "miramar"
+
+# Passing AUTO_MAP instead of a map name to PUBGISMatch identifies the map from the minimaps.
+AUTO_MAP = "auto"
+
+MAPS = {}
+
+# Thumbnails of the maps are decoded at a reduced size, which is much faster than decoding the
+# full map for JPEG maps.
+REDUCED_GRAYSCALE_FLAGS = {1: cv2.IMREAD_GRAYSCALE,
+                           2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                           4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                           8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+class GameMap:  # pylint: disable=too-many-instance-attributes
+    """
+    GameMap holds the assets of a single map.
+
+    The full map and land mask are loaded the first time they're used.  If a map_store (a
+    MapCache) is set, or one is given to load_full_map, the full map is loaded from it
+    memory-mapped, so that every process using the same map_store shares a single read-only copy
+    of the map.
+
+    scaled_arrays holds the arrays derived from the map (by PUBGISMatch) for each minimap size, so
+    they only need to be created once per process.  fft_matchers likewise holds the
+    FFTTemplateMatcher for each minimap size, and thumbnails the grayscale thumbnail of the map
+    at each scale.
+
+    Only the images (and map_store) of a GameMap are sent to other processes, which load the map
+    themselves.
+    """
+
+    def __init__(self, name, map_file, land_mask_file):
+        self.name = name
+        self.map_file = map_file
+        self.land_mask_file = land_mask_file
+        self.map_store = None
+        self.scaled_arrays = {}
+        self.fft_matchers = {}
+        self.thumbnails = {}
+        self._full_map = None
+        self._land_mask = None
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"GameMap({self.name!r})"
+
+    def __reduce__(self):
+        return _unpickle_game_map, (self.name, self.map_file, self.land_mask_file, self.map_store)
+
+    def is_available(self):
+        return os.path.exists(self.map_file) and os.path.exists(self.land_mask_file)
+
+    @property
+    def full_map(self):
+        return self.load_full_map()
+
+    def load_full_map(self, map_store=None):
+        """
+        :return: the full map, which is loaded from map_store (if given, otherwise the map_store
+                 of the GameMap) if it hasn't been loaded yet
+        """
+        if map_store is None:
+            map_store = self.map_store
+
+        with self._lock:
+            if self._full_map is None:
+                if map_store is not None:
+                    self._full_map = map_store.load_full_map(self.name, self.map_file)
+                else:
+                    self._full_map = _read_image(self.map_file, cv2.IMREAD_COLOR)
+
+        return self._full_map
+
+    @property
+    def land_mask(self):
+        with self._lock:
+            if self._land_mask is None:
+                land_mask_image = _read_image(self.land_mask_file, cv2.IMREAD_GRAYSCALE)
+                _, self._land_mask = cv2.threshold(land_mask_image, 10, 255, cv2.THRESH_BINARY)
+
+        return self._land_mask
+
+    @property
+    def size(self):
+        if self._size is None:
+            # Only the header of the map is read, the map doesn't need to be decoded to get
+            # its size.
+            try:
+                with Image.open(self.map_file) as map_image:
+                    self._size = map_image.size[0]
+            except OSError:
+                raise FileNotFoundError(f"map image could not be read: {self.map_file}")
+
+        return self._size
+
+    def gray_thumbnail(self, scale):
+        """
+        :return: the full map in grayscale, resized by scale (at most 1)
+        """
+        thumbnail_size = round(self.size * scale)
+
+        with self._lock:
+            thumbnail = self.thumbnails.get(scale)
+
+            if thumbnail is None:
+                if self._full_map is not None:
+                    gray_map = cv2.cvtColor(self._full_map, cv2.COLOR_BGR2GRAY)
+                else:
+                    reduction = max(reduction for reduction in REDUCED_GRAYSCALE_FLAGS
+                                    if reduction * scale <= 1)
+                    gray_map = _read_image(self.map_file, REDUCED_GRAYSCALE_FLAGS[reduction])
+
+                thumbnail = cv2.resize(gray_map,
+                                       (thumbnail_size, thumbnail_size),
+                                       interpolation=cv2.INTER_AREA)
+                self.thumbnails[scale] = thumbnail
+
+        return thumbnail
+
+    @property
+    def land_mask_scale(self):
+        return len(self.land_mask) / self.size
+
+
+def _read_image(image_file, flags):
+    image = cv2.imread(image_file, flags)
+    if image is None:
+        raise FileNotFoundError(f"map image could not be read: {image_file}")
+    return image
+
+
+def _unpickle_game_map(name, map_file, land_mask_file, map_store):
+    # If the same map is already registered in this process (a forked process inherits the maps
+    # of its parent), that GameMap is used, along with anything it has already loaded.
+    registered_map = MAPS.get(name)
+    if registered_map is not None and \
+            (registered_map.map_file, registered_map.land_mask_file) == (map_file, land_mask_file):
+        return registered_map
+
+    game_map = GameMap(name, map_file, land_mask_file)
+    game_map.map_store = map_store
+    return game_map
+
+
+def register_map(game_map):
+    MAPS[game_map.name] = game_map
+    return game_map
+
+
+def set_registered_maps(game_maps):
+    """
+    Register game_maps in place of every registered map, so that a process started with the spawn
+    method (which doesn't inherit the maps registered at runtime) uses the same maps as its
+    parent.
+    """
+    MAPS.clear()
+    for game_map in game_maps:
+        register_map(game_map)
+
+
+def get_map(name):
+    """
+    :return: the GameMap registered as name, which must be available
+    """
+    try:
+        game_map = MAPS[name]
+    except KeyError:
+        raise ValueError(f"unknown map: {name}")
+
+    if not game_map.is_available():
+        missing_files = [image_file for image_file in (game_map.map_file, game_map.land_mask_file)
+                         if not os.path.exists(image_file)]
+        raise FileNotFoundError(f"map {name} is not available, missing: "
+                                f"{', '.join(missing_files)}")
+
+    return game_map
+
+
+def get_available_maps():
+    return [game_map for game_map in MAPS.values() if game_map.is_available()]
+
+
+def use_map_store(map_store):
+    """
+    Load the full maps from map_store (a MapCache) from now on.  Maps that already have a
+    map_store, or have already been loaded, are not affected.
+    """
+    for game_map in MAPS.values():
+        if game_map.map_store is None:
+            game_map.map_store = map_store
+
+
+register_map(GameMap("miramar",
+                     join(IMAGES, "miramar_full_map.jpg"),
+                     join(IMAGES, "miramar_land_mask.jpg")))
+register_map(GameMap("erangel",
+                     join(IMAGES, "erangel_full_map.jpg"),
+                     join(IMAGES, "erangel_land_mask.jpg")))
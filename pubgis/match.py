@@ -1,13 +1,19 @@
-from os.path import join, dirname
+import threading
+from itertools import chain, islice
+from time import perf_counter
 
 import cv2
 import numpy as np
 
+from pubgis.batch_match import BatchMatchMixin, BATCH_WORKERS
 from pubgis.color import Color, Scaling
+from pubgis.fft_match import FFTTemplateMatcher
+from pubgis.map_cache import MapCache
+from pubgis.maps import DEFAULT_MAP, AUTO_MAP, GameMap, get_map, get_available_maps
+from pubgis.tracker import AlphaBetaTracker
 from pubgis.support import find_path_bounds, unscale_coords, scale_coords, coordinate_sum, \
-    coordinate_offset, create_slice, get_coords_from_slices
-
-IMAGES = join(dirname(__file__), "images")
+    coordinate_offset, create_slice, get_coords_from_slices, find_template_match_peaks, \
+    distance_penalty, create_penalty_kernel
 
 # These lists of thresholds are the criteria used to determine if a template match output has
 # actually matched a minimap, or if the supplied minimap was invalid (inventory, alt-tab, etc.)
@@ -37,74 +43,472 @@ IND_INNER_CIRCLE_RATIO = 0.01587
 AREA_MASK_AREA_RATIO = 0.145
 AREA_OUTER_CIRCLE_RATIO = IND_OUTER_CIRCLE_RATIO * 1.1
 
+# When there is no last known position, the whole map must be searched.  Instead of matching the
+# full scale map directly, the search is first done on a map (and minimap) reduced by
+# PYRAMID_SCALE.  The best PYRAMID_CANDIDATES locations from that coarse search are then refined
+# at full scale in a small window, PYRAMID_REFINE_BORDER pixels larger than the minimap per side.
+PYRAMID_SCALE = 0.25
+PYRAMID_CANDIDATES = 3
+PYRAMID_REFINE_BORDER = 12
+
+# The constants the map arrays (kept in a MapCache) are created with, besides the map images.
+MAP_ARRAY_PARAMETERS = (PYRAMID_SCALE,)
+
+# Matches far from the last known position are penalized.  The penalty for every offset up to
+# PENALTY_KERNEL_RADIUS from the last known position is calculated once and shared by every
+# PUBGISMatch.  Larger contexts (after many missed frames) have their penalty calculated as needed.
+PENALTY_KERNEL_RADIUS = 1024
+
+# Template matching in large contexts is done in the frequency domain by an FFTTemplateMatcher,
+# which is faster than cv2.matchTemplate once the context is at least FFT_MIN_CONTEXT_SIZE
+# (scaled pixels) across.
+FFT_MIN_CONTEXT_SIZE = 1500
+
+# When the map isn't known, it is identified by matching the first IDENTIFY_MINIMAPS minimaps
+# that have the player indicator against a thumbnail of every available map at PYRAMID_SCALE.
+# At most IDENTIFY_MAX_FRAMES minimaps are read looking for them.
+IDENTIFY_MINIMAPS = 3
+IDENTIFY_MAX_FRAMES = 50
+
+# Each minimap is compared to the last minimap that was processed, both shrunk to
+# STATIC_FRAME_SIZE x STATIC_FRAME_SIZE.  If the mean absolute difference is below
+# STATIC_FRAME_THRESHOLD, the player hasn't moved (on typical terrain, the difference is about 0.3
+# for each map pixel moved), so the last result is reused instead of processing the minimap.
+STATIC_FRAME_SIZE = 32
+STATIC_FRAME_THRESHOLD = 0.5
+
+
+class _LazyClassAttribute:
+    """
+    A class attribute that is loaded by calling loader(owner class) the first time it's accessed.
+    The loaded value then replaces this descriptor on the class.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.owner = None
+        self.name = None
+        self.lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __get__(self, instance, owner):
+        with self.lock:
+            # Another thread may have loaded the value while this one was waiting for the lock.
+            value = self.owner.__dict__[self.name]
+            if value is self:
+                value = self.loader(self.owner)
+                setattr(self.owner, self.name, value)
+        return value
+
+
+def _load_default_full_map(_):
+    return get_map(DEFAULT_MAP).full_map
+
+
+def _load_default_land_mask(_):
+    return get_map(DEFAULT_MAP).land_mask
+
+
+def _load_default_land_mask_scale(_):
+    return get_map(DEFAULT_MAP).land_mask_scale
+
+
+def _load_penalty_kernel(_):
+    return create_penalty_kernel(PENALTY_KERNEL_RADIUS)
+
 
-class PUBGISMatch:
+class PUBGISMatch(BatchMatchMixin):  # pylint: disable=too-many-instance-attributes
     """
     PUBGISMatch is responsible for processing a series of minimap images and outputting the
     position of the player at each of the minimaps (if possible).
 
     The output positions are based on the full_map which is the highest resolution map.  This
     same map is used as the reference for output positions, regardless of input resolution.
-    """
-    full_map = cv2.imread(join(IMAGES, "miramar_full_map.jpg"))
-    land_mask_image = cv2.imread(join(IMAGES, "miramar_land_mask.jpg"), cv2.IMREAD_GRAYSCALE)
-    _, land_mask = cv2.threshold(land_mask_image, 10, 255, cv2.THRESH_BINARY)
-    land_mask_scale = len(land_mask) / len(full_map)
 
-    def __init__(self, minimap_iterator, debug=False):
+    game_map selects the map (a GameMap or the name of one) the minimaps are from.  If it is
+    AUTO_MAP, the map is identified from the first minimaps processed.
+
+    The class attributes full_map, land_mask and land_mask_scale are those of the default map, and
+    penalty_kernel is the distance penalty kernel shared by every match.  They are only loaded
+    (or created) the first time they are used.
+    """
+    full_map = _LazyClassAttribute(_load_default_full_map)
+    land_mask = _LazyClassAttribute(_load_default_land_mask)
+    land_mask_scale = _LazyClassAttribute(_load_default_land_mask_scale)
+    penalty_kernel = _LazyClassAttribute(_load_penalty_kernel)
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 minimap_iterator,
+                 debug=False,
+                 pyramid_search=True,
+                 cache_dir=None,
+                 stats=None,
+                 game_map=None,
+                 fft_search=True,
+                 tracking=True,
+                 batch_size=1,
+                 batch_workers=BATCH_WORKERS,
+                 static_frame_threshold=STATIC_FRAME_THRESHOLD):
         self.minimap_iter = minimap_iterator
         self.debug = debug
+        self.pyramid_search = pyramid_search
+        self.fft_search = fft_search
+
+        # With a batch_size greater than 1, process_match reads that many minimaps at a time and
+        # processes them with process_batch (unless stats are being recorded, as they are
+        # recorded per frame).
+        self.batch_size = batch_size
+        self.batch_workers = batch_workers
+
+        # Minimaps that are the same as the last minimap processed reuse its result.  The check
+        # is disabled if static_frame_threshold is None.
+        self.static_frame_threshold = static_frame_threshold
+        self.last_processed_thumbnail = None
+        self.last_processed_position = None
+
+        # stats is an optional MatchStats, which will have the details of each frame recorded.
+        # All timing is skipped if stats is None.
+        self.stats = stats
 
         # last_known_position is stored to narrow the search space for template matching.
         # last_known_position is unscaled, thus corresponds to coordinates on the full map.
         self.last_known_position = None
+        self.last_known_timestamp = None
         self.missed_frames = 0
 
+        # The timestamp and position (None if not found) of the previous minimap processed by
+        # process_match, to tell the minimap iterator how far the player moved.
+        self.previous_frame = None
+
+        # When tracking, the tracker predicts where the player will be in the current frame
+        # from the positions found so far, so a smaller context around the prediction can be
+        # searched.  current_timestamp is the timestamp of the frame being processed.
+        self.tracking = tracking
+        self.tracker = AlphaBetaTracker()
+        self.current_timestamp = None
+
         # For processing purposes, a scaled grayscale map will be stored.  This map is scaled so
         # features on the minimap and this map are the same resolution.  This is important for
         # the template matching, and is done on an instance basis because the input resolution may
         # change for each instance of PUBGISMatch.
+        #
+        # Creating these arrays is expensive, so they are kept by the GameMap for future
+        # instances with the same input resolution.  If a cache_dir is provided, they are also
+        # stored there to be reused by other processes and future runs, and the full map they're
+        # created from is loaded from there (only by this instance, the GameMap's own map_store
+        # isn't changed).
         self.scale = self.minimap_iter.size / FULL_SCALE_MINIMAP
-        scaled_map = cv2.resize(PUBGISMatch.full_map, (0, 0), fx=self.scale, fy=self.scale)
-        self.gray_map = cv2.cvtColor(scaled_map, cv2.COLOR_BGR2GRAY)
+        self.map_cache = MapCache(cache_dir) if cache_dir is not None else None
+
+        self.game_map = None
+
+        if game_map == AUTO_MAP:
+            # The masks are needed to find minimaps to identify the map with.  Everything else is
+            # set once the map has been identified.
+            self.masks = self._create_masks(self.minimap_iter.size)
+        else:
+            if not isinstance(game_map, GameMap):
+                game_map = get_map(game_map or DEFAULT_MAP)
+            self._set_game_map(game_map)
+
+    def _set_game_map(self, game_map):
+        map_arrays = self._get_map_arrays(game_map)
+
+        self.game_map = game_map
+        self.gray_map = map_arrays["gray_map"]
+        self.coarse_gray_map = map_arrays["coarse_gray_map"]
+        self.land_mask = map_arrays["land_mask"]
+        self.land_mask_scale = len(self.land_mask) / game_map.size
+        self.masks = map_arrays["indicator_mask"], map_arrays["area_mask"]
 
-        self.masks = self._create_masks(self.minimap_iter.size)
+    def _get_map_arrays(self, game_map):
+        size = self.minimap_iter.size
+        map_arrays = game_map.scaled_arrays.get(size)
+
+        if map_arrays is None:
+            cache_key = {'land_mask_file': game_map.land_mask_file,
+                         'parameters': MAP_ARRAY_PARAMETERS}
+
+            if self.map_cache:
+                map_arrays = self.map_cache.load(game_map.name, game_map.map_file, size,
+                                                 **cache_key)
+
+            if map_arrays is None:
+                map_arrays = self._create_map_arrays(game_map, size, self.scale, self.map_cache)
+
+                if self.map_cache:
+                    self.map_cache.store(game_map.name, game_map.map_file, size, map_arrays,
+                                         **cache_key)
+                    # The stored arrays are loaded back so that they are shared with other
+                    # processes instead of being a private copy.
+                    map_arrays = self.map_cache.load(game_map.name, game_map.map_file, size,
+                                                     **cache_key) or map_arrays
+
+            game_map.scaled_arrays[size] = map_arrays
+
+        return map_arrays
+
+    def identify_game_map(self, minimaps=None):
+        """
+        Identify which of the available maps the minimaps are from.  Minimaps are read (from the
+        minimap iterator if minimaps isn't given) until IDENTIFY_MINIMAPS of them have the player
+        indicator, and each of those is matched against a thumbnail of every map at
+        PYRAMID_SCALE.  The map with the best total match is the one identified.
+
+        :return: (GameMap, list of the (percent, timestamp, minimap) read from minimaps)
+        """
+        game_maps = get_available_maps()
+
+        if not game_maps:
+            raise FileNotFoundError("no maps are available")
+
+        if len(game_maps) == 1:
+            return game_maps[0], []
+
+        minimaps = iter(self.minimap_iter) if minimaps is None else minimaps
+        read_minimaps = []
+        indicator_minimaps = []
+
+        for percent, timestamp, minimap in minimaps:
+            # The minimaps read here are processed again later, so they can't be overwritten by
+            # the next minimap read.
+            if self.minimap_iter.reuses_buffer:
+                minimap = np.copy(minimap)
+
+            read_minimaps.append((percent, timestamp, minimap))
+
+            if self.__is_player_icon_present(minimap, self.masks):
+                indicator_minimaps.append(minimap)
+
+            if len(indicator_minimaps) >= IDENTIFY_MINIMAPS or \
+                    len(read_minimaps) >= IDENTIFY_MAX_FRAMES:
+                break
+
+        if not indicator_minimaps:
+            # There is nothing to identify the map from, so the default map is assumed.
+            default_map = next((game_map for game_map in game_maps if game_map.name == DEFAULT_MAP),
+                               game_maps[0])
+            return default_map, read_minimaps
+
+        coarse_minimaps = [self._create_coarse_image(cv2.cvtColor(minimap, cv2.COLOR_RGB2GRAY))
+                           for minimap in indicator_minimaps]
+        scores = []
+
+        for game_map in game_maps:
+            # Only the identified map needs its scaled arrays, the others are compared with a
+            # thumbnail the size of the coarse map.
+            coarse_gray_map = game_map.gray_thumbnail(self.scale * PYRAMID_SCALE)
+            scores.append(sum(cv2.minMaxLoc(cv2.matchTemplate(coarse_gray_map,
+                                                              coarse_minimap,
+                                                              cv2.TM_CCOEFF_NORMED))[1]
+                              for coarse_minimap in coarse_minimaps))
+
+        return game_maps[int(np.argmax(scores))], read_minimaps
+
+    @staticmethod
+    def _create_map_arrays(game_map, size, scale, map_store=None):
+        scaled_map = cv2.resize(game_map.load_full_map(map_store), (0, 0), fx=scale, fy=scale)
+        gray_map = cv2.cvtColor(scaled_map, cv2.COLOR_BGR2GRAY)
+        coarse_gray_map = PUBGISMatch._create_coarse_image(gray_map)
+        indicator_mask, area_mask = PUBGISMatch._create_masks(size)
+
+        return {"gray_map": gray_map,
+                "coarse_gray_map": coarse_gray_map,
+                "land_mask": game_map.land_mask,
+                "indicator_mask": indicator_mask,
+                "area_mask": area_mask}
+
+    @classmethod
+    def __is_player_icon_present(cls, minimap, masks):
+        return cls._is_indicator_present(Color.calculate_color_diff(minimap, *masks))
 
     @staticmethod
-    def __is_player_icon_present(minimap, masks):
-        color_diff = Color.calculate_color_diff(minimap, *masks)
-        return color_diff >= min(COLOR_DIFF_THRESHS)
+    def _is_indicator_present(color_diffs):
+        # color_diffs can be a single color difference or an array of them
+        return color_diffs >= min(COLOR_DIFF_THRESHS)
+
+    def restore_state(self, positions, timestamps, last_processed_thumbnail=None):
+        """
+        Put the match into the state it would be in after finding positions (None for those
+        that weren't found) at timestamps, to continue a match that was interrupted.  The map
+        must already be known, so this can't be used with AUTO_MAP.
+
+        last_processed_thumbnail is the thumbnail the static frame check compares against, as
+        it was when the match was interrupted.  Without it, the first minimap is always
+        processed.
+        """
+        for timestamp, position in zip(timestamps, positions):
+            self.current_timestamp = timestamp
+            self._update_missed_frames(position)
+            self._update_last_unscaled_position(position)
+
+        if positions:
+            # Static minimaps get the last position returned, which is always the position of
+            # the last minimap processed.
+            self.last_processed_position = positions[-1]
+            self.last_processed_thumbnail = last_processed_thumbnail
+            self.previous_frame = (timestamps[-1], positions[-1])
 
     def process_match(self):
-        for percent, timestamp, minimap in self.minimap_iter:
-            unscaled_position = self._find_unscaled_player_position(minimap)
+        minimaps = iter(self.minimap_iter)
+
+        if self.game_map is None:
+            game_map, read_minimaps = self.identify_game_map(minimaps)
+            self._set_game_map(game_map)
+            minimaps = chain(read_minimaps, minimaps)
+
+        if self.batch_size > 1 and not self.stats:
+            yield from self._process_batches(minimaps)
+            return
+
+        while True:
+            if self.stats:
+                self.stats.start_frame()
+                fetch_start = perf_counter()
+
+            try:
+                percent, timestamp, minimap = next(minimaps)
+            except StopIteration:
+                return
+
+            if self.stats:
+                self.stats.add_time("fetch", perf_counter() - fetch_start)
+
+            self.current_timestamp = timestamp
+            unscaled_position = self._find_position(minimap)
 
             self._update_missed_frames(unscaled_position)
             self._update_last_unscaled_position(unscaled_position)
+            self._report_movement(timestamp, unscaled_position)
+
+            if self.stats:
+                self.stats.end_frame(timestamp=timestamp,
+                                     matched=unscaled_position is not None,
+                                     missed_frames=self.missed_frames)
 
             yield percent, timestamp, unscaled_position
 
-    def _find_unscaled_player_position(self, minimap):
-        scaled_position = self._find_scaled_player_position(minimap)
+    def _process_batches(self, minimaps):
+        size = self.minimap_iter.size
+
+        while True:
+            batch = list(islice(minimaps, self.batch_size))
+            if not batch:
+                return
+
+            # Iterators may reuse the same array for every minimap, so each one is copied into
+            # the stack as it's read.
+            minimap_stack = np.empty((len(batch), size, size, 3), np.uint8)
+            for i, (_, _, minimap) in enumerate(batch):
+                minimap_stack[i] = minimap
+
+            positions = self.process_batch(minimap_stack, [timestamp for _, timestamp, _ in batch])
+
+            for (percent, timestamp, _), position in zip(batch, positions):
+                self._report_movement(timestamp, position)
+                yield percent, timestamp, position
+
+    def _report_movement(self, timestamp, unscaled_position):
+        # The minimap iterator is told how far the player moved since the previous minimap (None
+        # if the player wasn't found in either), so that an iterator with an adaptive time step
+        # can sample quiet parts of the match less often.
+        distance = None
+        elapsed = None
+
+        if self.previous_frame is not None:
+            previous_timestamp, previous_position = self.previous_frame
+
+            if unscaled_position is not None and previous_position is not None and \
+                    timestamp is not None and previous_timestamp is not None:
+                distance = float(np.hypot(*np.subtract(unscaled_position, previous_position)))
+                elapsed = timestamp - previous_timestamp
+
+        self.previous_frame = (timestamp, unscaled_position)
+        self.minimap_iter.report_movement(distance, elapsed)
+
+    def _find_position(self, minimap, **prepared):
+        if self.stats:
+            static_start = perf_counter()
+
+        static_frame = self._is_static_frame(minimap)
+
+        if self.stats:
+            self.stats.add_time("static_check", perf_counter() - static_start)
+            self.stats.record(static_frame=static_frame)
+
+        if static_frame:
+            return self.last_processed_position
+
+        self.last_processed_position = self._find_unscaled_player_position(minimap, **prepared)
+        return self.last_processed_position
+
+    def _is_static_frame(self, minimap):
+        if self.static_frame_threshold is None:
+            return False
+
+        thumbnail = cv2.resize(minimap,
+                               (STATIC_FRAME_SIZE, STATIC_FRAME_SIZE),
+                               interpolation=cv2.INTER_AREA)
+
+        if self.last_processed_thumbnail is not None and \
+                cv2.norm(thumbnail, self.last_processed_thumbnail, cv2.NORM_L1) / thumbnail.size \
+                < self.static_frame_threshold:
+            return True
+
+        # The thumbnail is only replaced when a minimap is processed, so that the player slowly
+        # moving can't go unnoticed.
+        self.last_processed_thumbnail = thumbnail
+        return False
+
+    def _find_unscaled_player_position(self, minimap, **prepared):
+        # prepared has the results of steps that process_batch has already done for the whole
+        # batch, see _find_scaled_player_position and _perform_template_matching.
+        scaled_position = self._find_scaled_player_position(minimap, **prepared)
+
+        if self.stats:
+            validation_start = perf_counter()
+
         unscaled_position = self._unscale_coords(scaled_position)
         unscaled_position_valid = self._is_unscaled_position_valid(unscaled_position)
 
+        if self.stats:
+            self.stats.add_time("validation", perf_counter() - validation_start)
+
         if not unscaled_position_valid:
             unscaled_position = None
 
         return unscaled_position
 
-    def _find_scaled_player_position(self, minimap):
-        color_diff = Color.calculate_color_diff(minimap, *self.masks)
+    def _find_scaled_player_position(self, minimap, color_diff=None, **prepared):
+        if color_diff is None:
+            if self.stats:
+                color_diff_start = perf_counter()
+
+            color_diff = Color.calculate_color_diff(minimap, *self.masks)
+
+            if self.stats:
+                self.stats.add_time("color_diff", perf_counter() - color_diff_start)
+
         if color_diff < min(COLOR_DIFF_THRESHS):
             scaled_position = None
             template_match_result = 0
             scaled_position_valid = False
         else:
-            scaled_position, template_match_result = self._perform_template_matching(minimap)
+            scaled_position, template_match_result = self._perform_template_matching(minimap,
+                                                                                     **prepared)
+
+            if self.stats:
+                validation_start = perf_counter()
+
             scaled_position_valid = self._is_scaled_position_valid(color_diff,
                                                                    template_match_result)
 
+            if self.stats:
+                self.stats.add_time("validation", perf_counter() - validation_start)
+
         if self.debug:
             ann_map = self.__annotate_minimap(minimap, color_diff, template_match_result)
             self.__debug_minimap(ann_map, scaled_position)
@@ -128,26 +532,62 @@ class PUBGISMatch:
         cv2.imshow("template_match", cv2.resize(out, (0, 0), fx=scaling, fy=scaling))
         cv2.waitKey(10)
 
-    def _perform_template_matching(self, minimap):
+    def _perform_template_matching(self,  # pylint: disable=too-many-branches
+                                   minimap,
+                                   gray_minimap=None,
+                                   speculative_match=None):
+        if self.stats:
+            match_start = perf_counter()
+
+        if gray_minimap is None:
+            gray_minimap = cv2.cvtColor(minimap, cv2.COLOR_RGB2GRAY)
         context_slice = self._get_scaled_context()
+
+        if self.stats:
+            self.stats.record(full_map_search=context_slice == slice(None),
+                              context_size=self.gray_map[context_slice].shape[0])
+
+        if context_slice == slice(None) and self.pyramid_search:
+            scaled_position, template_match_value = self._perform_pyramid_matching(gray_minimap)
+
+            # The coarse search can miss in areas of the map without much detail.  If none of
+            # the candidates could possibly be considered a match, fall back to searching the
+            # entire map at full scale.
+            if template_match_value > min(TEMPLATE_MATCH_THRESHS):
+                if self.stats:
+                    self.stats.add_time("template_match", perf_counter() - match_start)
+
+                if self.debug:
+                    self.__debug_land(scaled_position)
+
+                return scaled_position, template_match_value
+
         context_coords = get_coords_from_slices(context_slice)
-        template_match = cv2.matchTemplate(self.gray_map[context_slice],
-                                           cv2.cvtColor(minimap, cv2.COLOR_RGB2GRAY),
-                                           cv2.TM_CCOEFF_NORMED)
+        template_match = self._get_speculative_template_match(context_slice, speculative_match)
+        if template_match is None:
+            template_match = self._match_context(context_slice, gray_minimap)
         # match is an array, the same shape as the context.  Next, we must find the minimum value
         # in the array because we're using the TM_CCOEFF_NORMED matching method.
 
+        if self.stats:
+            self.stats.add_time("template_match", perf_counter() - match_start)
+            penalty_start = perf_counter()
+
         if context_slice != slice(None, None, None):
+            # The penalty is always from the last known position, even when the context is
+            # centered on a predicted position, so the match found is the same as it would be
+            # in the worst case context.
             context_last_known = coordinate_sum(scale_coords(self.last_known_position, self.scale),
                                                 [-x for x in context_coords])
-            x_rows = np.arange(template_match.shape[0]) - context_last_known[0]
-            y_rows = np.arange(template_match.shape[0]) - context_last_known[1]
-            meshgrid = np.meshgrid(x_rows, y_rows)
-            match_adjustment = np.sqrt(np.sqrt(meshgrid[0] ** 2 + meshgrid[1] ** 2)) / 1000
-            template_match -= match_adjustment
+            match_adjustment = self._get_distance_penalty(template_match.shape,
+                                                          context_last_known)
+            np.subtract(template_match, match_adjustment, out=template_match)
         else:
             match_adjustment = None
 
+        if self.stats:
+            self.stats.add_time("penalty", perf_counter() - penalty_start)
+
         _, template_match_value, _, match_position = cv2.minMaxLoc(template_match)
         scaled_position = coordinate_sum(match_position, context_coords)
         scaled_position = coordinate_offset(scaled_position, self.minimap_iter.size // 2)
@@ -159,24 +599,129 @@ class PUBGISMatch:
 
         return scaled_position, template_match_value
 
+    def _match_context(self, context_slice, gray_minimap):
+        context = self.gray_map[context_slice]
+
+        if self.fft_search and min(context.shape) >= FFT_MIN_CONTEXT_SIZE:
+            # The matcher keeps the transformed map, so it is shared by every instance using the
+            # same map and minimap size.
+            fft_matcher = self.game_map.fft_matchers.get(self.minimap_iter.size)
+            if fft_matcher is None:
+                fft_matcher = FFTTemplateMatcher(self.gray_map, self.minimap_iter.size)
+                self.game_map.fft_matchers[self.minimap_iter.size] = fft_matcher
+
+            return fft_matcher.match(gray_minimap, context_slice)
+
+        return cv2.matchTemplate(context, gray_minimap, cv2.TM_CCOEFF_NORMED)
+
+    @staticmethod
+    def _create_coarse_image(gray_image):
+        return cv2.resize(gray_image,
+                          (0, 0),
+                          fx=PYRAMID_SCALE,
+                          fy=PYRAMID_SCALE,
+                          interpolation=cv2.INTER_AREA)
+
+    def _perform_pyramid_matching(self, gray_minimap):
+        coarse_minimap = self._create_coarse_image(gray_minimap)
+        coarse_match = cv2.matchTemplate(self.coarse_gray_map,
+                                         coarse_minimap,
+                                         cv2.TM_CCOEFF_NORMED)
+
+        candidates = find_template_match_peaks(coarse_match,
+                                               PYRAMID_CANDIDATES,
+                                               coarse_minimap.shape[0])
+
+        refine_size = self.minimap_iter.size + 2 * PYRAMID_REFINE_BORDER
+        best_position = None
+        best_match_value = -1
+
+        for coarse_position in candidates:
+            # The candidate is the upper left corner of the coarse match, it must be converted to
+            # the center of the full scale minimap to build the refinement window around it.
+            candidate = coordinate_offset(unscale_coords(coarse_position, PYRAMID_SCALE),
+                                          self.minimap_iter.size // 2)
+            refine_slice = create_slice(*find_path_bounds(self.gray_map.shape[0],
+                                                          [candidate],
+                                                          crop_border=0,
+                                                          min_size=refine_size))
+            refine_match = cv2.matchTemplate(self.gray_map[refine_slice],
+                                             gray_minimap,
+                                             cv2.TM_CCOEFF_NORMED)
+            _, match_value, _, match_position = cv2.minMaxLoc(refine_match)
+
+            if match_value > best_match_value:
+                best_match_value = match_value
+                best_position = coordinate_sum(match_position,
+                                               get_coords_from_slices(refine_slice))
+
+        if best_position is not None:
+            best_position = coordinate_offset(best_position, self.minimap_iter.size // 2)
+
+        return best_position, best_match_value
+
+    @staticmethod
+    def _get_distance_penalty(shape, center):
+        height, width = shape
+        center_x, center_y = center
+
+        # This is the smallest radius of kernel that can be sliced to cover the whole shape.
+        radius = max(center_x, center_y, width - center_x - 1, height - center_y - 1)
+
+        if radius > PENALTY_KERNEL_RADIUS:
+            return distance_penalty(np.arange(width) - center_x, np.arange(height) - center_y)
+
+        kernel_y = PENALTY_KERNEL_RADIUS - center_y
+        kernel_x = PENALTY_KERNEL_RADIUS - center_x
+        return PUBGISMatch.penalty_kernel[kernel_y:kernel_y + height, kernel_x:kernel_x + width]
+
     def _get_scaled_context(self):
         # Context defines the area that the template matching will be limited to.
         # This area gets larger each time a match is missed to account for movement processing.
+        # When the player's movement can be predicted, the context is instead centered on the
+        # predicted position and sized for the uncertainty of the prediction.
         context_slice = slice(None)
 
         if self.last_known_position:
-            max_reachable_dist = self._calculate_max_travel_distance()
+            context_center = self.last_known_position
+            context_size = self._calculate_max_travel_distance()
 
-            context_coords, context_size = find_path_bounds(
-                self.gray_map.shape[0],
-                [scale_coords(self.last_known_position, self.scale)],
-                crop_border=0,
-                min_size=max_reachable_dist)
-            context_slice = create_slice(context_coords, context_size)
+            # A prediction is only used if it gives a smaller context than the worst case.
+            prediction = self._predict_position()
+            if prediction is not None:
+                predicted_position, predicted_radius = prediction
+                predicted_size = 2 * int(predicted_radius * self.scale) + self.minimap_iter.size
+
+                if predicted_size < context_size:
+                    context_center = self._clip_to_map(predicted_position)
+                    context_size = predicted_size
+
+            context_slice = self._create_context_slice(context_center, context_size)
 
         return context_slice
 
-    def _calculate_max_travel_distance(self):
+    def _create_context_slice(self, unscaled_center, size):
+        context_coords, context_size = find_path_bounds(
+            self.gray_map.shape[0],
+            [scale_coords(unscaled_center, self.scale)],
+            crop_border=0,
+            min_size=size)
+        return create_slice(context_coords, context_size)
+
+    def _predict_position(self, timestamp=None):
+        # Predictions are only trusted while the player is being found in every frame.  After
+        # a missed frame, the worst case context is used until the tracker is confident again.
+        if not self.tracking or self.missed_frames or \
+                self.tracker.last_measurement != self.last_known_position:
+            return None
+
+        return self.tracker.predict(self.current_timestamp if timestamp is None else timestamp)
+
+    def _clip_to_map(self, unscaled_position):
+        map_size = self.game_map.size - 1
+        return tuple(int(min(max(coord, 0), map_size)) for coord in unscaled_position)
+
+    def _calculate_max_travel_distance(self, missed_frames=None, timestamp=None):
         # First, we get the maximum number of unscaled pixels that is expected we could travel
         # This doesn't cover weird edge cases like being flung across the map or something like
         # that.  Sorry. This must also be per time_step as well so that we don't scale the map
@@ -191,7 +736,20 @@ class PUBGISMatch:
         # the number of frames multiplied by the max travel distance.
         # The reason that 1 is added to missed_frames, is that if we haven't missed the
         # last frame, we still need to account for one frame of travel.
-        max_reachable_dist = (self.missed_frames + 1) * int(max_scaled_pixels_per_step)
+        if missed_frames is None:
+            missed_frames = self.missed_frames
+        steps = missed_frames + 1
+
+        # If the time step varies (an adaptive iterator), more than missed_frames + 1 time steps
+        # may have passed since the last known position, so the time actually elapsed is used
+        # when it's longer.
+        if timestamp is None:
+            timestamp = self.current_timestamp
+        if timestamp is not None and self.last_known_timestamp is not None:
+            elapsed = timestamp - self.last_known_timestamp
+            steps = max(steps, elapsed / self.minimap_iter.time_step)
+
+        max_reachable_dist = int(steps * int(max_scaled_pixels_per_step))
         # multiply by 2 to get the width of the search space
         max_reachable_dist *= 2
         # Add a buffer around the edge so that there is at least 1/2 the minimap around the edge
@@ -244,11 +802,16 @@ class PUBGISMatch:
             self.missed_frames = 0
         else:
             self.missed_frames += 1
+            self.tracker.miss()
 
     def _update_last_unscaled_position(self, unscaled_position):
         if unscaled_position:
             if self.last_known_position is not None or self._is_position_on_land(unscaled_position):
                 self.last_known_position = unscaled_position
+                self.last_known_timestamp = self.current_timestamp
+
+                if self.current_timestamp is not None:
+                    self.tracker.update(unscaled_position, self.current_timestamp)
 
     @staticmethod
     def _create_masks(size):
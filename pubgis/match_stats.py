@@ -0,0 +1,82 @@
+import csv
+import json
+
+import numpy as np
+
+# Stages of processing a single minimap that are timed.  fetch is the time spent waiting for the
+# minimap iterator, the remaining stages correspond to the steps in PUBGISMatch.
+STAGES = ("fetch", "static_check", "color_diff", "template_match", "penalty", "validation")
+
+# Values recorded for each frame in addition to the stage timings.
+# static_frame is True for frames that were skipped because they were the same as the last frame.
+FRAME_FIELDS = ("timestamp", "matched", "static_frame", "full_map_search", "context_size",
+                "missed_frames")
+
+PERCENTILES = (50, 90, 99)
+
+
+class MatchStats:
+    """
+    MatchStats collects timings and other details about each frame processed by a PUBGISMatch.
+
+    A MatchStats is passed to PUBGISMatch to enable collection.  When no MatchStats is
+    given to PUBGISMatch, none of the timing is performed.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.current_frame = None
+
+    def start_frame(self):
+        self.current_frame = dict.fromkeys(FRAME_FIELDS)
+        self.current_frame.update(dict.fromkeys(STAGES, 0.0))
+
+    def add_time(self, stage, seconds):
+        self.current_frame[stage] += seconds
+
+    def record(self, **values):
+        self.current_frame.update(values)
+
+    def end_frame(self, **values):
+        self.record(**values)
+        self.frames.append(self.current_frame)
+        self.current_frame = None
+
+    def summary(self):
+        summary = {'frames': len(self.frames),
+                   'matched_frames': sum(bool(frame['matched']) for frame in self.frames),
+                   'static_frames': sum(bool(frame['static_frame']) for frame in self.frames),
+                   'full_map_searches': sum(bool(frame['full_map_search'])
+                                            for frame in self.frames),
+                   'max_missed_frames': max((frame['missed_frames'] or 0
+                                             for frame in self.frames), default=0),
+                   'stages': {}}
+
+        context_sizes = [frame['context_size'] for frame in self.frames if frame['context_size']]
+        summary['mean_context_size'] = float(np.mean(context_sizes)) if context_sizes else None
+
+        for stage in STAGES:
+            times = np.array([frame[stage] for frame in self.frames])
+            stage_summary = {'total': float(np.sum(times)) if times.size else 0.0,
+                             'mean': float(np.mean(times)) if times.size else 0.0,
+                             'max': float(np.max(times)) if times.size else 0.0}
+            for percentile in PERCENTILES:
+                stage_summary[f'p{percentile}'] = \
+                    float(np.percentile(times, percentile)) if times.size else 0.0
+            summary['stages'][stage] = stage_summary
+
+        return summary
+
+    def output_json(self, filename, include_frames=False):
+        data = self.summary()
+        if include_frames:
+            data['frame_details'] = self.frames
+
+        with open(filename, 'w') as json_output_file:
+            json.dump(data, json_output_file, indent=2)
+
+    def output_csv(self, filename):
+        with open(filename, 'w', newline='') as csv_output_file:
+            writer = csv.DictWriter(csv_output_file, fieldnames=FRAME_FIELDS + STAGES)
+            writer.writeheader()
+            writer.writerows(self.frames)
@@ -1,3 +1,5 @@
+import numpy as np
+
 SUPPORTED_RESOLUTIONS = \
     {
         #(1280, 720): (532, 1087, 167),
@@ -17,6 +19,12 @@ class GenericIterator:
         self.size = None
         self.time_step = None
 
+        # Iterators that set reuses_buffer return the same minimap array each time, overwritten
+        # with the contents of the next minimap.  Anything keeping a minimap past the next
+        # iteration must copy it.
+        self.reuses_buffer = False
+        self.minimap_buffer = None
+
     def stop(self):
         self.stop_requested = True
 
@@ -24,6 +32,22 @@ class GenericIterator:
         if self.stop_requested:
             raise StopIteration
 
+    def report_movement(self, distance, elapsed):
+        # Called by PUBGISMatch after each minimap is processed, with the distance (unscaled
+        # pixels) the player moved in elapsed seconds since the previous minimap, or None for
+        # both if the player wasn't found in either.  Iterators that adapt their time step to
+        # the player's movement override this.
+        pass
+
+    def copy_to_minimap_buffer(self, minimap):
+        # Copying the minimap out of the frame means the full frame isn't kept alive by a view,
+        # and the same compact buffer is used for every minimap instead of allocating a new one.
+        if self.minimap_buffer is None or self.minimap_buffer.shape != minimap.shape:
+            self.minimap_buffer = np.empty_like(minimap)
+
+        np.copyto(self.minimap_buffer, minimap)
+        return self.minimap_buffer
+
     def get_minimap_bounds(self, width, height):
         try:
             y_offset, x_offset, size = SUPPORTED_RESOLUTIONS[(width, height)]
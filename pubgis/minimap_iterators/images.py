@@ -1,26 +1,53 @@
 import os
 
 import cv2
+from PIL import Image
 
 from pubgis.minimap_iterators.generic import GenericIterator
 
+# JPEG images can be decoded at a reduced size much faster than decoding them at full size.
+# The reduced minimap will be matched against a map scaled to the same reduced size.
+REDUCED_READ_FLAGS = {1: cv2.IMREAD_COLOR,
+                      2: cv2.IMREAD_REDUCED_COLOR_2,
+                      4: cv2.IMREAD_REDUCED_COLOR_4,
+                      8: cv2.IMREAD_REDUCED_COLOR_8}
 
-class ImageIterator(GenericIterator):
-    def __init__(self, folder, time_step, just_minimaps=False):
+
+class ImageIterator(GenericIterator):  # pylint: disable=too-many-instance-attributes
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 folder,
+                 time_step,
+                 just_minimaps=False,
+                 reduction=1,
+                 reuse_buffer=True):
         super().__init__()
+
+        if reduction not in REDUCED_READ_FLAGS:
+            raise ValueError(f"reduction must be one of {sorted(REDUCED_READ_FLAGS)}")
+
         images = [os.path.join(folder, img) for img in os.listdir(folder)]
         self.total = len(images)
         self.images = iter(images)
         self.count = 0
         self.just_minimaps = just_minimaps
         self.time_step = time_step
-        first_image = cv2.imread(images[0])
+        self.read_flags = REDUCED_READ_FLAGS[reduction]
+        self.reuses_buffer = reuse_buffer
+
+        # Only the header of the first image is read to get its size, it doesn't need to be
+        # decoded.
+        with Image.open(images[0]) as first_image:
+            width, height = first_image.size
 
         if self.just_minimaps:
             self.frame_index = slice(None)
-            self.size = first_image.shape[0]
+            # Reduced JPEG decoding rounds partial pixels up.
+            self.size = -(-height // reduction)
         else:
-            self.frame_index = self.get_minimap_slice(*first_image.shape[0:2][::-1])
+            y_offset, x_offset, size = self.get_minimap_bounds(width, height)
+            self.size = size // reduction
+            self.frame_index = (slice(y_offset // reduction, y_offset // reduction + self.size),
+                                slice(x_offset // reduction, x_offset // reduction + self.size))
 
     def __iter__(self):
         return self
@@ -32,4 +59,9 @@ class ImageIterator(GenericIterator):
         timestamp = self.count * self.time_step
         self.count += 1
 
-        return self.count * 100 / self.total, timestamp, cv2.imread(img_path)[self.frame_index]
+        minimap = cv2.imread(img_path, self.read_flags)[self.frame_index]
+
+        if self.reuses_buffer:
+            minimap = self.copy_to_minimap_buffer(minimap)
+
+        return self.count * 100 / self.total, timestamp, minimap
@@ -7,10 +7,12 @@ from pubgis.minimap_iterators.generic import GenericIterator
 
 
 class LiveFeed(GenericIterator):
-    def __init__(self, time_step, monitor):
+    def __init__(self, time_step, monitor, start_time=0):
         super().__init__()
         self.monitor = monitor
         self.time_step = time_step
+        # Timestamps are the seconds since the first minimap was captured, plus start_time.
+        self.start_time = start_time
         self.sct = mss.mss()
         self.last_execution_time = None
         self.begin_time = None
@@ -40,4 +42,4 @@ class LiveFeed(GenericIterator):
 
         minimap = np.array(self.sct.grab(self.minimap_bounds))
 
-        return None, self.last_execution_time - self.begin_time, minimap
+        return None, self.start_time + self.last_execution_time - self.begin_time, minimap
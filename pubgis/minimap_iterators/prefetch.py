@@ -0,0 +1,95 @@
+import queue
+import threading
+
+from pubgis.minimap_iterators.generic import GenericIterator
+
+DEFAULT_PREFETCH = 8
+
+# How often (seconds) a blocked producer checks whether a stop has been requested.
+STOP_POLL_INTERVAL = 0.1
+
+
+class _IteratorFinished:
+    def __init__(self, exception=None):
+        self.exception = exception
+
+
+class PrefetchIterator(GenericIterator):
+    """
+    PrefetchIterator wraps another minimap iterator and reads from it on a background thread,
+    so that decoding the next minimaps happens at the same time as the current one is matched.
+
+    At most max_prefetch minimaps are read ahead.  stop() and report_movement() are passed
+    through to the wrapped iterator, and any exception raised by the wrapped iterator is raised
+    again from __next__.  Movement reported for a minimap only affects minimaps that haven't been
+    read ahead yet, so an adaptive time step reacts up to max_prefetch minimaps late.
+    """
+
+    def __init__(self, minimap_iterator, max_prefetch=DEFAULT_PREFETCH):
+        super().__init__()
+        self.minimap_iter = minimap_iterator
+        self.size = minimap_iterator.size
+        self.time_step = minimap_iterator.time_step
+        self.prefetch_queue = queue.Queue(maxsize=max_prefetch)
+        self.producer = None
+        self.finished = None
+
+    def stop(self):
+        super().stop()
+        self.minimap_iter.stop()
+
+    def report_movement(self, distance, elapsed):
+        self.minimap_iter.report_movement(distance, elapsed)
+
+    def __iter__(self):
+        if self.producer is None:
+            self.producer = threading.Thread(target=self._produce, daemon=True)
+            self.producer.start()
+        return self
+
+    def __next__(self):
+        self.check_for_stop()
+
+        if self.finished is None:
+            item = self.prefetch_queue.get()
+
+            if not isinstance(item, _IteratorFinished):
+                return item
+
+            self.finished = item
+
+        if self.finished.exception is not None:
+            raise self.finished.exception
+
+        raise StopIteration
+
+    def _produce(self):
+        finished = _IteratorFinished()
+
+        try:
+            for percent, timestamp, minimap in self.minimap_iter:
+                # The minimap will be overwritten by the next one read if the buffer is reused,
+                # so a copy is needed to queue it.
+                if self.minimap_iter.reuses_buffer:
+                    minimap = minimap.copy()
+
+                if not self._put((percent, timestamp, minimap)):
+                    return
+        except Exception as exception:  # pylint: disable=broad-except
+            # Any exception is passed to the consumer thread to be raised there.
+            finished = _IteratorFinished(exception)
+
+        self._put(finished)
+
+    def _put(self, item):
+        # put() blocks when the queue is full, which is what limits how far ahead the producer
+        # reads.  The timeout makes sure the producer doesn't stay blocked forever if the
+        # consumer stops reading.
+        while not self.stop_requested:
+            try:
+                self.prefetch_queue.put(item, timeout=STOP_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+
+        return False
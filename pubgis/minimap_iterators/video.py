@@ -1,4 +1,5 @@
 import os
+from enum import Enum, auto
 
 import cv2
 
@@ -6,9 +7,34 @@ from pubgis.minimap_iterators.generic import GenericIterator
 
 DEFAULT_STEP = 1
 
+# Seeking will decode from the keyframe before the requested frame, so it is only faster than
+# grabbing every frame if the frames to skip are further apart than the keyframe interval.  This
+# is a conservative guess at the keyframe interval of most recordings.
+MIN_SEEK_FRAMES = 250
+
+# With an adaptive time step, the time step is chosen so that the player is expected to move
+# about ADAPTIVE_TARGET_DISTANCE (unscaled pixels) between minimaps, at their current speed.  The
+# time step grows by at most ADAPTIVE_STEP_GROWTH times per minimap, but drops straight back as
+# soon as the player speeds up or isn't found.
+ADAPTIVE_TARGET_DISTANCE = 25
+ADAPTIVE_STEP_GROWTH = 2
+
+
+class FrameSkip(Enum):
+    GRAB = auto()  # decode every skipped frame, always accurate
+    SEEK = auto()  # seek directly to every frame needed
+    AUTO = auto()  # seek only when skipping at least MIN_SEEK_FRAMES
+
 
 class VideoIterator(GenericIterator):  # pylint: disable=too-many-instance-attributes
-    def __init__(self, video_file=None, landing_time=0, time_step=DEFAULT_STEP, death_time=0):
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 video_file=None,
+                 landing_time=0,
+                 time_step=DEFAULT_STEP,
+                 death_time=0,
+                 frame_skip=FrameSkip.AUTO,
+                 reuse_buffer=True,
+                 max_time_step=None):
         super().__init__()
         if not os.path.isfile(video_file):
             raise FileNotFoundError(video_file)
@@ -19,6 +45,10 @@ class VideoIterator(GenericIterator):  # pylint: disable=too-many-instance-attri
         if death_time and death_time < landing_time:
             raise ValueError("death time must be greater than landing time")
 
+        if max_time_step is not None and max_time_step < time_step:
+            raise ValueError("max time step must be >= time step")
+
+        self.video_file = video_file
         self.cap = cv2.VideoCapture(video_file)
         self.frame_index = self.get_minimap_slice(int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
                                                   int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
@@ -27,6 +57,13 @@ class VideoIterator(GenericIterator):  # pylint: disable=too-many-instance-attri
         self.landing_frame = int(landing_time * self.fps)
         self.time_step = time_step
         self.step_frames = max(int(time_step * self.fps), 1) - 1
+
+        # If max_time_step is set, the time step adapts to the movement reported by
+        # report_movement, between time_step and max_time_step.  current_time_step is the time
+        # step that will be used to skip to the next minimap.
+        self.max_time_step = max_time_step
+        self.current_time_step = time_step
+        self.step_pending = False
         if death_time:
             death_frame = int(death_time * self.fps)
         else:
@@ -34,26 +71,154 @@ class VideoIterator(GenericIterator):  # pylint: disable=too-many-instance-attri
         self.frames_processed = 0
         self.frames_to_process = death_frame - self.landing_frame
 
+        # frame_skip_used reports how frames were actually skipped.  It will be FrameSkip.SEEK
+        # once seeking has been used, or FrameSkip.GRAB if only grab() has been used or if
+        # seeking turned out to be inaccurate for this video.
+        self.frame_skip = frame_skip
+        self.frame_skip_used = None
+        self.seek_accurate = True
+        self.next_frame = 0
+        self.seeked_frame = None
+
+        # Each frame is decoded into the same frame_buffer, and the minimap is copied out of it
+        # into the minimap buffer, so no memory is allocated per frame.
+        self.reuses_buffer = reuse_buffer
+        self.frame_buffer = None
+
     def __iter__(self):
-        for _ in range(self.landing_frame):
-            self.cap.grab()
+        # frames_processed is only more than 0 here if the iterator is resuming.
+        self._skip_to_frame(self.landing_frame + self.frames_processed)
         return self
 
+    def get_frame_number(self, timestamp):
+        """
+        :return: the frame of the video the minimap at timestamp was read from
+        """
+        return self.landing_frame + int(round(timestamp * self.fps))
+
+    def resume_after(self, frame_number, time_step=None):
+        """
+        Continue from the frame after frame_number, as if the minimap read from frame_number
+        had just been returned (and, with an adaptive time step, time_step was the time step
+        reported for it), to resume a match that was interrupted.  This must be called before
+        iterating.
+        """
+        if frame_number < self.landing_frame:
+            raise ValueError("can't resume before the landing time")
+
+        if time_step is not None:
+            self.current_time_step = time_step
+            self.step_frames = max(int(time_step * self.fps), 1) - 1
+
+        # The step to the next minimap is included, so that __iter__ skips straight to it.
+        self.frames_processed = frame_number - self.landing_frame + 1 + self.step_frames
+        self.step_pending = False
+
     def __next__(self):
         self.check_for_stop()
 
-        grabbed, frame = self.cap.read()
+        # Skipping to the next minimap is left until it's needed, so that the time step can
+        # still be changed by report_movement after the previous minimap was returned.
+        if self.step_pending:
+            self._skip_to_frame(self.next_frame + self.step_frames)
+            self.frames_processed += self.step_frames
+            self.step_pending = False
+
+        grabbed, frame = self._read_frame()
         timestamp = self.frames_processed / self.fps
         self.frames_processed += 1
 
         if grabbed and self.frames_processed < self.frames_to_process:
-            minimap = frame[self.frame_index]
+            if self.reuses_buffer:
+                minimap = self.copy_to_minimap_buffer(frame[self.frame_index])
+            else:
+                minimap = frame[self.frame_index]
             percent = min((self.frames_processed / self.frames_to_process) * 100, 100)
-
-            for _ in range(self.step_frames):
-                self.cap.grab()
-            self.frames_processed += self.step_frames
+            self.step_pending = True
 
             return percent, timestamp, minimap
         else:
             raise StopIteration
+
+    def report_movement(self, distance, elapsed):
+        if self.max_time_step is None:
+            return
+
+        if distance is None or not elapsed or elapsed <= 0:
+            time_step = self.time_step
+        elif distance > 0:
+            time_step = min(ADAPTIVE_TARGET_DISTANCE * elapsed / distance,
+                            self.current_time_step * ADAPTIVE_STEP_GROWTH)
+        else:
+            time_step = self.current_time_step * ADAPTIVE_STEP_GROWTH
+
+        self.current_time_step = min(max(time_step, self.time_step), self.max_time_step)
+        self.step_frames = max(int(self.current_time_step * self.fps), 1) - 1
+
+    def _should_seek(self, frames_to_skip):
+        if self.frame_skip == FrameSkip.GRAB or not self.seek_accurate:
+            return False
+
+        return self.frame_skip == FrameSkip.SEEK or frames_to_skip >= MIN_SEEK_FRAMES
+
+    def _skip_to_frame(self, frame_number):
+        frames_to_skip = frame_number - self.next_frame
+
+        if frames_to_skip <= 0:
+            return
+
+        if self._should_seek(frames_to_skip):
+            if self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number) and \
+                    int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_number:
+                # Whether the seek was accurate can only be checked once the frame is read.
+                self.seeked_frame = frame_number
+                self.frame_skip_used = FrameSkip.SEEK
+            else:
+                self._reopen_at_frame(frame_number)
+        else:
+            for _ in range(frames_to_skip):
+                self.cap.grab()
+
+            # A frame that was seeked to, but not read, has been skipped.
+            self.seeked_frame = None
+
+            if self.frame_skip_used is None:
+                self.frame_skip_used = FrameSkip.GRAB
+
+        self.next_frame = frame_number
+
+    def _reopen_at_frame(self, frame_number):
+        # Some containers don't seek accurately (for example, when the index is missing or the
+        # frame rate is variable).  In that case, the position in the video is unknown, so the
+        # video is reopened and every frame is grabbed up to the desired frame.  Seeking
+        # isn't attempted again for this video.
+        self.seek_accurate = False
+        self.frame_skip_used = FrameSkip.GRAB
+        self.cap.release()
+        self.cap = cv2.VideoCapture(self.video_file)
+
+        for _ in range(frame_number):
+            self.cap.grab()
+
+    def _read_frame(self):
+        grabbed, frame = self.cap.read(self.frame_buffer if self.reuses_buffer else None)
+
+        if grabbed and self.seeked_frame is not None:
+            if not self._is_frame_time_correct(self.seeked_frame):
+                self._reopen_at_frame(self.seeked_frame)
+                grabbed, frame = self.cap.read()
+
+        if grabbed and self.reuses_buffer:
+            self.frame_buffer = frame
+
+        self.seeked_frame = None
+        self.next_frame += 1
+
+        return grabbed, frame
+
+    def _is_frame_time_correct(self, frame_number):
+        # After reading, CAP_PROP_POS_MSEC is the timestamp of the frame that was just read.
+        # This is compared against the timestamp the frame should have, within half a frame.
+        exact_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        expected_msec = frame_number * 1000 / exact_fps
+        return abs(self.cap.get(cv2.CAP_PROP_POS_MSEC) - expected_msec) < 500 / exact_fps
@@ -7,3 +7,4 @@ class OutputFlags(Flag):
     CROPPED_MAP = auto()
     FULL_MAP = auto()
     JSON = auto()
+    BINARY = auto()
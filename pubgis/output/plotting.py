@@ -25,3 +25,15 @@ def plot_coordinate_line(input_map, prev_positions, position, color, thickness):
                      color=color,
                      thickness=thickness,
                      lineType=cv2.LINE_AA)
+
+
+def plot_path(input_map, positions, color, thickness):
+    valid_positions = [position for position in positions if position is not None]
+
+    for start, end in zip(valid_positions[:-1], valid_positions[1:]):
+        cv2.line(input_map,
+                 start,
+                 end,
+                 color=color,
+                 thickness=thickness,
+                 lineType=cv2.LINE_AA)
@@ -0,0 +1,252 @@
+"""
+Compact binary trajectory format, an alternative to the JSON output that can be loaded without
+parsing or validating every position.
+
+A trajectory file is a header followed by fixed size records, one for each timestamp:
+
+    MAGIC (8 bytes)
+    VERSION (little endian uint32)
+    length of the metadata (little endian uint32)
+    metadata (name, game, team and optionally map) as UTF-8 JSON, padded with spaces to a
+        multiple of 8 bytes
+    records of TRAJECTORY_DTYPE
+
+As the records are fixed size and follow the header, the file can be memory-mapped as a
+structured array, and appended to by writing more records.  TrajectoryWriter writes a file
+incrementally while a match is processed.
+"""
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from pubgis.output.pubgis_json import read_json_file, parse_input_json_data
+
+MAGIC = b"PUBGISTR"
+VERSION = 1
+BINARY_EXTENSION = ".traj"
+
+HEADER_FORMAT = "<8sII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+METADATA_ALIGNMENT = 8
+
+# TrajectoryWriter writes the positions to disk once it has this many, or when this many
+# seconds have passed since they were last written, whichever is first.
+TRAJECTORY_BATCH_SIZE = 64
+TRAJECTORY_FLUSH_INTERVAL = 5
+
+# Positions that weren't found have valid set to False, and 0 for x and y.
+TRAJECTORY_DTYPE = np.dtype([("timestamp", "<f8"),
+                             ("x", "<i4"),
+                             ("y", "<i4"),
+                             ("valid", "?")])
+
+
+def create_binary_data(positions, timestamps):
+    """
+    :return: structured array of TRAJECTORY_DTYPE with a record for each timestamp
+    """
+    trajectory = np.zeros(len(timestamps), dtype=TRAJECTORY_DTYPE)
+    trajectory["timestamp"] = timestamps
+    trajectory["valid"] = [position is not None for position in positions]
+
+    found = [position for position in positions if position is not None]
+    if found:
+        found_coords = np.array(found)
+        trajectory["x"][trajectory["valid"]] = found_coords[:, 0]
+        trajectory["y"][trajectory["valid"]] = found_coords[:, 1]
+
+    return trajectory
+
+
+def create_header(name=None, game=None, team=None, map_name=None):
+    metadata = {'name': name, 'game': game, 'team': team}
+    if map_name is not None:
+        metadata['map'] = map_name
+
+    metadata = json.dumps(metadata).encode("utf-8")
+    metadata += b" " * (-len(metadata) % METADATA_ALIGNMENT)
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(metadata)) + metadata
+
+
+def read_header(binary_file):
+    """
+    Read the header of a trajectory file opened in binary mode.
+
+    :return: (metadata dict, offset of the first record)
+    """
+    header = binary_file.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("not a PUBGIS trajectory file")
+
+    magic, version, metadata_length = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ValueError("not a PUBGIS trajectory file")
+    if version != VERSION:
+        raise ValueError(f"unsupported trajectory file version: {version}")
+
+    metadata = binary_file.read(metadata_length)
+    if len(metadata) < metadata_length:
+        raise ValueError("trajectory file header is truncated")
+
+    return json.loads(metadata.decode("utf-8")), HEADER_SIZE + metadata_length
+
+
+def output_binary(filename,  # pylint: disable=too-many-arguments
+                  trajectory,
+                  name=None,
+                  game=None,
+                  team=None,
+                  map_name=None):
+    with open(filename, 'wb') as binary_output_file:
+        binary_output_file.write(create_header(name=name, game=game, team=team, map_name=map_name))
+        binary_output_file.write(np.ascontiguousarray(trajectory, dtype=TRAJECTORY_DTYPE))
+
+
+def input_binary(filename, mmap=True):
+    """
+    Read a trajectory file.  With mmap, the records are memory-mapped (read only) rather than
+    read into memory.  Incomplete records at the end of the file are ignored.
+
+    :return: (name, trajectory, game, team), trajectory is a structured array of TRAJECTORY_DTYPE
+    """
+    with open(filename, 'rb') as binary_input_file:
+        metadata, offset = read_header(binary_input_file)
+        binary_input_file.seek(0, 2)
+        num_records = (binary_input_file.tell() - offset) // TRAJECTORY_DTYPE.itemsize
+
+        if num_records == 0:
+            # Empty files can't be memory-mapped.
+            trajectory = np.zeros(0, dtype=TRAJECTORY_DTYPE)
+        elif mmap:
+            trajectory = np.memmap(binary_input_file,
+                                   dtype=TRAJECTORY_DTYPE,
+                                   mode='r',
+                                   offset=offset,
+                                   shape=(num_records,))
+        else:
+            binary_input_file.seek(offset)
+            trajectory = np.fromfile(binary_input_file, dtype=TRAJECTORY_DTYPE, count=num_records)
+
+    return metadata.get('name'), trajectory, metadata.get('game'), metadata.get('team')
+
+
+def valid_positions(trajectory):
+    """
+    :return: (N, 2) array of the x, y of every position that was found
+    """
+    valid = trajectory[trajectory["valid"]]
+    return np.column_stack((valid["x"], valid["y"]))
+
+
+def trajectory_to_lists(trajectory):
+    """
+    :return: (positions, timestamps) the same as they would be read from the JSON output
+    """
+    positions = [(int(x), int(y)) if valid else None
+                 for x, y, valid in zip(trajectory["x"], trajectory["y"], trajectory["valid"])]
+    timestamps = trajectory["timestamp"].tolist()
+    return positions, timestamps
+
+
+def convert_json_to_binary(json_file, binary_file):
+    """
+    Convert an existing JSON output to a trajectory file.
+
+    :return: True if the JSON was valid and has been converted
+    """
+    name, positions, timestamps, game, team = parse_input_json_data(read_json_file(json_file))
+    if positions is None:
+        return False
+
+    output_binary(binary_file,
+                  create_binary_data(positions, timestamps),
+                  name=name,
+                  game=game,
+                  team=team)
+    return True
+
+
+class TrajectoryWriter:
+    """
+    TrajectoryWriter appends positions to a trajectory file as they are found, so that only the
+    positions not yet written are kept in memory, and a crash loses at most the last batch.
+
+    Every batch is written as whole records and synced to disk.  If a crash happens in the middle
+    of writing a batch, the partially written record is ignored when the file is read, and removed
+    when the file is resumed.
+
+    With resume, the records already in an existing file are loaded into previous, and new
+    records are appended after them.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 filename,
+                 name=None,
+                 game=None,
+                 team=None,
+                 resume=False,
+                 batch_size=TRAJECTORY_BATCH_SIZE,
+                 flush_interval=TRAJECTORY_FLUSH_INTERVAL):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch = []
+
+        if resume and os.path.exists(filename):
+            self.trajectory_file = open(filename, 'r+b')
+            self.previous = self._load_previous()
+        else:
+            self.trajectory_file = open(filename, 'wb')
+            self.trajectory_file.write(create_header(name=name, game=game, team=team))
+            self.previous = np.zeros(0, dtype=TRAJECTORY_DTYPE)
+            self._sync()
+
+        self.last_flush_time = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _load_previous(self):
+        _, offset = read_header(self.trajectory_file)
+        self.trajectory_file.seek(0, 2)
+        num_records = (self.trajectory_file.tell() - offset) // TRAJECTORY_DTYPE.itemsize
+
+        # Remove a record that was only partially written before a crash, so that new records
+        # start at a record boundary.
+        self.trajectory_file.truncate(offset + num_records * TRAJECTORY_DTYPE.itemsize)
+
+        self.trajectory_file.seek(offset)
+        previous = np.frombuffer(self.trajectory_file.read(), dtype=TRAJECTORY_DTYPE)
+        self.trajectory_file.seek(0, 2)
+        return previous
+
+    def _sync(self):
+        self.trajectory_file.flush()
+        os.fsync(self.trajectory_file.fileno())
+
+    def write(self, timestamp, position):
+        self.batch.append((timestamp, position))
+
+        if len(self.batch) >= self.batch_size or \
+                time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            timestamps, positions = zip(*self.batch)
+            self.trajectory_file.write(create_binary_data(positions, timestamps).tobytes())
+            self.batch = []
+
+        self._sync()
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        if not self.trajectory_file.closed:
+            self.flush()
+            self.trajectory_file.close()
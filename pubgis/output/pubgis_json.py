@@ -1,5 +1,8 @@
 import json
-from jsonschema import validate, ValidationError
+import numbers
+from functools import lru_cache
+
+from jsonschema.validators import validator_for
 
 SCHEMA = {
     "$schema": "http://json-schema.org/draft-06/schema#",
@@ -33,16 +36,54 @@ SCHEMA = {
 }
 
 
-# TODO: clean up json validation
+# Checking each position against SCHEMA with the generic schema machinery is slow for long matches,
+# so the positions are checked by _position_entry_valid instead, which accepts exactly the same
+# positions.  The rest of the document is checked against METADATA_SCHEMA.
+METADATA_SCHEMA = dict(SCHEMA, properties=dict(SCHEMA["properties"], positions={"type": "array"}))
 
+ARRAY_TYPES = (list, tuple)
 
-def valididate_pubgis_schema(data):
-    try:
-        validate(data, SCHEMA, types={'array': (list, tuple)})
-        return True
-    except ValidationError:
+STREAM_CHUNK_SIZE = 64 * 1024
+JSON_WHITESPACE = " \t\n\r"
+
+
+@lru_cache(maxsize=None)
+def _get_metadata_validator():
+    # Creating the validator (and checking the schema itself) is only done once.
+    validator_class = validator_for(METADATA_SCHEMA)
+    validator_class.check_schema(METADATA_SCHEMA)
+    return validator_class(METADATA_SCHEMA, types={'array': ARRAY_TYPES})
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _position_entry_valid(entry):
+    # The same rules as the "positions" items of SCHEMA: [timestamp, [x, y] or null].  As in the
+    # schema, entries and coordinates may be shorter, or have extra items.
+    if not isinstance(entry, ARRAY_TYPES):
         return False
 
+    if entry and not _is_number(entry[0]):
+        return False
+
+    if len(entry) > 1 and entry[1] is not None:
+        position = entry[1]
+        return isinstance(position, ARRAY_TYPES) and all(_is_integer(coord)
+                                                         for coord in position[:2])
+
+    return True
+
+
+def valididate_pubgis_schema(data):
+    return _get_metadata_validator().is_valid(data) and \
+        all(map(_position_entry_valid, data['positions']))
+
 
 def create_json_data(positions, timestamps, name=None, game=None, team=None):
     return {'name': name,
@@ -51,8 +92,8 @@ def create_json_data(positions, timestamps, name=None, game=None, team=None):
             'positions': list(zip(timestamps, positions))}
 
 
-def output_json(filename, data):
-    if valididate_pubgis_schema(data):
+def output_json(filename, data, validate=True):
+    if not validate or valididate_pubgis_schema(data):
         with open(filename, 'w') as json_output_file:
             json.dump(data, json_output_file)
 
@@ -66,8 +107,9 @@ def read_json_file(filename):
     return data
 
 
-def parse_input_json_data(data):
-    if valididate_pubgis_schema(data):
+def parse_input_json_data(data, validate=True):
+    # validate can be disabled for trusted files, such as those written by output_json.
+    if not validate or valididate_pubgis_schema(data):
         try:
             name = data['name']
         except KeyError:
@@ -93,6 +135,106 @@ def parse_input_json_data(data):
     return None, None, None, None, None
 
 
-def input_json(filename):
+def input_json(filename, validate=True):
     data = read_json_file(filename)
-    return parse_input_json_data(data)
+    return parse_input_json_data(data, validate=validate)
+
+
+class _JSONStream:
+    """
+    _JSONStream decodes the JSON values in a file one at a time, only reading as much of the file
+    as is needed for the next value.
+    """
+
+    def __init__(self, json_file, chunk_size=STREAM_CHUNK_SIZE):
+        self.json_file = json_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.index = 0
+        self.eof = False
+
+    def _read(self):
+        chunk = self.json_file.read(self.chunk_size)
+        self.buffer = self.buffer[self.index:] + chunk
+        self.index = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        """
+        :return: the next character that isn't whitespace, or "" at the end of the file
+        """
+        while True:
+            while self.index < len(self.buffer) and self.buffer[self.index] in JSON_WHITESPACE:
+                self.index += 1
+
+            if self.index < len(self.buffer) or not self._read():
+                return self.buffer[self.index:self.index + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"expected one of {characters!r}, found {character!r}")
+        self.index += 1
+        return character
+
+    def decode(self):
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.index)
+
+                # A value that ends at the end of the buffer (a number) may continue in the
+                # next chunk.
+                if end < len(self.buffer) or self.eof:
+                    self.index = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self._read()
+
+
+def iter_json_positions(filename, validate=True, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Read the positions of a JSON output one at a time, without loading the whole file into
+    memory.  With validate, each position is checked as it is read, and ValueError is raised
+    for the first invalid position.  The other properties of the file aren't checked.
+
+    :return: generator of (timestamp, position) in the same form as parse_input_json_data
+    """
+    with open(filename, 'r') as json_input_file:
+        stream = _JSONStream(json_input_file, chunk_size)
+        stream.expect("{")
+
+        if stream.peek() == "}":
+            raise ValueError("no positions in file")
+
+        while True:
+            key = stream.decode()
+            stream.expect(":")
+
+            if key == "positions":
+                break
+
+            stream.decode()
+            if stream.expect(",}") == "}":
+                raise ValueError("no positions in file")
+
+        stream.expect("[")
+        if stream.peek() == "]":
+            return
+
+        while True:
+            entry = stream.decode()
+            if validate and not _position_entry_valid(entry):
+                raise ValueError(f"invalid position: {entry!r}")
+
+            timestamp, position = entry
+            yield timestamp, tuple(position) if position is not None else position
+
+            if stream.expect(",]") == "]":
+                return
@@ -0,0 +1,215 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pubgis.maps import DEFAULT_MAP, AUTO_MAP, GameMap, get_map
+from pubgis.match import PUBGISMatch
+from pubgis.minimap_iterators.prefetch import PrefetchIterator
+from pubgis.minimap_iterators.video import VideoIterator, DEFAULT_STEP
+
+# Each segment after the first begins SEGMENT_OVERLAP_STEPS time steps before the previous segment
+# ends.  Because each segment starts without a last known position, these overlapping steps are
+# used to re-acquire the player and to confirm that the same position was found by both segments.
+SEGMENT_OVERLAP_STEPS = 5
+
+# Segments shorter than this aren't worth the cost of starting a new match.
+MIN_SEGMENT_STEPS = 30
+
+# Maximum distance (unscaled pixels) between the positions found by two segments for the same
+# frame for them to be considered the same position.
+SEGMENT_AGREEMENT_DIST = 10
+
+
+def _frame_to_time(frame, fps):
+    # VideoIterator converts times to frames by truncation, so the middle of the frame is used to
+    # make sure floating point error doesn't result in the previous frame being used.
+    return (frame + 0.5) / fps
+
+
+def _process_segment(video_file,  # pylint: disable=too-many-arguments
+                     fps,
+                     start_frame,
+                     end_frame,
+                     time_step,
+                     last_known_position=None,
+                     missed_frames=0,
+                     match_kwargs=None):
+    video_iter = VideoIterator(video_file=video_file,
+                               landing_time=_frame_to_time(start_frame, fps),
+                               time_step=time_step,
+                               death_time=_frame_to_time(end_frame, fps))
+    match = PUBGISMatch(PrefetchIterator(video_iter), **(match_kwargs or {}))
+    match.last_known_position = last_known_position
+    match.missed_frames = missed_frames
+
+    return [position for _, _, position in match.process_match()]
+
+
+def split_segments(total_steps, num_segments):
+    """
+    Split total_steps time steps into num_segments contiguous ranges of roughly equal size.
+    No segment will be shorter than MIN_SEGMENT_STEPS, unless there is only a single segment.
+
+    :return: list of (first_step, end_step) tuples, end_step is exclusive
+    """
+    num_segments = max(1, min(num_segments, total_steps // MIN_SEGMENT_STEPS))
+    boundaries = [total_steps * i // num_segments for i in range(num_segments + 1)]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _positions_agree(previous_positions, overlap_positions):
+    compared = [(prev, overlap) for prev, overlap in zip(previous_positions, overlap_positions)
+                if prev is not None and overlap is not None]
+
+    if not compared:
+        # Nothing can be compared, so the segment can only be trusted if the previous segment
+        # also had no idea where the player was.
+        return all(prev is None for prev in previous_positions)
+
+    return all(max(abs(a - b) for a, b in zip(prev, overlap)) <= SEGMENT_AGREEMENT_DIST
+               for prev, overlap in compared)
+
+
+def _tracking_state(positions):
+    # Recreate the state a sequential PUBGISMatch would be in after processing positions.
+    missed_frames = 0
+    for position in reversed(positions):
+        if position is not None:
+            return position, missed_frames
+        missed_frames += 1
+    return None, 0
+
+
+class SegmentedVideoMatch:  # pylint: disable=too-many-instance-attributes
+    """
+    SegmentedVideoMatch processes a video in multiple segments simultaneously, each in its own
+    process with its own PUBGISMatch.  The results of each segment are stitched back together in
+    order, so the output of process_match is the same as PUBGISMatch.process_match would be
+    for a VideoIterator over the same video.  The exception is when tracking (the default), as
+    each segment predicts the player's movement from its own positions, so the contexts searched
+    differ, and positions can differ by a pixel or two where matches are almost equally good.
+
+    Each segment begins by searching the full map.  The first few time steps of each segment
+    overlap with the end of the previous segment, and if the positions found don't agree, the
+    segment is processed again starting from the last known position of the previous segment.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 video_file,
+                 landing_time=0,
+                 time_step=DEFAULT_STEP,
+                 death_time=0,
+                 processes=None,
+                 segments=None,
+                 **match_kwargs):
+        # A VideoIterator is created here for validation of the arguments and to calculate
+        # the frames each time step will correspond to.
+        video_iter = VideoIterator(video_file=video_file,
+                                   landing_time=landing_time,
+                                   time_step=time_step,
+                                   death_time=death_time)
+
+        self.video_file = video_file
+        self.landing_time = landing_time
+        self.death_time = death_time
+        self.time_step = time_step
+        self.fps = video_iter.fps
+        self.landing_frame = video_iter.landing_frame
+        self.frames_to_process = video_iter.frames_to_process
+        self.stride = video_iter.step_frames + 1
+        self.processes = processes or os.cpu_count()
+        self.match_kwargs = match_kwargs
+        self.game_map = None
+
+        # VideoIterator will output a frame every stride frames, up to (but not including) the
+        # last frame to process.
+        self.total_steps = max(0, (self.frames_to_process - 2) // self.stride + 1)
+        self.segments = split_segments(self.total_steps, segments or self.processes)
+
+    def _segment_frames(self, first_step, end_step):
+        start_frame = self.landing_frame + first_step * self.stride
+        # VideoIterator stops one frame before the death frame, so the end frame needs to be
+        # extended past the last time step to ensure it is included.
+        end_frame = start_frame + (end_step - first_step - 1) * self.stride + 2
+        end_frame = min(end_frame, self.landing_frame + self.frames_to_process)
+        return start_frame, end_frame
+
+    def _submit_segments(self, executor):
+        futures = []
+        for segment_index, (first_step, end_step) in enumerate(self.segments):
+            if segment_index > 0:
+                first_step = max(0, first_step - SEGMENT_OVERLAP_STEPS)
+
+            futures.append(executor.submit(_process_segment,
+                                           self.video_file,
+                                           self.fps,
+                                           *self._segment_frames(first_step, end_step),
+                                           self.time_step,
+                                           match_kwargs=self.match_kwargs))
+        return futures
+
+    def _reprocess_segment(self, first_step, end_step, previous_positions):
+        last_known_position, missed_frames = _tracking_state(previous_positions)
+        return _process_segment(self.video_file,
+                                self.fps,
+                                *self._segment_frames(first_step, end_step),
+                                self.time_step,
+                                last_known_position=last_known_position,
+                                missed_frames=missed_frames,
+                                match_kwargs=self.match_kwargs)
+
+    def _identify_game_map(self):
+        # Every segment must be matched against the same map, so the map is identified once from
+        # the start of the video rather than by each segment.
+        video_iter = VideoIterator(video_file=self.video_file,
+                                   landing_time=self.landing_time,
+                                   time_step=self.time_step,
+                                   death_time=self.death_time)
+        game_map, _ = PUBGISMatch(video_iter, **self.match_kwargs).identify_game_map()
+        return game_map
+
+    def _set_game_map(self):
+        game_map = self.match_kwargs.get("game_map")
+        if game_map == AUTO_MAP:
+            self.game_map = self._identify_game_map()
+        elif isinstance(game_map, GameMap):
+            self.game_map = game_map
+        else:
+            self.game_map = get_map(game_map or DEFAULT_MAP)
+
+        # The GameMap itself is passed to the segments rather than its name, as the map may not be
+        # registered in the processes they run in.
+        self.match_kwargs = dict(self.match_kwargs, game_map=self.game_map)
+
+    def _stitch_segment(self, segment_index, segment_positions, positions):
+        """
+        :return: the positions of the segment after the overlap with the previous segment
+        """
+        first_step, end_step = self.segments[segment_index]
+
+        if segment_index > 0:
+            overlap = min(SEGMENT_OVERLAP_STEPS, first_step)
+            overlap_positions = segment_positions[:overlap]
+            segment_positions = segment_positions[overlap:]
+
+            if not _positions_agree(positions[-overlap:], overlap_positions):
+                segment_positions = self._reprocess_segment(first_step, end_step, positions)
+
+        return segment_positions
+
+    def process_match(self):
+        positions = []
+        self._set_game_map()
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = self._submit_segments(executor)
+
+            for segment_index, future in enumerate(futures):
+                first_step, _ = self.segments[segment_index]
+                segment_positions = self._stitch_segment(segment_index, future.result(), positions)
+
+                for step, position in enumerate(segment_positions, start=first_step):
+                    frames_processed = step * self.stride
+                    percent = min(((frames_processed + 1) / self.frames_to_process) * 100, 100)
+                    yield percent, frames_processed / self.fps, position
+
+                positions.extend(segment_positions)
@@ -0,0 +1,148 @@
+"""
+Cache of the trajectories found for videos, so that a video processed again with the same
+matching parameters (for example, only to change the path color or the outputs) doesn't need to
+be matched again.
+
+Each entry is a binary trajectory file, named by a hash of the video's fingerprint and every
+parameter that affects which positions are found.  Rendering parameters (path color, thickness
+and outputs) are not part of the key, so any output can be created again from a cached entry.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from pubgis import __version__
+from pubgis.match import COLOR_DIFF_THRESHS, TEMPLATE_MATCH_THRESHS, STATIC_FRAME_THRESHOLD
+from pubgis.output.pubgis_binary import output_binary, input_binary, read_header, \
+    create_binary_data, trajectory_to_lists, BINARY_EXTENSION
+
+# RESULT_CACHE_VERSION must be incremented whenever a change to the matching could change the
+# positions found for a video, so that results from before the change are never used.  The
+# package version is part of the key as well, so every release starts with a fresh cache.
+RESULT_CACHE_VERSION = 1
+
+DEFAULT_RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pubgis", "results")
+
+# Least recently used entries are removed once the entries take up more than this many bytes.
+DEFAULT_RESULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Videos are fingerprinted from their size and FINGERPRINT_CHUNKS chunks of FINGERPRINT_CHUNK_SIZE
+# bytes spread evenly through the file, rather than hashing the whole file, which would take
+# longer than most re-exports.  A recording can't change without changing its size or the
+# encoded data in these chunks in practice.
+FINGERPRINT_CHUNKS = 16
+FINGERPRINT_CHUNK_SIZE = 64 * 1024
+
+
+def fingerprint_video(video_file):
+    file_size = os.path.getsize(video_file)
+    sha = hashlib.sha1(str(file_size).encode("utf-8"))
+
+    with open(video_file, 'rb') as video:
+        for chunk in range(FINGERPRINT_CHUNKS):
+            video.seek(max(file_size - FINGERPRINT_CHUNK_SIZE, 0) * chunk //
+                       max(FINGERPRINT_CHUNKS - 1, 1))
+            sha.update(video.read(FINGERPRINT_CHUNK_SIZE))
+
+    return sha.hexdigest()
+
+
+def create_result_key(video_file, **parameters):
+    """
+    Create the cache key for the results of video_file, processed with the matching parameters
+    given as keyword arguments (landing_time, time_step, game_map, etc.).  The parameters must be
+    JSON serializable.
+
+    :return: hex string key
+    """
+    key_data = {'video': fingerprint_video(video_file),
+                'parameters': parameters,
+                'color_diff_threshs': COLOR_DIFF_THRESHS,
+                'template_match_threshs': TEMPLATE_MATCH_THRESHS,
+                'static_frame_threshold': STATIC_FRAME_THRESHOLD,
+                'cache_version': RESULT_CACHE_VERSION,
+                'pubgis_version': __version__}
+
+    return hashlib.sha1(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    ResultCache stores the positions and timestamps found for a video, with the name of the map,
+    in cache_dir.  Once the entries take up more than max_size bytes, the least recently used
+    entries are removed.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_RESULT_CACHE_DIR, max_size=DEFAULT_RESULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get_entry_file(self, key):
+        return os.path.join(self.cache_dir, key + BINARY_EXTENSION)
+
+    def load(self, key):
+        """
+        :return: (positions, timestamps, map name), or None if key isn't in the cache (or its
+                 entry doesn't record the map)
+        """
+        entry_file = self.get_entry_file(key)
+
+        try:
+            with open(entry_file, 'rb') as entry:
+                metadata, _ = read_header(entry)
+            if metadata.get('map') is None:
+                return None
+            _, trajectory, _, _ = input_binary(entry_file, mmap=False)
+
+            # The modification time of each entry is when it was last used, for the eviction.
+            os.utime(entry_file)
+        except (OSError, ValueError):
+            return None
+
+        positions, timestamps = trajectory_to_lists(trajectory)
+        return positions, timestamps, metadata['map']
+
+    def store(self, key, positions, timestamps, map_name):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # The entry is written to a temporary file first which is then renamed, so that other
+        # processes never see a partially written entry.
+        temp_fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(temp_fd)
+        try:
+            output_binary(temp_file, create_binary_data(positions, timestamps), map_name=map_name)
+            os.replace(temp_file, self.get_entry_file(key))
+        except OSError:
+            _remove_file(temp_file)
+            return
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as cache_entries:
+            for cache_entry in cache_entries:
+                if cache_entry.name.endswith(BINARY_EXTENSION):
+                    try:
+                        stat = cache_entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, cache_entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, entry_file in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            _remove_file(entry_file)
+            total_size -= size
+
+
+def _remove_file(filename):
+    # Another process may have removed the file first, which is fine.
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
@@ -66,6 +66,41 @@ def find_path_bounds(map_size,  # pylint: disable=too-many-locals
     return (0, 0), map_size
 
 
+def update_path_extent(extent, position):
+    """
+    Grow the extent of a path to include a new position.  Passing the corners of the extent to
+    find_path_bounds gives the same bounds as passing every position in the path.
+
+    :return: ((min_x, min_y), (max_x, max_y)), or None if there are no valid positions yet
+    """
+    if position is None:
+        return extent
+
+    if extent is None:
+        return position, position
+
+    (min_x, min_y), (max_x, max_y) = extent
+    x_coord, y_coord = position
+    return (min(min_x, x_coord), min(min_y, y_coord)), (max(max_x, x_coord), max(max_y, y_coord))
+
+
+def find_line_bounds(start, end, thickness, map_size):
+    """
+    Find the area of the map that can be changed by drawing an anti-aliased line between
+    start and end, limited to the bounds of the map.
+
+    :return: (y slice, x slice)
+    """
+    # Anti-aliasing can touch a pixel past the half thickness, so a full thickness is used
+    # as the border to be safe.
+    border = thickness + 1
+    min_x = max(0, min(start[0], end[0]) - border)
+    min_y = max(0, min(start[1], end[1]) - border)
+    max_x = min(map_size, max(start[0], end[0]) + border + 1)
+    max_y = min(map_size, max(start[1], end[1]) + border + 1)
+    return slice(min_y, max_y), slice(min_x, max_x)
+
+
 def unscale_coords(scaled_coords, scale):
     if scaled_coords is None:
         return None
@@ -112,6 +147,58 @@ def blend_transparent(base_map, path_overlay):
     return np.uint8(cv2.addWeighted(face_part, 255.0, overlay_part, 255.0, 0.0))
 
 
+def find_template_match_peaks(template_match, count, suppression_size):
+    """
+    Find the locations of the highest values in a template match result.  After each peak is
+    found, a square area of suppression_size around it is excluded, so that a single feature
+    is not reported multiple times from the neighboring pixels.
+
+    :return: list of up to count (x, y) coordinates, best match first
+    """
+    remaining_match = np.copy(template_match)
+    peaks = []
+
+    for _ in range(count):
+        _, max_val, _, max_loc = cv2.minMaxLoc(remaining_match)
+
+        if max_val == -np.inf:
+            break
+
+        peaks.append(max_loc)
+
+        suppression_coords = tuple(max(0, coord - suppression_size // 2) for coord in max_loc)
+        remaining_match[create_slice(suppression_coords, suppression_size)] = -np.inf
+
+    return peaks
+
+
+def distance_penalty(x_distances, y_distances):
+    """
+    Create a penalty array with a value for each combination of the x and y distances,
+    that grows with the distance from the origin.  It is float32 so that it can be subtracted
+    from a template match result in place.
+
+    :return: array of shape (len(y_distances), len(x_distances))
+    """
+    x_squared = np.square(np.asarray(x_distances, dtype=np.float32))
+    y_squared = np.square(np.asarray(y_distances, dtype=np.float32))
+
+    penalty = x_squared[np.newaxis, :] + y_squared[:, np.newaxis]
+    np.sqrt(penalty, out=penalty)
+    np.sqrt(penalty, out=penalty)
+    penalty /= 1000
+
+    return penalty
+
+
+def create_penalty_kernel(radius):
+    """
+    Create a square distance_penalty centered at (radius, radius), with a size of 2 * radius + 1.
+    """
+    offsets = np.arange(-radius, radius + 1, dtype=np.float32)
+    return distance_penalty(offsets, offsets)
+
+
 def get_coords_from_slices(slices):
     assert isinstance(slices, (tuple, slice))
 
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Positions found by template matching are accurate to a pixel or two, so the filter trusts each
+# new position much more than its prediction (alpha), and the velocity adapts to changes in
+# direction and speed within a few time steps (beta).
+TRACKER_ALPHA = 0.9
+TRACKER_BETA = 0.5
+
+# Predictions are only made after this many positions in a row have been found.  Two positions
+# are needed for a velocity, and a third to have any idea of how good the predictions are.
+TRACKER_MIN_UPDATES = 3
+
+# The uncertainty of a prediction grows with the time since the last position.  For each second,
+# it is TRACKER_ERROR_SIGMAS times the RMS of the recent prediction errors, but never less than
+# TRACKER_MIN_ERROR_RATE (unscaled pixels), which allows for speeding up, slowing down or turning
+# that the recent positions didn't show.
+TRACKER_ERROR_SIGMAS = 4
+TRACKER_MIN_ERROR_RATE = 30
+
+# Weight of each new prediction error in the running mean of the squared errors.
+TRACKER_ERROR_SMOOTHING = 0.25
+
+
+class AlphaBetaTracker:  # pylint: disable=too-many-instance-attributes
+    """
+    AlphaBetaTracker follows the positions found for the player with a constant velocity
+    alpha-beta filter, to predict where the player will be at a later time, and how far from that
+    prediction they could be.
+
+    Positions and the error of the predictions are in unscaled (full map) pixels, and times are
+    in seconds.
+    """
+
+    def __init__(self, alpha=TRACKER_ALPHA, beta=TRACKER_BETA, min_updates=TRACKER_MIN_UPDATES):
+        self.alpha = alpha
+        self.beta = beta
+        self.min_updates = min_updates
+        self.position = None
+        self.velocity = np.zeros(2)
+        self.timestamp = None
+        self.last_measurement = None
+        self.updates = 0
+        self.consecutive_updates = 0
+        self.mean_sq_error_rate = None
+
+    def update(self, position, timestamp):
+        measurement = np.array(position, dtype=np.float64)
+
+        if self.updates == 0 or timestamp <= self.timestamp:
+            self.position = measurement
+            self.velocity = np.zeros(2)
+        else:
+            elapsed = timestamp - self.timestamp
+
+            if self.updates == 1:
+                # The first velocity comes directly from the first two positions.
+                self.velocity = (measurement - self.position) / elapsed
+                self.position = measurement
+            else:
+                predicted = self.position + self.velocity * elapsed
+                residual = measurement - predicted
+                self.position = predicted + self.alpha * residual
+                self.velocity = self.velocity + (self.beta / elapsed) * residual
+
+                sq_error_rate = np.sum(np.square(residual)) / elapsed ** 2
+                if self.mean_sq_error_rate is None:
+                    self.mean_sq_error_rate = sq_error_rate
+                else:
+                    self.mean_sq_error_rate += TRACKER_ERROR_SMOOTHING * \
+                        (sq_error_rate - self.mean_sq_error_rate)
+
+        self.timestamp = timestamp
+        self.last_measurement = tuple(position)
+        self.updates += 1
+        self.consecutive_updates += 1
+
+    def miss(self):
+        # The filter keeps its state through missed positions, but its predictions aren't
+        # trusted again until enough positions in a row have been found.
+        self.consecutive_updates = 0
+
+    def predict(self, timestamp):
+        """
+        :return: (predicted position, uncertainty radius), or None if there isn't enough
+                 confidence in the prediction
+        """
+        if self.consecutive_updates < self.min_updates or self.mean_sq_error_rate is None or \
+                timestamp is None or timestamp <= self.timestamp:
+            return None
+
+        elapsed = timestamp - self.timestamp
+        predicted = self.position + self.velocity * elapsed
+        error_rate = max(TRACKER_MIN_ERROR_RATE,
+                         TRACKER_ERROR_SIGMAS * np.sqrt(self.mean_sq_error_rate))
+
+        return tuple(float(coord) for coord in predicted), error_rate * elapsed
@@ -1,8 +1,16 @@
+import multiprocessing
 import os
 import re
 
+import cv2
+import numpy as np
 import pytest
 
+from pubgis import maps
+from pubgis.maps import GameMap
+from pubgis.match import FULL_SCALE_MINIMAP, IND_OUTER_CIRCLE_RATIO, IND_INNER_CIRCLE_RATIO
+from pubgis.minimap_iterators.generic import GenericIterator, SUPPORTED_RESOLUTIONS
+
 TEST_COORD_RE = re.compile(r".*_\d+_(\d+)_(\d+)\.jpg")
 ALLOWED_VARIATION = 2  # pixels
 MOCK_TIME_STEP = 1
@@ -23,3 +31,118 @@ def generate_expected_positions(test_image_dir):
         coords.append(pytest.approx(get_test_image_coords(img), abs=ALLOWED_VARIATION))
 
     return coords
+
+
+# Synthetic maps, minimaps and videos for testing matching without the real map images.
+MAP_SIZE = 1600
+MINIMAP_SIZE = 102
+TEST_MAP_NAMES = ["first", "second", "third"]
+# Positions of minimaps on the test maps, far enough from the edges for the whole minimap.
+MINIMAP_POSITIONS = [(400, 500), (430, 520), (470, 560), (500, 600)]
+
+TEST_VIDEO_RESOLUTION = (1920, 1080)
+TEST_VIDEO_FPS = 10
+
+
+class MockIterator(GenericIterator):
+    def __init__(self, minimaps, first_timestamp=0):
+        super().__init__()
+        self.size = MINIMAP_SIZE
+        self.time_step = 1
+        self.minimaps = minimaps
+        self.first_timestamp = first_timestamp
+
+    def __iter__(self):
+        for i, minimap in enumerate(self.minimaps):
+            yield i * 100 / len(self.minimaps), self.first_timestamp + i, minimap
+
+
+def create_map_image(seed):
+    noise = np.random.RandomState(seed).randint(0, 256, (MAP_SIZE // 16, MAP_SIZE // 16, 3))
+    return cv2.resize(noise.astype(np.uint8), (MAP_SIZE, MAP_SIZE))
+
+
+def create_minimap(map_image, position, size=MINIMAP_SIZE):
+    half = FULL_SCALE_MINIMAP // 2
+    crop = map_image[position[1] - half:position[1] - half + FULL_SCALE_MINIMAP,
+                     position[0] - half:position[0] - half + FULL_SCALE_MINIMAP]
+    minimap = cv2.resize(crop, (size, size))
+    center = (size // 2, size // 2)
+    cv2.circle(minimap, center, int(size * IND_OUTER_CIRCLE_RATIO), (255, 255, 255), 2)
+    cv2.circle(minimap, center, int(size * IND_INNER_CIRCLE_RATIO), (255, 255, 255), 1)
+    return minimap
+
+
+def register_test_maps(map_dir, monkeypatch):
+    """
+    Replace the registered maps with TEST_MAP_NAMES (created in map_dir), and a map without its
+    images, which is registered but isn't available.
+
+    :return: dict of the map image of each test map
+    """
+    # The registry is changed in place, as modules import MAPS directly.
+    for name in list(maps.MAPS):
+        monkeypatch.delitem(maps.MAPS, name)
+    map_images = {}
+
+    for seed, name in enumerate(TEST_MAP_NAMES):
+        map_file = os.path.join(map_dir, f"{name}_full_map.png")
+        land_mask_file = os.path.join(map_dir, f"{name}_land_mask.png")
+        map_images[name] = create_map_image(seed)
+        cv2.imwrite(map_file, map_images[name])
+        cv2.imwrite(land_mask_file, np.full((MAP_SIZE // 4, MAP_SIZE // 4), 255, np.uint8))
+        monkeypatch.setitem(maps.MAPS, name, GameMap(name, map_file, land_mask_file))
+
+    missing_map = GameMap("missing",
+                          os.path.join(map_dir, "missing_full_map.png"),
+                          os.path.join(map_dir, "missing_land_mask.png"))
+    monkeypatch.setitem(maps.MAPS, "missing", missing_map)
+
+    return map_images
+
+
+@pytest.fixture
+def test_maps(tmp_path, monkeypatch):
+    return register_test_maps(str(tmp_path), monkeypatch)
+
+
+@pytest.fixture(params=["fork", "spawn"])
+def start_method(request):
+    """
+    Start worker processes with each method available.  Spawned processes (the only method on
+    Windows) don't inherit anything set up by the test, such as the test maps.
+    """
+    if request.param not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{request.param} isn't available")
+
+    previous_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method(request.param, force=True)
+    yield request.param
+    multiprocessing.set_start_method(previous_method, force=True)
+
+
+def create_test_video(video_file, map_image, positions):
+    """
+    Write a video with a frame for each of positions, with the minimap of that position (or a
+    blank minimap for None) where the minimap is in a TEST_VIDEO_RESOLUTION recording.
+    """
+    y_offset, x_offset, size = SUPPORTED_RESOLUTIONS[TEST_VIDEO_RESOLUTION]
+    writer = cv2.VideoWriter(video_file,
+                             cv2.VideoWriter_fourcc(*'MJPG'),
+                             TEST_VIDEO_FPS,
+                             TEST_VIDEO_RESOLUTION)
+    frame = np.zeros(TEST_VIDEO_RESOLUTION[::-1] + (3,), np.uint8)
+
+    for position in positions:
+        minimap_slice = (slice(y_offset, y_offset + size), slice(x_offset, x_offset + size))
+        frame[minimap_slice] = 0 if position is None else create_minimap(map_image, position, size)
+        writer.write(frame)
+
+    writer.release()
+
+
+def create_video_positions(frames):
+    # The player moves in a straight line, except for a few seconds without the indicator (as
+    # if the inventory was open).
+    return [None if 120 <= frame < 140 else (500 + 2 * frame, 600 + 3 * frame // 2)
+            for frame in range(frames)]
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pytest
+
+from pubgis.output.pubgis_binary import output_binary, input_binary, create_binary_data, \
+    valid_positions, trajectory_to_lists, convert_json_to_binary, create_header, \
+    TrajectoryWriter, TRAJECTORY_DTYPE
+from pubgis.output.pubgis_json import output_json, create_json_data
+from tests.test_json_serialization import COORDS, TIMESTAMPS, GAME, TEAM, USER, JSON_TEST_DIR
+
+
+def test_create_binary_data():
+    trajectory = create_binary_data(COORDS, TIMESTAMPS)
+
+    assert trajectory.dtype == TRAJECTORY_DTYPE
+    assert trajectory["timestamp"].tolist() == TIMESTAMPS
+    assert trajectory["valid"].tolist() == [coord is not None for coord in COORDS]
+    assert valid_positions(trajectory).tolist() == [list(coord) for coord in COORDS if coord]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_binary_same(tmp_path, mmap):
+    binary_file = str(tmp_path / "out.traj")
+    output_binary(binary_file,
+                  create_binary_data(COORDS, TIMESTAMPS),
+                  name=USER,
+                  game=GAME,
+                  team=TEAM)
+
+    name, trajectory, game, team = input_binary(binary_file, mmap=mmap)
+
+    assert isinstance(trajectory, np.memmap) == mmap
+    assert (name, game, team) == (USER, GAME, TEAM)
+    assert trajectory_to_lists(trajectory) == (COORDS, TIMESTAMPS)
+
+
+def test_binary_empty(tmp_path):
+    binary_file = str(tmp_path / "empty.traj")
+    output_binary(binary_file, create_binary_data([], []))
+
+    name, trajectory, _, _ = input_binary(binary_file)
+
+    assert name is None
+    assert len(trajectory) == 0
+    assert valid_positions(trajectory).shape == (0, 2)
+
+
+def test_binary_partial_record(tmp_path):
+    # A record that was only partially written is ignored.
+    binary_file = str(tmp_path / "partial.traj")
+    output_binary(binary_file, create_binary_data(COORDS, TIMESTAMPS))
+    with open(binary_file, 'ab') as binary_output_file:
+        binary_output_file.write(b"\0" * (TRAJECTORY_DTYPE.itemsize - 1))
+
+    _, trajectory, _, _ = input_binary(binary_file)
+
+    assert len(trajectory) == len(TIMESTAMPS)
+
+
+@pytest.mark.parametrize("contents", [b"",
+                                      b"not a trajectory file",
+                                      create_header()[:-4],
+                                      create_header().replace(b"PUBGISTR\x01", b"PUBGISTR\x02")])
+def test_binary_invalid(tmp_path, contents):
+    binary_file = str(tmp_path / "invalid.traj")
+    with open(binary_file, 'wb') as binary_output_file:
+        binary_output_file.write(contents)
+
+    with pytest.raises(ValueError):
+        input_binary(binary_file)
+
+
+def test_convert_json_to_binary(tmp_path):
+    json_file = str(tmp_path / "out.json")
+    binary_file = str(tmp_path / "out.traj")
+    output_json(json_file, create_json_data(COORDS, TIMESTAMPS, name=USER, game=GAME, team=TEAM))
+
+    assert convert_json_to_binary(json_file, binary_file)
+
+    name, trajectory, game, team = input_binary(binary_file)
+    assert (name, game, team) == (USER, GAME, TEAM)
+    assert trajectory_to_lists(trajectory) == (COORDS, TIMESTAMPS)
+
+
+def test_convert_invalid_json(tmp_path):
+    json_file = os.path.join(JSON_TEST_DIR, "invalid", sorted(os.listdir(
+        os.path.join(JSON_TEST_DIR, "invalid")))[0])
+    binary_file = str(tmp_path / "out.traj")
+
+    assert not convert_json_to_binary(json_file, binary_file)
+    assert not os.path.exists(binary_file)
+
+
+def test_trajectory_writer(tmp_path):
+    binary_file = str(tmp_path / "writer.traj")
+
+    with TrajectoryWriter(binary_file, name=USER, team=TEAM, batch_size=5) as writer:
+        for timestamp, coord in zip(TIMESTAMPS, COORDS):
+            writer.write(timestamp, coord)
+
+            # Only whole batches have been written to the file.
+            _, trajectory, _, _ = input_binary(binary_file)
+            assert len(trajectory) == (timestamp + 1) // 5 * 5
+
+    name, trajectory, game, team = input_binary(binary_file)
+    assert (name, game, team) == (USER, None, TEAM)
+    assert trajectory_to_lists(trajectory) == (COORDS, TIMESTAMPS)
+
+
+def test_writer_flush_interval(tmp_path):
+    binary_file = str(tmp_path / "writer.traj")
+
+    with TrajectoryWriter(binary_file, flush_interval=0) as writer:
+        writer.write(TIMESTAMPS[0], COORDS[0])
+
+        _, trajectory, _, _ = input_binary(binary_file)
+        assert len(trajectory) == 1
+
+
+@pytest.mark.parametrize("partial_bytes", [0, 1, TRAJECTORY_DTYPE.itemsize - 1])
+def test_trajectory_writer_resume(tmp_path, partial_bytes):
+    binary_file = str(tmp_path / "writer.traj")
+
+    with TrajectoryWriter(binary_file, name=USER) as writer:
+        for timestamp, coord in zip(TIMESTAMPS[:10], COORDS[:10]):
+            writer.write(timestamp, coord)
+
+    # A crash while writing leaves part of a record at the end of the file.
+    with open(binary_file, 'ab') as binary_output_file:
+        binary_output_file.write(b"\xff" * partial_bytes)
+
+    with TrajectoryWriter(binary_file, resume=True) as writer:
+        assert trajectory_to_lists(writer.previous) == (COORDS[:10], TIMESTAMPS[:10])
+
+        for timestamp, coord in zip(TIMESTAMPS[10:], COORDS[10:]):
+            writer.write(timestamp, coord)
+
+    name, trajectory, _, _ = input_binary(binary_file)
+    assert name == USER
+    assert trajectory_to_lists(trajectory) == (COORDS, TIMESTAMPS)
+
+
+def test_writer_resume_missing(tmp_path):
+    binary_file = str(tmp_path / "writer.traj")
+
+    with TrajectoryWriter(binary_file, resume=True) as writer:
+        assert len(writer.previous) == 0
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from pubgis.checkpoint import MatchCheckpoint
+
+POSITIONS = [(100, 200), None, (110, 205), None]
+TIMESTAMPS = [0, 0.5, 1, 1.5]
+
+
+class MockVideoIterator:
+    def __init__(self):
+        self.current_time_step = 0.5
+        self.resumed_after = None
+
+    def get_frame_number(self, timestamp):
+        return 30 + int(round(timestamp * 10))
+
+    def resume_after(self, frame_number, time_step=None):
+        self.resumed_after = (frame_number, time_step)
+
+
+class MockMatch:
+    def __init__(self):
+        self.game_map = SimpleNamespace(name="erangel")
+        self.last_known_position = (110, 205)
+        self.missed_frames = 1
+        self.last_processed_thumbnail = np.arange(32 * 32 * 3, dtype=np.uint8).reshape(32, 32, 3)
+        self.restored = None
+
+    def restore_state(self, positions, timestamps, last_processed_thumbnail=None):
+        self.restored = (positions, timestamps, last_processed_thumbnail)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint_file = str(tmp_path / "video.checkpoint.npz")
+    match = MockMatch()
+    MatchCheckpoint.create("key", match, MockVideoIterator(), POSITIONS, TIMESTAMPS) \
+        .save(checkpoint_file)
+
+    checkpoint = MatchCheckpoint.load(checkpoint_file)
+
+    assert checkpoint.key == "key"
+    assert checkpoint.map_name == "erangel"
+    assert checkpoint.positions == POSITIONS
+    assert checkpoint.timestamps == TIMESTAMPS
+    assert checkpoint.frame_number == 45
+    assert checkpoint.time_step == 0.5
+    assert checkpoint.last_known_position == (110, 205)
+    assert checkpoint.missed_frames == 1
+    assert np.array_equal(checkpoint.static_thumbnail, match.last_processed_thumbnail)
+    assert [path.name for path in tmp_path.iterdir()] == ["video.checkpoint.npz"]
+
+    resumed_match = MockMatch()
+    resumed_iter = MockVideoIterator()
+    checkpoint.resume(resumed_match, resumed_iter)
+
+    assert resumed_iter.resumed_after == (45, 0.5)
+    assert resumed_match.restored[:2] == (POSITIONS, TIMESTAMPS)
+    assert np.array_equal(resumed_match.restored[2], match.last_processed_thumbnail)
+
+
+def test_checkpoint_before_found(tmp_path):
+    checkpoint_file = str(tmp_path / "video.checkpoint.npz")
+    match = MockMatch()
+    match.last_known_position = None
+    match.last_processed_thumbnail = None
+    MatchCheckpoint.create("key", match, MockVideoIterator(), [None], [0]).save(checkpoint_file)
+
+    checkpoint = MatchCheckpoint.load(checkpoint_file)
+
+    assert checkpoint.positions == [None]
+    assert checkpoint.last_known_position is None
+    assert checkpoint.static_thumbnail is None
@@ -0,0 +1,200 @@
+# pylint: disable=redefined-outer-name
+import os
+import shutil
+
+import cv2
+import pytest
+
+from pubgis import cli, parallel
+from pubgis.checkpoint import CHECKPOINT_EXTENSION
+from pubgis.match import PUBGISMatch
+from pubgis.minimap_iterators.video import VideoIterator, MIN_SEEK_FRAMES
+from pubgis.output.pubgis_binary import input_binary, trajectory_to_lists
+from pubgis.output.pubgis_json import input_json
+from tests.common_test_functions import TEST_VIDEO_FPS, create_test_video, \
+    create_video_positions, create_map_image
+from tests.common_test_functions import test_maps, start_method  # pylint: disable=unused-import
+
+TEST_VIDEO_FRAMES = 160
+# Long enough that the video is resumed by seeking.
+LONG_VIDEO_FRAMES = MIN_SEEK_FRAMES + 50
+
+
+@pytest.fixture(scope="module")
+def cli_video(tmpdir_factory):
+    video_file = str(tmpdir_factory.mktemp("video").join("test_video.avi"))
+    create_test_video(video_file, create_map_image(0), create_video_positions(TEST_VIDEO_FRAMES))
+    return video_file
+
+
+@pytest.fixture(scope="module")
+def long_cli_video(tmpdir_factory):
+    video_file = str(tmpdir_factory.mktemp("video").join("long_video.avi"))
+    create_test_video(video_file, create_map_image(0), create_video_positions(LONG_VIDEO_FRAMES))
+    return video_file
+
+
+@pytest.fixture
+def expected_results(test_maps, cli_video):  # pylint: disable=unused-argument
+    # test_maps registers the map the results are for.
+    match = PUBGISMatch(VideoIterator(video_file=cli_video), game_map="first")
+    return [(timestamp, position) for _, timestamp, position in match.process_match()]
+
+
+def _read_json_results(json_file):
+    _, positions, timestamps, _, _ = input_json(json_file)
+    return [(timestamp, tuple(position) if position else None)
+            for timestamp, position in zip(timestamps, positions)]
+
+
+@pytest.mark.parametrize("args", [
+    ["--jobs", "0"],
+    ["--processes", "0"],
+    ["--jobs", "2", "--processes", "2"],
+    ["--time-step", "1", "--max-time-step", "0.5"],
+    ["--max-time-step", "2", "--processes", "2"],
+    ["--checkpoint-interval", "10", "--processes", "2"],
+    ["--stats", "json", "--processes", "2"],
+    ["--output-dir", "missing_directory"],
+    ["--time-step", "never"],
+    ["--map", "missing"],
+])
+@pytest.mark.usefixtures("test_maps")
+def test_cli_invalid_arguments(tmp_path, args):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main([str(tmp_path / "video.avi")] + args)
+
+    assert exit_info.value.code == 2
+
+
+def test_cli_process_video(tmp_path, cli_video, expected_results):
+    assert cli.main([cli_video, "--map", "first", "--output", "json", "binary", "cropped",
+                     "--output-dir", str(tmp_path)]) == 0
+
+    _, trajectory, _, _ = input_binary(str(tmp_path / "test_video.traj"))
+    positions, timestamps = trajectory_to_lists(trajectory)
+
+    assert _read_json_results(str(tmp_path / "test_video.json")) == expected_results
+    assert list(zip(timestamps, positions)) == expected_results
+    assert cv2.imread(str(tmp_path / "test_video.jpg")) is not None
+
+
+def test_cli_auto_map(tmp_path, capsys, cli_video, expected_results):
+    assert cli.main([cli_video, "--output", "json", "--output-dir", str(tmp_path)]) == 0
+
+    assert "positions found on first" in capsys.readouterr().out
+    assert _read_json_results(str(tmp_path / "test_video.json")) == expected_results
+
+
+@pytest.mark.usefixtures("start_method")
+def test_cli_jobs_errors(tmp_path, capsys, cli_video, expected_results):
+    # A video that fails doesn't stop the others from being processed.
+    video_files = [str(tmp_path / name) for name in ("first.avi", "broken.avi", "second.avi")]
+    shutil.copy(cli_video, video_files[0])
+    shutil.copy(cli_video, video_files[2])
+    with open(video_files[1], 'wb') as broken_video:
+        broken_video.write(bytes(range(256)) * 16)
+
+    assert cli.main(video_files + [str(tmp_path / "missing.avi"), "--output", "json",
+                                   "--jobs", "2", "--cache-dir", str(tmp_path / "cache")]) == 1
+
+    errors = capsys.readouterr().err
+    assert "broken.avi: resolution not supported" in errors
+    assert "missing.avi: video file not found" in errors
+    for name in ("first", "second"):
+        assert _read_json_results(str(tmp_path / f"{name}.json")) == expected_results
+
+
+def test_cli_job_error(tmp_path, monkeypatch, cli_video):
+    def _process_video(video_file, output_file, options):
+        raise cv2.error("corrupt video")
+
+    monkeypatch.setattr(cli, "process_video", _process_video)
+
+    assert cli._process_video_job(cli_video, str(tmp_path / "test_video.jpg"), None) == \
+        (f"{cli_video}: error: corrupt video", False)
+
+
+@pytest.mark.usefixtures("start_method")
+def test_cli_processes(tmp_path, monkeypatch, cli_video, expected_results):
+    # Each segment tracks the player separately, so positions can differ by a pixel or two.
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_STEPS", 5)
+
+    assert cli.main([cli_video, "--map", "first", "--output", "json", "--processes", "2",
+                     "--output-dir", str(tmp_path), "--cache-dir", str(tmp_path / "cache")]) == 0
+
+    results = _read_json_results(str(tmp_path / "test_video.json"))
+    assert [timestamp for timestamp, _ in results] == \
+        [timestamp for timestamp, _ in expected_results]
+    for (_, position), (_, expected_position) in zip(results, expected_results):
+        assert position == pytest.approx(expected_position, abs=2)
+
+
+@pytest.mark.usefixtures("test_maps")
+@pytest.mark.parametrize("stats_format", ["json", "csv"])
+def test_cli_stats(tmp_path, cli_video, stats_format):
+    assert cli.main([cli_video, "--map", "first", "--output", "json", "--output-dir",
+                     str(tmp_path), "--stats", stats_format]) == 0
+
+    assert os.path.exists(str(tmp_path / f"test_video.stats.{stats_format}"))
+
+
+def test_cli_result_cache(tmp_path, monkeypatch, cli_video, expected_results):
+    args = [cli_video, "--map", "first", "--output", "json", "--output-dir", str(tmp_path),
+            "--result-cache", str(tmp_path / "results")]
+    assert cli.main(args) == 0
+    os.remove(str(tmp_path / "test_video.json"))
+
+    # Only a video that isn't in the cache needs to be matched.
+    def _match_video(video_file, options, checkpoint_file=None):
+        raise AssertionError("matched again")
+
+    monkeypatch.setattr(cli, "match_video", _match_video)
+
+    assert cli.main(args + ["--color", "0,0,255", "--output", "json", "cropped"]) == 0
+    assert _read_json_results(str(tmp_path / "test_video.json")) == expected_results
+    assert cli.main(args + ["--time-step", "2"]) == 1
+
+
+@pytest.mark.usefixtures("test_maps")
+def test_cli_resume(tmp_path, monkeypatch, long_cli_video):
+    args = [long_cli_video, "--map", "first", "--output", "json", "--output-dir", str(tmp_path),
+            "--checkpoint-interval", "0"]
+    json_file = str(tmp_path / "long_video.json")
+    checkpoint_file = str(tmp_path / f"long_video{CHECKPOINT_EXTENSION}")
+
+    assert cli.main(args) == 0
+    expected_results = _read_json_results(json_file)
+    os.remove(json_file)
+
+    # The match is interrupted after the checkpoint of a minimap past MIN_SEEK_FRAMES.
+    interrupt_step = MIN_SEEK_FRAMES // TEST_VIDEO_FPS + 2
+    process_match = PUBGISMatch.process_match
+    resumed_steps = []
+
+    def _interrupted_process_match(match):
+        for step, result in enumerate(process_match(match)):
+            if step == interrupt_step:
+                raise KeyboardInterrupt
+            yield result
+
+    def _counted_process_match(match):
+        for result in process_match(match):
+            resumed_steps.append(result)
+            yield result
+
+    with monkeypatch.context() as patch:
+        patch.setattr(PUBGISMatch, "process_match", _interrupted_process_match)
+        with pytest.raises(KeyboardInterrupt):
+            cli.main(args)
+
+    assert os.path.exists(checkpoint_file)
+    assert not os.path.exists(json_file)
+
+    # Only the minimaps after the checkpoint are matched when resuming.
+    monkeypatch.setattr(PUBGISMatch, "process_match", _counted_process_match)
+    assert cli.main(args + ["--resume"]) == 0
+
+    assert len(resumed_steps) == len(expected_results) - interrupt_step
+    assert _read_json_results(json_file) == expected_results
+    assert not os.path.exists(checkpoint_file)
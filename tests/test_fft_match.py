@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from pubgis.fft_match import FFTTemplateMatcher
+
+IMAGE_SIZE = 700
+TEMPLATE_SIZE = 60
+TILE_SIZE = 256
+
+
+def _test_image():
+    noise = np.random.RandomState(0).randint(0, 256, (IMAGE_SIZE // 8, IMAGE_SIZE // 8))
+    image = cv2.resize(noise.astype(np.uint8), (IMAGE_SIZE, IMAGE_SIZE))
+    # A flat area, where windows have no variation.
+    image[500:650, 50:250] = 128
+    return image
+
+
+REGION_CASES = [
+    slice(None),
+    (slice(0, 200), slice(0, 200)),
+    (slice(150, 450), slice(320, 700)),
+    (slice(190, 260), slice(190, 260)),
+    (slice(480, 700), slice(0, 300)),
+    (slice(0, TEMPLATE_SIZE), slice(IMAGE_SIZE - TEMPLATE_SIZE, IMAGE_SIZE)),
+]
+
+
+@pytest.mark.parametrize("region_slice", REGION_CASES)
+@pytest.mark.parametrize("template_coords", [(100, 120), (400, 300), (60, 560)])
+def test_fft_match(region_slice, template_coords):
+    image = _test_image()
+    x_coord, y_coord = template_coords
+    template = image[y_coord:y_coord + TEMPLATE_SIZE, x_coord:x_coord + TEMPLATE_SIZE]
+    matcher = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE)
+
+    expected = cv2.matchTemplate(image[region_slice], template, cv2.TM_CCOEFF_NORMED)
+    actual = matcher.match(template, region_slice)
+
+    assert actual.shape == expected.shape
+    assert actual.dtype == np.float32
+    assert np.allclose(actual, expected, atol=1e-3)
+    assert cv2.minMaxLoc(actual)[3] == cv2.minMaxLoc(expected)[3]
+
+
+def test_fft_match_flat_template():
+    image = _test_image()
+    template = np.full((TEMPLATE_SIZE, TEMPLATE_SIZE), 77, np.uint8)
+    matcher = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE)
+
+    assert np.array_equal(matcher.match(template),
+                          cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED))
+
+
+def test_fft_match_tiles_reused():
+    image = _test_image()
+    matcher = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE)
+
+    matcher.match(image[:TEMPLATE_SIZE, :TEMPLATE_SIZE], (slice(0, 200), slice(0, 200)))
+    tiles = dict(matcher.tiles)
+    matcher.match(image[100:100 + TEMPLATE_SIZE, :TEMPLATE_SIZE], (slice(0, 200), slice(0, 200)))
+
+    assert len(tiles) == 1
+    assert all(matcher.tiles[key] is tile for key, tile in tiles.items())
+
+
+def test_fft_match_cache_size():
+    image = _test_image()
+    template = image[400:400 + TEMPLATE_SIZE, 300:300 + TEMPLATE_SIZE]
+    expected = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+
+    unbounded = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE)
+    unbounded.match(template)
+    tile_bytes = unbounded.tiles_size // len(unbounded.tiles)
+
+    # Only the most recently used tiles are kept, and the results are the same.
+    matcher = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE,
+                                 cache_size=2 * tile_bytes)
+    assert np.allclose(matcher.match(template), expected, atol=1e-3)
+    assert list(matcher.tiles) == list(unbounded.tiles)[-2:]
+    assert matcher.tiles_size == 2 * tile_bytes
+
+    recent_tiles = list(matcher.tiles)
+    matcher.match(template, (slice(0, 200), slice(0, 200)))
+    assert list(matcher.tiles) == recent_tiles[1:] + [(0, 0)]
+
+    # The tile being used is kept even if it doesn't fit.
+    matcher.cache_size = 0
+    assert np.allclose(matcher.match(template), expected, atol=1e-3)
+    assert len(matcher.tiles) == 1
+    assert matcher.tiles_size == tile_bytes
+
+
+def test_fft_match_threads():
+    image = _test_image()
+    matcher = FFTTemplateMatcher(image, TEMPLATE_SIZE, tile_size=TILE_SIZE)
+    templates = [image[y_coord:y_coord + TEMPLATE_SIZE, 100:100 + TEMPLATE_SIZE]
+                 for y_coord in range(0, 600, 50)]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(matcher.match, templates))
+
+    for template, result in zip(templates, results):
+        assert np.allclose(result, cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED),
+                           atol=1e-3)
+    assert matcher.tiles_size == sum(array.nbytes for tile in matcher.tiles.values()
+                                     for array in tile)
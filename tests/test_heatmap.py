@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from pubgis import heatmap
+from pubgis.heatmap import HeatmapAccumulator, interpolate_path, load_positions, render_heatmap
+from pubgis.output.pubgis_binary import output_binary, create_binary_data
+from pubgis.output.pubgis_json import output_json, create_json_data
+from tests.common_test_functions import test_maps  # pylint: disable=unused-import
+
+MAP_SIZE = 1000
+CELL_SIZE = 10
+
+TRAJECTORIES = [
+    [(5, 5), (15, 5), None, (15, 5), (15, 25)],
+    [(995, 995), (999, 999), (500, 500)],
+    [None, None],
+    [(100, 100), (130, 100), (100, 100)],
+]
+
+
+def _write_trajectories(tmp_path):
+    filenames = []
+    for i, positions in enumerate(TRAJECTORIES):
+        timestamps = list(range(len(positions)))
+        # Both formats can be aggregated together.
+        if i % 2:
+            filename = str(tmp_path / f"{i}.traj")
+            output_binary(filename, create_binary_data(positions, timestamps))
+        else:
+            filename = str(tmp_path / f"{i}.json")
+            output_json(filename, create_json_data(positions, timestamps))
+        filenames.append(filename)
+    return filenames
+
+
+@pytest.mark.parametrize("positions, spacing, expected", [
+    ([(0, 0)], 1, [(0, 0)]),
+    ([(0, 0), (4, 0)], 1, [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)]),
+    ([(0, 0), (0, 3), (0, 3)], 2, [(0, 0), (0, 1.5), (0, 3), (0, 3)]),
+    ([(0, 0), (3, 4)], 10, [(0, 0), (3, 4)]),
+])
+def test_interpolate_path(positions, spacing, expected):
+    assert interpolate_path(positions, spacing).tolist() == [list(point) for point in expected]
+
+
+def test_add_positions():
+    accumulator = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE)
+    accumulator.add_positions(np.array([(5, 5), (6, 7), (15, 5), (999, 999), (1200, -5)]))
+
+    assert accumulator.grid.shape == (100, 100)
+    assert accumulator.grid.dtype == np.float32
+    assert accumulator.grid[0, 0] == 2
+    assert accumulator.grid[0, 1] == 1
+    assert accumulator.grid[99, 99] == 1
+    # Positions off the map are counted at the edge.
+    assert accumulator.grid[0, 99] == 1
+    assert accumulator.grid.sum() == 5
+
+
+def test_add_paths():
+    accumulator = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE, paths=True)
+    accumulator.add_positions(np.array([(5, 5), (35, 5), (5, 5)]))
+    accumulator.add_positions(np.array([(15, 5), (15, 25)]))
+
+    # Each path counts once in every cell it passes through.
+    assert accumulator.grid[0, :4].tolist() == [1, 2, 1, 1]
+    assert accumulator.grid[1:3, 1].tolist() == [1, 1]
+    assert accumulator.grid.sum() == 7
+
+
+@pytest.mark.parametrize("paths", [False, True])
+@pytest.mark.parametrize("processes", [1, 2])
+def test_add_files(tmp_path, paths, processes):
+    filenames = _write_trajectories(tmp_path)
+    expected = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE, paths=paths)
+    for filename in filenames:
+        expected.add_positions(load_positions(filename))
+
+    accumulator = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE, paths=paths)
+    missing_file = str(tmp_path / "missing.json")
+
+    assert accumulator.add_files(filenames + [missing_file], processes=processes) == \
+        [missing_file]
+    assert np.array_equal(accumulator.grid, expected.grid)
+    assert accumulator.trajectories == len(TRAJECTORIES)
+    assert len(accumulator.files) == len(TRAJECTORIES)
+
+
+def test_incremental_update(tmp_path):
+    filenames = _write_trajectories(tmp_path)
+    state_file = str(tmp_path / "state")
+
+    all_at_once = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE)
+    all_at_once.add_files(filenames)
+
+    first = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE)
+    first.add_files(filenames[:2])
+    first.save(state_file)
+
+    # The files that were already added are skipped.
+    loaded = HeatmapAccumulator.load(state_file)
+    loaded.add_files(filenames)
+
+    assert np.array_equal(loaded.grid, all_at_once.grid)
+    assert loaded.trajectories == all_at_once.trajectories
+    assert loaded.files == all_at_once.files
+
+
+def test_render_heatmap():
+    base_map = np.full((MAP_SIZE, MAP_SIZE, 3), 100, np.uint8)
+    accumulator = HeatmapAccumulator(MAP_SIZE, cell_size=CELL_SIZE)
+
+    assert np.array_equal(render_heatmap(accumulator.grid, base_map), base_map)
+
+    accumulator.add_positions(np.array([(5, 5)] * 10 + [(505, 505)]))
+    rendered = render_heatmap(accumulator.grid, base_map)
+
+    assert rendered.shape == base_map.shape
+    assert np.array_equal(rendered[20:500, 20:500], base_map[20:500, 20:500])
+    assert not np.array_equal(rendered[:CELL_SIZE, :CELL_SIZE], base_map[:CELL_SIZE, :CELL_SIZE])
+    assert not np.array_equal(rendered[500:510, 500:510], rendered[:CELL_SIZE, :CELL_SIZE])
+
+
+@pytest.mark.parametrize("args", [
+    ["--map", "missing"],
+    ["--map", "first", "--processes", "0"],
+])
+@pytest.mark.usefixtures("test_maps")
+def test_heatmap_invalid_arguments(tmp_path, args):
+    with pytest.raises(SystemExit) as exit_info:
+        heatmap.main(["--output", str(tmp_path / "heatmap.jpg")] + args)
+
+    assert exit_info.value.code == 2
+
+
+@pytest.mark.usefixtures("test_maps")
+def test_heatmap_missing_map(tmp_path, monkeypatch):
+    # The default map is registered, but its images are missing.
+    monkeypatch.setattr(heatmap, "DEFAULT_MAP", "missing")
+
+    with pytest.raises(SystemExit) as exit_info:
+        heatmap.main(["--output", str(tmp_path / "heatmap.jpg")])
+
+    assert exit_info.value.code == 2
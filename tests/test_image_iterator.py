@@ -0,0 +1,55 @@
+# pylint: disable=redefined-outer-name
+import os
+import shutil
+
+import cv2
+import pytest
+
+from pubgis.minimap_iterators.images import ImageIterator
+
+TEST_DIR = os.path.dirname(__file__)
+TEST_IMAGE = os.path.join(TEST_DIR, "test_new_image.jpg")
+BAD_MINIMAP_DIR = os.path.join(TEST_DIR, "bad")
+
+
+@pytest.fixture
+def full_image_dir(tmpdir):
+    shutil.copy(TEST_IMAGE, str(tmpdir))
+    return str(tmpdir)
+
+
+def test_image_iterator_full_image(full_image_dir):
+    image_iter = ImageIterator(full_image_dir, 1)
+    _, _, minimap = next(image_iter)
+
+    assert image_iter.size == 255
+    assert minimap.shape == (255, 255, 3)
+    assert (minimap == cv2.imread(TEST_IMAGE)[796:796 + 255, 1628:1628 + 255]).all()
+
+
+@pytest.mark.parametrize("reduction", [2, 4, 8])
+def test_image_iterator_reduced(full_image_dir, reduction):
+    image_iter = ImageIterator(full_image_dir, 1, reduction=reduction)
+    _, _, minimap = next(image_iter)
+
+    assert image_iter.size == 255 // reduction
+    assert minimap.shape == (255 // reduction, 255 // reduction, 3)
+
+
+def test_image_invalid_reduction(full_image_dir):
+    with pytest.raises(ValueError):
+        ImageIterator(full_image_dir, 1, reduction=3)
+
+
+@pytest.mark.parametrize("reuse_buffer", [True, False])
+def test_image_iterator_minimaps(reuse_buffer):
+    image_iter = ImageIterator(BAD_MINIMAP_DIR, 1, just_minimaps=True, reuse_buffer=reuse_buffer)
+    images = os.listdir(BAD_MINIMAP_DIR)
+    timestamps = []
+
+    for (_, timestamp, minimap), image in zip(image_iter, images):
+        assert (minimap == cv2.imread(os.path.join(BAD_MINIMAP_DIR, image))).all()
+        timestamps.append(timestamp)
+
+    assert image_iter.count == len(images)
+    assert timestamps == list(range(len(images)))
@@ -2,9 +2,10 @@ import json
 import os
 
 import pytest
+from jsonschema import validate, ValidationError
 
 from pubgis.output.pubgis_json import output_json, input_json, valididate_pubgis_schema, \
-    parse_input_json_data, create_json_data
+    parse_input_json_data, create_json_data, iter_json_positions, SCHEMA
 
 JSON_TEST_DIR = os.path.join(os.path.dirname(__file__), "json")
 
@@ -64,3 +65,77 @@ def test_json_schema_invalid(invalid_json_file):
 
 def test_missing_json():
     assert parse_input_json_data({"positions": []}) == (None, [], [], None, None)
+
+
+# Positions that test the edge cases of the schema, which the fast validation must agree with.
+SCHEMA_EDGE_CASE_POSITIONS = [
+    [],
+    [[0, [1, 2]]],
+    [[0.5, None]],
+    [(0, (1, 2))],
+    [[0]],
+    [[]],
+    [[0, [1]]],
+    [[0, []]],
+    [[0, [1, 2, "extra"]]],
+    [[0, [1, 2], None]],
+    [[None, [1, 2]]],
+    [["0", [1, 2]]],
+    [[True, [1, 2]]],
+    [[0, [1.0, 2]]],
+    [[0, [1, False]]],
+    [[0, ["1", 2]]],
+    [[0, 5]],
+    [[0, {"x": 1}]],
+    [5],
+    [None],
+    "positions",
+    None,
+]
+
+
+def _schema_valid(data):
+    try:
+        validate(data, SCHEMA, types={'array': (list, tuple)})
+        return True
+    except ValidationError:
+        return False
+
+
+@pytest.mark.parametrize("positions", SCHEMA_EDGE_CASE_POSITIONS)
+def test_json_fast_validation(positions):
+    data = {"name": None, "positions": positions}
+    assert valididate_pubgis_schema(data) == _schema_valid(data)
+
+
+def test_json_read_unvalidated():
+    expected_file = os.path.join(JSON_TEST_DIR, 'expected_out.json')
+    assert input_json(expected_file, validate=False) == (USER, COORDS, TIMESTAMPS, GAME, TEAM)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_json_stream_positions(chunk_size):
+    expected_file = os.path.join(JSON_TEST_DIR, 'expected_out.json')
+    assert list(iter_json_positions(expected_file, chunk_size=chunk_size)) == \
+        list(zip(TIMESTAMPS, COORDS))
+
+
+@pytest.mark.parametrize("valid_json_file", list(os.scandir(VALID_JSON_FOLDER)))
+def test_json_stream_valid(valid_json_file):
+    _, positions, timestamps, _, _ = input_json(valid_json_file.path)
+    assert list(iter_json_positions(valid_json_file.path, chunk_size=16)) == \
+        list(zip(timestamps, positions))
+
+
+@pytest.mark.parametrize("contents", ['{"name": null, "team": "C9", "game": 1}',
+                                      '{}',
+                                      '{"positions": [[0, [1, 2]], [null, [3, 4]]]}',
+                                      '{"positions": [[0, [1, 2]] [1, [3, 4]]]}',
+                                      '{"positions": [[0, [1, 2]]',
+                                      '[]'])
+def test_json_stream_invalid(tmp_path, contents):
+    json_file = tmp_path / "invalid.json"
+    json_file.write_text(contents)
+
+    with pytest.raises(ValueError):
+        list(iter_json_positions(str(json_file), chunk_size=4))
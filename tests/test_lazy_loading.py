@@ -0,0 +1,31 @@
+import subprocess
+import sys
+from os.path import dirname
+
+import pytest
+
+# Each check runs in a new interpreter, so that modules imported by other tests don't affect it.
+CHECK_UNLOADED_SCRIPT = """
+import sys
+import {module}
+from pubgis.match import PUBGISMatch
+
+assert type(PUBGISMatch.__dict__['full_map']).__name__ == '_LazyClassAttribute'
+assert type(PUBGISMatch.__dict__['land_mask']).__name__ == '_LazyClassAttribute'
+assert 'mss' not in sys.modules
+assert 'PyQt5' not in sys.modules
+"""
+
+
+@pytest.mark.parametrize("module", ["pubgis.support",
+                                    "pubgis.output.pubgis_json",
+                                    "pubgis.match",
+                                    "pubgis.parallel",
+                                    "pubgis.cli"])
+def test_import_loads_no_assets(module):
+    result = subprocess.run([sys.executable, "-c", CHECK_UNLOADED_SCRIPT.format(module=module)],
+                            cwd=dirname(dirname(__file__)),
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,105 @@
+# pylint: disable=redefined-outer-name
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from pubgis.map_cache import MapCache, MAP_CACHE_ARRAYS
+
+
+@pytest.fixture
+def map_file(tmp_path):
+    map_path = tmp_path / "test_map.jpg"
+    map_path.write_bytes(b"not really a map")
+    return str(map_path)
+
+
+def _test_arrays():
+    return {name: np.full((10, 10), i, np.uint8) for i, name in enumerate(MAP_CACHE_ARRAYS)}
+
+
+def test_map_cache_empty(tmp_path, map_file):
+    assert MapCache(str(tmp_path / "cache")).load("test", map_file, 255) is None
+
+
+def test_map_cache_round_trip(tmp_path, map_file):
+    map_cache = MapCache(str(tmp_path / "cache"))
+    arrays = _test_arrays()
+    map_cache.store("test", map_file, 255, arrays)
+
+    loaded = map_cache.load("test", map_file, 255)
+
+    assert loaded.keys() == arrays.keys()
+    for name, array in arrays.items():
+        assert np.array_equal(loaded[name], array)
+        assert isinstance(loaded[name], np.memmap)
+
+
+@pytest.mark.parametrize("map_name, size", [("other", 255), ("test", 335)])
+def test_map_cache_key(tmp_path, map_file, map_name, size):
+    map_cache = MapCache(str(tmp_path / "cache"))
+    map_cache.store("test", map_file, 255, _test_arrays())
+
+    assert map_cache.load(map_name, map_file, size) is None
+
+
+def test_map_cache_changed_map(tmp_path, map_file):
+    map_cache = MapCache(str(tmp_path / "cache"))
+    map_cache.store("test", map_file, 255, _test_arrays())
+
+    with open(map_file, 'wb') as changed_map:
+        changed_map.write(b"a different map")
+    os.utime(map_file, (0, 0))
+
+    assert map_cache.load("test", map_file, 255) is None
+
+
+def test_map_cache_new_land_mask(tmp_path, map_file):
+    land_mask_file = str(tmp_path / "test_land_mask.jpg")
+    with open(land_mask_file, 'wb') as land_mask:
+        land_mask.write(b"a land mask")
+    map_cache = MapCache(str(tmp_path / "cache"))
+    map_cache.store("test", map_file, 255, _test_arrays(), land_mask_file=land_mask_file)
+
+    assert map_cache.load("test", map_file, 255, land_mask_file=land_mask_file) is not None
+
+    with open(land_mask_file, 'wb') as changed_land_mask:
+        changed_land_mask.write(b"a different land mask")
+    os.utime(land_mask_file, (0, 0))
+
+    assert map_cache.load("test", map_file, 255, land_mask_file=land_mask_file) is None
+
+
+def test_map_cache_parameters(tmp_path, map_file):
+    map_cache = MapCache(str(tmp_path / "cache"))
+    map_cache.store("test", map_file, 255, _test_arrays(), parameters=(0.25,))
+
+    assert map_cache.load("test", map_file, 255, parameters=(0.25,)) is not None
+    assert map_cache.load("test", map_file, 255, parameters=(0.5,)) is None
+
+
+def test_map_cache_store_twice(tmp_path, map_file):
+    map_cache = MapCache(str(tmp_path / "cache"))
+    map_cache.store("test", map_file, 255, _test_arrays())
+    map_cache.store("test", map_file, 255, _test_arrays())
+
+    assert len(os.listdir(map_cache.cache_dir)) == 1
+
+
+def test_map_cache_full_map(tmp_path):
+    image_file = str(tmp_path / "test_map.png")
+    image = np.random.RandomState(0).randint(0, 256, (40, 40, 3)).astype(np.uint8)
+    cv2.imwrite(image_file, image)
+    map_cache = MapCache(str(tmp_path / "cache"))
+
+    for _ in range(2):
+        full_map = map_cache.load_full_map("test", image_file)
+        assert isinstance(full_map, np.memmap)
+        assert not full_map.flags.writeable
+        assert np.array_equal(full_map, image)
+
+
+def test_map_cache_full_map_missing(tmp_path, map_file):
+    with pytest.raises(FileNotFoundError):
+        MapCache(str(tmp_path / "cache")).load_full_map("test", map_file)
@@ -0,0 +1,109 @@
+# pylint: disable=redefined-outer-name
+import pickle
+
+import cv2
+import numpy as np
+import pytest
+
+from pubgis import maps
+from pubgis.maps import AUTO_MAP, GameMap, get_map, get_available_maps
+from pubgis.match import PUBGISMatch
+from tests.common_test_functions import MockIterator, MINIMAP_SIZE, MAP_SIZE, TEST_MAP_NAMES, \
+    MINIMAP_POSITIONS, create_minimap, test_maps  # pylint: disable=unused-import
+
+
+@pytest.mark.usefixtures("test_maps")
+def test_get_map():
+    assert get_map("first").name == "first"
+    assert [game_map.name for game_map in get_available_maps()] == TEST_MAP_NAMES
+
+    with pytest.raises(ValueError):
+        get_map("unknown")
+
+
+def test_game_map_assets(test_maps):
+    game_map = get_map("second")
+
+    assert np.array_equal(game_map.full_map, test_maps["second"])
+    assert game_map.size == MAP_SIZE
+    assert game_map.land_mask_scale == 0.25
+
+    with pytest.raises(FileNotFoundError):
+        get_map("missing")
+    with pytest.raises(FileNotFoundError):
+        _ = maps.MAPS["missing"].size
+
+
+
+@pytest.mark.usefixtures("test_maps")
+def test_pickle_game_map():
+    # A registered map is reused, other maps are loaded from their images.
+    registered_map = get_map("first")
+    assert pickle.loads(pickle.dumps(registered_map)) is registered_map
+
+    custom_map = GameMap("custom", registered_map.map_file, registered_map.land_mask_file)
+    unpickled_map = pickle.loads(pickle.dumps(custom_map))
+    assert unpickled_map is not custom_map
+    assert unpickled_map.name == "custom"
+    assert np.array_equal(unpickled_map.full_map, registered_map.full_map)
+
+def test_gray_thumbnail(test_maps):
+    game_map = get_map("first")
+    thumbnail = game_map.gray_thumbnail(0.1)
+
+    assert thumbnail.shape == (MAP_SIZE // 10, MAP_SIZE // 10)
+    assert game_map.gray_thumbnail(0.1) is thumbnail
+
+    # The map is decoded at a reduced size, which is close to resizing the full map.
+    expected = cv2.resize(cv2.cvtColor(test_maps["first"], cv2.COLOR_BGR2GRAY),
+                          (MAP_SIZE // 10, MAP_SIZE // 10),
+                          interpolation=cv2.INTER_AREA)
+    assert np.mean(np.abs(thumbnail.astype(int) - expected)) < 5
+
+    # Once the full map has been decoded, it is resized instead.
+    _ = game_map.full_map
+    assert np.array_equal(game_map.gray_thumbnail(0.3),
+                          cv2.resize(cv2.cvtColor(test_maps["first"], cv2.COLOR_BGR2GRAY),
+                                     (MAP_SIZE * 3 // 10, MAP_SIZE * 3 // 10),
+                                     interpolation=cv2.INTER_AREA))
+
+
+@pytest.mark.parametrize("map_name", TEST_MAP_NAMES)
+def test_identify_game_map(test_maps, map_name):
+    minimaps = [create_minimap(test_maps[map_name], position) for position in MINIMAP_POSITIONS]
+    match = PUBGISMatch(MockIterator(minimaps), game_map=AUTO_MAP)
+
+    game_map, read_minimaps = match.identify_game_map()
+
+    assert game_map.name == map_name
+    assert len(read_minimaps) == 3
+    # The maps are identified from thumbnails, without creating the scaled arrays of each map.
+    for name in TEST_MAP_NAMES:
+        assert not get_map(name).scaled_arrays
+    for (_, _, read_minimap), minimap in zip(read_minimaps, minimaps):
+        assert np.array_equal(read_minimap, minimap)
+
+
+@pytest.mark.usefixtures("test_maps")
+def test_identify_no_indicator():
+    minimaps = [np.zeros((MINIMAP_SIZE, MINIMAP_SIZE, 3), np.uint8)] * 3
+    match = PUBGISMatch(MockIterator(minimaps), game_map=AUTO_MAP)
+
+    game_map, read_minimaps = match.identify_game_map()
+
+    assert game_map.name == TEST_MAP_NAMES[0]
+    assert len(read_minimaps) == 3
+
+
+def test_process_match_auto_map(test_maps):
+    # The minimaps read to identify the map must still be processed.
+    minimaps = [create_minimap(test_maps["third"], position) for position in MINIMAP_POSITIONS]
+
+    auto_match = PUBGISMatch(MockIterator(minimaps), game_map=AUTO_MAP)
+    auto_results = list(auto_match.process_match())
+    known_results = list(PUBGISMatch(MockIterator(minimaps), game_map="third").process_match())
+
+    assert auto_match.game_map.name == "third"
+    assert auto_results == known_results
+    for (_, _, position), expected_position in zip(auto_results, MINIMAP_POSITIONS):
+        assert np.linalg.norm(np.subtract(position, expected_position)) < 5
@@ -0,0 +1,229 @@
+# pylint: disable=redefined-outer-name
+import cv2
+import numpy as np
+import pytest
+
+from pubgis import maps
+from pubgis.color import Color
+from pubgis.match import PUBGISMatch, TEMPLATE_MATCH_THRESHS
+from pubgis.match_stats import MatchStats
+from tests.common_test_functions import MockIterator, MINIMAP_SIZE, MINIMAP_POSITIONS, \
+    TEST_MAP_NAMES, create_minimap, test_maps  # pylint: disable=unused-import
+
+
+def test_process_match_tracking(test_maps, monkeypatch):
+    # A player moving in a straight line is found in a smaller context around the predicted
+    # position, with the same results as searching the worst case context.
+    positions = [(300 + 60 * i, 400 + 40 * i) for i in range(10)]
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+    results = {}
+    context_sizes = {}
+
+    for tracking in (False, True):
+        match = PUBGISMatch(MockIterator(minimaps), game_map="first", tracking=tracking)
+        get_scaled_context = match._get_scaled_context
+        context_sizes[tracking] = []
+
+        def _get_scaled_context(sizes=context_sizes[tracking], method=get_scaled_context):
+            context_slice = method()
+            if context_slice != slice(None):
+                sizes.append(context_slice[0].stop - context_slice[0].start)
+            return context_slice
+
+        monkeypatch.setattr(match, "_get_scaled_context", _get_scaled_context)
+        results[tracking] = [position for _, _, position in match.process_match()]
+
+    assert results[True] == results[False]
+    for position, expected_position in zip(results[True], positions):
+        assert np.linalg.norm(np.subtract(position, expected_position)) < 5
+    assert context_sizes[True][-1] < context_sizes[False][-1]
+
+
+def test_restore_state(test_maps):
+    # A match restored from the positions of an interrupted match continues the same way.
+    positions = [(300 + 60 * i, 400 + 40 * i) for i in range(10)]
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+    minimaps[6] = np.zeros_like(minimaps[6])
+
+    full_results = list(PUBGISMatch(MockIterator(minimaps), game_map="first").process_match())
+
+    restored_match = PUBGISMatch(MockIterator(minimaps[7:], first_timestamp=7),
+                                 game_map="first")
+    restored_match.restore_state([position for _, _, position in full_results[:7]],
+                                 [timestamp for _, timestamp, _ in full_results[:7]])
+
+    assert restored_match.last_known_position == full_results[5][2]
+    assert restored_match.missed_frames == 1
+    assert restored_match.tracker.last_measurement == full_results[5][2]
+    assert [position for _, _, position in restored_match.process_match()] == \
+        [position for _, _, position in full_results[7:]]
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_match_static_frames(test_maps, batch_size):
+    # Repeated minimaps, with a little noise, reuse the position of the first of them.
+    positions = [(400, 500)] * 4 + [(430, 520)] + [(470, 560)] * 3
+    noise = np.random.RandomState(0).randint(0, 2, (MINIMAP_SIZE, MINIMAP_SIZE, 3), np.uint8)
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+    minimaps = [cv2.add(minimap, noise * (i % 2)) for i, minimap in enumerate(minimaps)]
+
+    stats = MatchStats() if batch_size == 1 else None
+    static_match = PUBGISMatch(MockIterator(minimaps),
+                               game_map="first",
+                               stats=stats,
+                               batch_size=batch_size)
+    static_results = [position for _, _, position in static_match.process_match()]
+    results = [position for _, _, position in PUBGISMatch(MockIterator(minimaps),
+                                                          game_map="first",
+                                                          static_frame_threshold=None,
+                                                          batch_size=batch_size).process_match()]
+
+    assert None not in results
+    assert static_results == results[:1] * 4 + results[4:5] + results[5:6] * 3
+    if stats:
+        assert [frame['static_frame'] for frame in stats.frames] == \
+            [False, True, True, True, False, False, True, True]
+        assert stats.summary()['static_frames'] == 5
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_match_reports_movement(test_maps, monkeypatch, batch_size):
+    positions = [(300 + 30 * i, 400 + 40 * i) for i in range(6)]
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+    minimaps[3] = np.zeros_like(minimaps[3])
+    minimap_iter = MockIterator(minimaps)
+    movements = []
+    monkeypatch.setattr(minimap_iter, "report_movement",
+                        lambda distance, elapsed: movements.append((distance, elapsed)))
+
+    results = list(PUBGISMatch(minimap_iter,
+                               game_map="first",
+                               batch_size=batch_size).process_match())
+
+    assert len(movements) == len(results)
+    assert [elapsed for _, elapsed in movements] == [None, 1, 1, None, None, 1]
+    for (distance, _), (_, _, position), (_, _, previous_position) in zip(movements[1:3],
+                                                                            results[1:3],
+                                                                            results[:2]):
+        assert distance == pytest.approx(np.hypot(*np.subtract(position, previous_position)))
+
+
+def test_restore_static_frames(test_maps):
+    # The static frame check continues from the thumbnail it had when the match was interrupted.
+    positions = [(400, 500)] * 3 + [(430, 520)] * 3
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+
+    full_match = PUBGISMatch(MockIterator(minimaps), game_map="first")
+    full_results = []
+    thumbnails = []
+    for _, timestamp, position in full_match.process_match():
+        full_results.append((timestamp, position))
+        thumbnails.append(full_match.last_processed_thumbnail)
+
+    restored_match = PUBGISMatch(MockIterator(minimaps[4:], first_timestamp=4), game_map="first")
+    restored_match.restore_state([position for _, position in full_results[:4]],
+                                 [timestamp for timestamp, _ in full_results[:4]],
+                                 last_processed_thumbnail=thumbnails[3])
+
+    assert restored_match.last_processed_position == full_results[3][1]
+    assert [(timestamp, position) for _, timestamp, position in restored_match.process_match()] \
+        == full_results[4:]
+
+
+def test_calculate_color_diffs(test_maps):
+    minimaps = np.array([create_minimap(test_maps["first"], position)
+                         for position in MINIMAP_POSITIONS] +
+                        [np.zeros((MINIMAP_SIZE, MINIMAP_SIZE, 3), np.uint8)])
+    masks = PUBGISMatch._create_masks(MINIMAP_SIZE)
+
+    assert np.allclose(Color.calculate_color_diffs(minimaps, *masks),
+                       [Color.calculate_color_diff(minimap, *masks) for minimap in minimaps])
+
+
+@pytest.mark.parametrize("batch_size, batch_workers", [(1, 1), (4, 2), (20, 4)])
+@pytest.mark.parametrize("tracking", [False, True])
+def test_process_match_batches(test_maps, batch_size, batch_workers, tracking):
+    positions = [(300 + 60 * i, 400 + 40 * i) for i in range(12)]
+    minimaps = [create_minimap(test_maps["first"], position) for position in positions]
+    for missed in (0, 5, 6):
+        minimaps[missed] = np.zeros_like(minimaps[missed])
+
+    expected_results = list(PUBGISMatch(MockIterator(minimaps),
+                                        game_map="first",
+                                        tracking=tracking).process_match())
+    results = list(PUBGISMatch(MockIterator(minimaps),
+                               game_map="first",
+                               tracking=tracking,
+                               batch_size=batch_size,
+                               batch_workers=batch_workers).process_match())
+
+    assert [position for _, _, position in expected_results].count(None) == 3
+    assert results == expected_results
+
+
+def test_process_batch_continues(test_maps):
+    # Batches continue from the state left by the previous batch.
+    positions = [(300 + 60 * i, 400 + 40 * i) for i in range(8)]
+    minimaps = np.array([create_minimap(test_maps["second"], position)
+                         for position in positions])
+    match = PUBGISMatch(MockIterator([]), game_map="second", batch_workers=2)
+
+    results = match.process_batch(minimaps[:4], list(range(4))) + \
+        match.process_batch(minimaps[4:], list(range(4, 8)))
+
+    assert match.last_known_position == results[-1]
+    for position, expected_position in zip(results, positions):
+        assert np.linalg.norm(np.subtract(position, expected_position)) < 5
+
+
+def test_match_cache_dir(test_maps, tmp_path):
+    # The full map is loaded from the cache_dir of the match, without changing the map_store of
+    # any GameMap.
+    match = PUBGISMatch(MockIterator([create_minimap(test_maps["third"], (500, 600))]),
+                        game_map="third",
+                        cache_dir=str(tmp_path / "cache"))
+
+    assert all(game_map.map_store is None for game_map in maps.MAPS.values())
+    assert isinstance(match.game_map.full_map, np.memmap)
+    assert np.array_equal(match.game_map.full_map, test_maps["third"])
+
+
+@pytest.mark.parametrize("map_name", TEST_MAP_NAMES)
+def test_pyramid_search(test_maps, map_name):
+    # The coarse search finds the same positions as searching the whole map at full scale.
+    positions = [(300, 300), (800, 1200), (1300, 400), (1250, 1300)]
+    results = {}
+
+    for pyramid_search in (False, True):
+        results[pyramid_search] = []
+        for position in positions:
+            minimap = create_minimap(test_maps[map_name], position)
+            match = PUBGISMatch(MockIterator([minimap]),
+                                game_map=map_name,
+                                pyramid_search=pyramid_search)
+            results[pyramid_search].extend(found for _, _, found in match.process_match())
+
+    assert results[True] == results[False]
+    for found, position in zip(results[True], positions):
+        assert np.linalg.norm(np.subtract(found, position)) < 5
+
+
+def test_pyramid_search_fallback(test_maps, monkeypatch):
+    # If none of the coarse candidates could be a match, the whole map is searched at full scale.
+    position = MINIMAP_POSITIONS[0]
+    match = PUBGISMatch(MockIterator([create_minimap(test_maps["first"], position)]),
+                        game_map="first")
+    match_context = match._match_context
+    context_slices = []
+
+    def _match_context(context_slice, gray_minimap):
+        context_slices.append(context_slice)
+        return match_context(context_slice, gray_minimap)
+
+    monkeypatch.setattr(match, "_perform_pyramid_matching",
+                        lambda gray_minimap: ((1000, 1000), min(TEMPLATE_MATCH_THRESHS)))
+    monkeypatch.setattr(match, "_match_context", _match_context)
+    results = [found for _, _, found in match.process_match()]
+
+    assert context_slices == [slice(None)]
+    assert np.linalg.norm(np.subtract(results[0], position)) < 5
@@ -0,0 +1,78 @@
+# pylint: disable=redefined-outer-name
+import csv
+import json
+
+import pytest
+
+from pubgis.match_stats import MatchStats, STAGES, FRAME_FIELDS
+
+
+@pytest.fixture
+def stats():
+    match_stats = MatchStats()
+
+    for i in range(10):
+        match_stats.start_frame()
+        match_stats.add_time("fetch", 0.001)
+        match_stats.add_time("static_check", 0.0001)
+        match_stats.record(static_frame=i == 9)
+        match_stats.add_time("color_diff", 0.002)
+        match_stats.record(full_map_search=i == 0, context_size=100 + i * 10)
+        match_stats.add_time("template_match", 0.01 * (i + 1))
+        match_stats.add_time("validation", 0.001)
+        match_stats.add_time("validation", 0.001)
+        match_stats.end_frame(timestamp=i, matched=i % 2 == 0, missed_frames=i % 2)
+
+    return match_stats
+
+
+def test_stats_frames(stats):
+    assert len(stats.frames) == 10
+    assert stats.frames[3]['timestamp'] == 3
+    assert stats.frames[3]['validation'] == pytest.approx(0.002)
+    assert stats.frames[3]['penalty'] == 0
+
+
+def test_stats_summary(stats):
+    summary = stats.summary()
+
+    assert summary['frames'] == 10
+    assert summary['matched_frames'] == 5
+    assert summary['static_frames'] == 1
+    assert summary['full_map_searches'] == 1
+    assert summary['max_missed_frames'] == 1
+    assert summary['mean_context_size'] == pytest.approx(145)
+    assert summary['stages']['template_match']['total'] == pytest.approx(0.55)
+    assert summary['stages']['template_match']['max'] == pytest.approx(0.1)
+    assert summary['stages']['fetch']['p50'] == pytest.approx(0.001)
+
+
+def test_stats_empty_summary():
+    summary = MatchStats().summary()
+
+    assert summary['frames'] == 0
+    assert summary['mean_context_size'] is None
+    assert summary['stages']['fetch']['total'] == 0
+
+
+def test_stats_json(stats, tmpdir):
+    json_file = str(tmpdir.join("stats.json"))
+    stats.output_json(json_file, include_frames=True)
+
+    with open(json_file) as json_input_file:
+        data = json.load(json_input_file)
+
+    assert data['frames'] == 10
+    assert set(data['stages']) == set(STAGES)
+    assert len(data['frame_details']) == 10
+
+
+def test_stats_csv(stats, tmpdir):
+    csv_file = str(tmpdir.join("stats.csv"))
+    stats.output_csv(csv_file)
+
+    with open(csv_file, newline='') as csv_input_file:
+        rows = list(csv.DictReader(csv_input_file))
+
+    assert len(rows) == 10
+    assert tuple(rows[0]) == FRAME_FIELDS + STAGES
@@ -0,0 +1,126 @@
+# pylint: disable=redefined-outer-name
+import pytest
+
+from pubgis import maps, parallel
+from pubgis.maps import GameMap
+from pubgis.match import PUBGISMatch
+from pubgis.minimap_iterators.video import VideoIterator
+from pubgis.parallel import SegmentedVideoMatch, split_segments, _positions_agree, \
+    _tracking_state, MIN_SEGMENT_STEPS, SEGMENT_AGREEMENT_DIST
+from tests.common_test_functions import create_test_video, create_video_positions, \
+    create_map_image, register_test_maps, start_method  # pylint: disable=unused-import
+
+TEST_VIDEO_FRAMES = 160
+
+
+@pytest.fixture(scope="module")
+def test_video(tmpdir_factory):
+    video_file = str(tmpdir_factory.mktemp("video").join("test_video.avi"))
+    create_test_video(video_file, create_map_image(0), create_video_positions(TEST_VIDEO_FRAMES))
+    return video_file
+
+
+@pytest.mark.parametrize("total_steps, num_segments, expected_segments", [
+    (100, 1, [(0, 100)]),
+    (100, 3, [(0, 33), (33, 66), (66, 100)]),
+    (MIN_SEGMENT_STEPS * 2, 4, [(0, MIN_SEGMENT_STEPS),
+                                (MIN_SEGMENT_STEPS, MIN_SEGMENT_STEPS * 2)]),
+    (MIN_SEGMENT_STEPS - 1, 4, [(0, MIN_SEGMENT_STEPS - 1)]),
+    (0, 2, [(0, 0)]),
+])
+def test_split_segments(total_steps, num_segments, expected_segments):
+    assert split_segments(total_steps, num_segments) == expected_segments
+
+
+@pytest.mark.parametrize("previous_positions, overlap_positions, agree", [
+    ([(100, 100), (110, 110)], [(100, 100), (110, 110)], True),
+    ([(100, 100), (110, 110)], [(100, 100), (110 + SEGMENT_AGREEMENT_DIST, 110)], True),
+    ([(100, 100), (110, 110)], [(100, 100), (111 + SEGMENT_AGREEMENT_DIST, 110)], False),
+    ([(100, 100), None], [None, (500, 500)], False),
+    ([(100, 100), None], [(100, 101), (500, 500)], True),
+    ([None, None], [None, (500, 500)], True),
+    ([(100, 100), None], [None, None], False),
+])
+def test_positions_agree(previous_positions, overlap_positions, agree):
+    assert _positions_agree(previous_positions, overlap_positions) == agree
+
+
+@pytest.mark.parametrize("positions, expected_state", [
+    ([], (None, 0)),
+    ([(100, 100), (110, 110)], ((110, 110), 0)),
+    ([(100, 100), None, None], ((100, 100), 2)),
+    ([None, None], (None, 0)),
+])
+def test_tracking_state(positions, expected_state):
+    assert _tracking_state(positions) == expected_state
+
+
+@pytest.mark.usefixtures("start_method")
+@pytest.mark.parametrize("segments", [2, 3])
+def test_segmented_match(tmp_path, monkeypatch, test_video, segments):
+    register_test_maps(str(tmp_path), monkeypatch)
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_STEPS", 5)
+
+    sequential = PUBGISMatch(VideoIterator(video_file=test_video, time_step=1),
+                             game_map="first",
+                             tracking=False)
+    expected_results = list(sequential.process_match())
+
+    segmented = SegmentedVideoMatch(test_video,
+                                    time_step=1,
+                                    processes=2,
+                                    segments=segments,
+                                    game_map="first",
+                                    tracking=False)
+    results = list(segmented.process_match())
+
+    assert len(segmented.segments) == segments
+    assert [position for _, _, position in expected_results].count(None) == 2
+    assert [(timestamp, position) for _, timestamp, position in results] == \
+        [(timestamp, position) for _, timestamp, position in expected_results]
+
+
+@pytest.mark.usefixtures("start_method")
+def test_segmented_reprocess(tmp_path, monkeypatch, test_video):
+    # If the overlap doesn't agree, the segment is processed again from the last known position
+    # of the previous segment, which gives the same result as processing it sequentially.
+    register_test_maps(str(tmp_path), monkeypatch)
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_STEPS", 5)
+    monkeypatch.setattr(parallel, "_positions_agree", lambda previous, overlap: False)
+
+    expected_results = list(PUBGISMatch(VideoIterator(video_file=test_video, time_step=1),
+                                        game_map="first",
+                                        tracking=False).process_match())
+    results = list(SegmentedVideoMatch(test_video,
+                                       time_step=1,
+                                       processes=2,
+                                       segments=2,
+                                       game_map="first",
+                                       tracking=False).process_match())
+
+    assert [position for _, _, position in results] == \
+        [position for _, _, position in expected_results]
+
+
+@pytest.mark.usefixtures("start_method")
+def test_segmented_custom_map(tmp_path, monkeypatch, test_video):
+    # A GameMap that isn't registered can be used as well.
+    register_test_maps(str(tmp_path), monkeypatch)
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_STEPS", 5)
+    first_map = maps.MAPS["first"]
+    custom_map = GameMap("custom", first_map.map_file, first_map.land_mask_file)
+
+    expected_results = list(PUBGISMatch(VideoIterator(video_file=test_video, time_step=1),
+                                        game_map="first",
+                                        tracking=False).process_match())
+    segmented = SegmentedVideoMatch(test_video,
+                                    time_step=1,
+                                    processes=2,
+                                    segments=2,
+                                    game_map=custom_map,
+                                    tracking=False)
+    results = list(segmented.process_match())
+
+    assert segmented.game_map is custom_map
+    assert [position for _, _, position in results] == \
+        [position for _, _, position in expected_results]
@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+import pytest
+
+from pubgis.minimap_iterators.generic import GenericIterator
+from pubgis.minimap_iterators.prefetch import PrefetchIterator
+
+
+class MockIterator(GenericIterator):
+    def __init__(self, count, fail_at=None):
+        super().__init__()
+        self.size = 255
+        self.time_step = 1
+        self.count = count
+        self.fail_at = fail_at
+        self.produced = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.check_for_stop()
+
+        if self.produced == self.fail_at:
+            raise OSError("mock read failure")
+
+        if self.produced >= self.count:
+            raise StopIteration
+
+        self.produced += 1
+        return self.produced * 100 / self.count, self.produced - 1, self.produced - 1
+
+
+def test_prefetch_order():
+    mock_iter = MockIterator(50)
+    assert list(PrefetchIterator(mock_iter)) == list(MockIterator(50))
+
+
+def test_prefetch_attributes():
+    prefetch_iter = PrefetchIterator(MockIterator(5))
+    assert prefetch_iter.size == 255
+    assert prefetch_iter.time_step == 1
+
+
+def test_prefetch_exception():
+    prefetch_iter = PrefetchIterator(MockIterator(10, fail_at=5))
+    results = []
+
+    with pytest.raises(OSError):
+        for _, _, minimap in prefetch_iter:
+            results.append(minimap)
+
+    assert results == [0, 1, 2, 3, 4]
+
+
+def test_prefetch_backpressure():
+    mock_iter = MockIterator(100)
+    prefetch_iter = iter(PrefetchIterator(mock_iter, max_prefetch=4))
+    next(prefetch_iter)
+    time.sleep(0.2)
+
+    # 1 consumed, 4 in the queue and 1 waiting to be put in the queue
+    assert mock_iter.produced <= 6
+
+
+def test_prefetch_stop():
+    mock_iter = MockIterator(100)
+    prefetch_iter = PrefetchIterator(mock_iter, max_prefetch=4)
+    results = []
+
+    for _, _, minimap in prefetch_iter:
+        results.append(minimap)
+        if minimap == 10:
+            prefetch_iter.stop()
+
+    assert results == list(range(11))
+    assert mock_iter.stop_requested
+
+    prefetch_iter.producer.join(timeout=1)
+    assert not prefetch_iter.producer.is_alive()
+
+
+class MockBufferIterator(MockIterator):
+    def __init__(self, count):
+        super().__init__(count)
+        self.reuses_buffer = True
+
+    def __next__(self):
+        percent, timestamp, minimap = super().__next__()
+        return percent, timestamp, self.copy_to_minimap_buffer(np.full((4, 4), minimap))
+
+
+def test_prefetch_copies_buffer():
+    minimaps = [minimap for _, _, minimap in PrefetchIterator(MockBufferIterator(20))]
+    assert [int(minimap[0, 0]) for minimap in minimaps] == list(range(20))
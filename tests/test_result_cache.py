@@ -0,0 +1,92 @@
+# pylint: disable=redefined-outer-name
+import os
+
+import pytest
+
+from pubgis import result_cache
+from pubgis.result_cache import ResultCache, create_result_key, fingerprint_video
+
+POSITIONS = [(100, 200), None, (110, 205), (120, 210)]
+TIMESTAMPS = [0, 1, 2, 3]
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(bytes(range(256)) * 4096)
+    return str(video_path)
+
+
+def test_result_cache_round_trip(tmp_path, video_file):
+    cache = ResultCache(str(tmp_path / "results"))
+    key = create_result_key(video_file, time_step=1, game_map="auto")
+
+    assert cache.load(key) is None
+
+    cache.store(key, POSITIONS, TIMESTAMPS, "miramar")
+
+    assert cache.load(key) == (POSITIONS, TIMESTAMPS, "miramar")
+
+
+
+def test_result_cache_without_map(tmp_path, video_file):
+    # An entry that doesn't record the map can't be used.
+    cache = ResultCache(str(tmp_path / "results"))
+    key = create_result_key(video_file, time_step=1, game_map="auto")
+    cache.store(key, POSITIONS, TIMESTAMPS, None)
+
+    assert cache.load(key) is None
+
+@pytest.mark.parametrize("parameters", [{'time_step': 2, 'game_map': "auto"},
+                                        {'time_step': 1, 'game_map': "erangel"},
+                                        {'time_step': 1}])
+def test_result_key_parameters(video_file, parameters):
+    assert create_result_key(video_file, **parameters) != \
+        create_result_key(video_file, time_step=1, game_map="auto")
+
+
+def test_result_key_video(tmp_path, video_file):
+    key = create_result_key(video_file, time_step=1)
+
+    # The fingerprint depends on the contents, not the name of the video.
+    copied_file = str(tmp_path / "copied.mp4")
+    with open(video_file, 'rb') as original, open(copied_file, 'wb') as copy:
+        copy.write(original.read())
+    assert create_result_key(copied_file, time_step=1) == key
+
+    with open(video_file, 'r+b') as changed_video:
+        changed_video.write(b"changed")
+    assert create_result_key(video_file, time_step=1) != key
+
+
+def test_result_key_version(video_file, monkeypatch):
+    key = create_result_key(video_file, time_step=1)
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_VERSION", result_cache.RESULT_CACHE_VERSION + 1)
+
+    assert create_result_key(video_file, time_step=1) != key
+
+
+def test_fingerprint_small_video(tmp_path):
+    video_path = tmp_path / "small.mp4"
+    video_path.write_bytes(b"small")
+
+    assert fingerprint_video(str(video_path)) != fingerprint_video(__file__)
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "results"))
+    for i, key in enumerate(["first", "second", "third"]):
+        cache.store(key, POSITIONS, TIMESTAMPS, "miramar")
+        os.utime(cache.get_entry_file(key), (i, i))
+
+    entry_size = os.path.getsize(cache.get_entry_file("first"))
+
+    # Loading an entry makes it the most recently used.
+    assert cache.load("first") is not None
+
+    cache.max_size = 2 * entry_size
+    cache.evict()
+
+    assert cache.load("second") is None
+    assert cache.load("first") is not None
+    assert cache.load("third") is not None
@@ -1,7 +1,10 @@
+import cv2
+import numpy as np
 import pytest
 
 from pubgis.support import find_path_bounds, coordinate_sum, unscale_coords, coordinate_offset, \
-    create_slice, get_coords_from_slices
+    create_slice, get_coords_from_slices, find_template_match_peaks, distance_penalty, \
+    create_penalty_kernel, update_path_extent, find_line_bounds
 
 FIND_PATH_BOUND_CASES = [
     # no coordinates should return full map size
@@ -111,3 +114,95 @@ GET_COORDS_TEST_CASES = [
 @pytest.mark.parametrize("expected_coords, slice_tuple", GET_COORDS_TEST_CASES)
 def test_get_coords_from_slices(expected_coords, slice_tuple):
     assert get_coords_from_slices(slice_tuple) == expected_coords
+
+
+def _peak_test_match(peaks):
+    template_match = np.zeros((100, 100), np.float32)
+    for (x_coord, y_coord), value in peaks:
+        template_match[y_coord, x_coord] = value
+    return template_match
+
+
+FIND_PEAKS_TEST_CASES = [
+    ([((10, 20), 0.9)], 1, 10, [(10, 20)]),
+    ([((10, 20), 0.5), ((80, 70), 0.9)], 2, 10, [(80, 70), (10, 20)]),
+    ([((10, 20), 0.5), ((80, 70), 0.9)], 1, 10, [(80, 70)]),
+
+    # peaks close to each other should be suppressed in favor of the better one
+    ([((10, 20), 0.9), ((12, 21), 0.8), ((60, 60), 0.7)], 2, 10, [(10, 20), (60, 60)]),
+
+    # peaks near the edges must not wrap around when suppressed
+    ([((0, 0), 0.9), ((99, 99), 0.8)], 2, 10, [(0, 0), (99, 99)]),
+]
+
+
+@pytest.mark.parametrize("peaks, count, suppression_size, expected_peaks", FIND_PEAKS_TEST_CASES)
+def test_find_template_match_peaks(peaks, count, suppression_size, expected_peaks):
+    template_match = _peak_test_match(peaks)
+    assert find_template_match_peaks(template_match, count, suppression_size) == expected_peaks
+
+
+DISTANCE_PENALTY_CASES = [
+    (np.arange(10), np.arange(10)),
+    (np.arange(10) - 5, np.arange(10) - 2),
+    (np.arange(12) - 3, np.arange(7) - 20),
+]
+
+
+@pytest.mark.parametrize("x_distances, y_distances", DISTANCE_PENALTY_CASES)
+def test_distance_penalty(x_distances, y_distances):
+    x_grid, y_grid = np.meshgrid(x_distances, y_distances)
+    expected = np.sqrt(np.sqrt(x_grid ** 2 + y_grid ** 2)) / 1000
+
+    penalty = distance_penalty(x_distances, y_distances)
+
+    assert penalty.dtype == np.float32
+    assert penalty.shape == (len(y_distances), len(x_distances))
+    assert np.allclose(penalty, expected)
+
+
+@pytest.mark.parametrize("radius", [0, 1, 5, 100])
+def test_create_penalty_kernel(radius):
+    kernel = create_penalty_kernel(radius)
+
+    assert kernel.shape == (2 * radius + 1, 2 * radius + 1)
+    assert kernel[radius, radius] == 0
+    assert np.allclose(kernel, kernel.T)
+    assert np.allclose(kernel, kernel[::-1, ::-1])
+
+
+PATH_EXTENT_CASES = [
+    [None],
+    [None, None],
+    [(500, 500)],
+    [(600, 600), (700, 1200)],
+    [None, (300, 300), None, (1300, 300), (800, 20)],
+    [(5079, 2000), (10, 3000), (2000, 5079)],
+]
+
+
+@pytest.mark.parametrize("positions", PATH_EXTENT_CASES)
+def test_update_path_extent(positions):
+    extent = None
+    for position in positions:
+        extent = update_path_extent(extent, position)
+
+    assert find_path_bounds(5079, list(extent) if extent else None) == \
+        find_path_bounds(5079, positions)
+
+
+@pytest.mark.parametrize("start, end, thickness", [((50, 50), (60, 70), 5),
+                                                   ((60, 70), (50, 50), 1),
+                                                   ((0, 0), (3, 99), 9),
+                                                   ((90, 10), (99, 99), 12),
+                                                   ((40, 40), (40, 40), 3)])
+def test_find_line_bounds(start, end, thickness):
+    test_map = np.zeros((100, 100), dtype=np.uint8)
+    cv2.line(test_map, start, end, color=255, thickness=thickness, lineType=cv2.LINE_AA)
+
+    line_bounds = find_line_bounds(start, end, thickness, len(test_map))
+    outside_bounds = np.copy(test_map)
+    outside_bounds[line_bounds] = 0
+
+    assert np.any(test_map[line_bounds])
+    assert not np.any(outside_bounds)
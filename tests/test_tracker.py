@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from pubgis.tracker import AlphaBetaTracker, TRACKER_MIN_UPDATES, TRACKER_MIN_ERROR_RATE
+
+
+def _track(positions, time_step=1):
+    tracker = AlphaBetaTracker()
+    for i, position in enumerate(positions):
+        if position is None:
+            tracker.miss()
+        else:
+            tracker.update(position, i * time_step)
+    return tracker
+
+
+@pytest.mark.parametrize("updates", range(TRACKER_MIN_UPDATES))
+def test_no_prediction_too_early(updates):
+    tracker = _track([(100 + 10 * i, 200) for i in range(updates)])
+    assert tracker.predict(updates) is None
+
+
+@pytest.mark.parametrize("velocity", [(0, 0), (10, 0), (-20, 35), (120, -80)])
+@pytest.mark.parametrize("time_step", [0.5, 1, 2])
+def test_constant_velocity(velocity, time_step):
+    positions = [(1000 + velocity[0] * i * time_step, 1000 + velocity[1] * i * time_step)
+                 for i in range(6)]
+    tracker = _track(positions, time_step)
+
+    position, radius = tracker.predict(6 * time_step)
+
+    assert np.allclose(position, (1000 + velocity[0] * 6 * time_step,
+                                  1000 + velocity[1] * 6 * time_step))
+    assert radius == pytest.approx(TRACKER_MIN_ERROR_RATE * time_step)
+
+
+def test_radius_grows_with_time():
+    tracker = _track([(100 + 10 * i, 100) for i in range(5)])
+
+    _, radius = tracker.predict(5)
+    _, later_radius = tracker.predict(8)
+
+    assert later_radius == pytest.approx(radius * 4)
+
+
+def test_radius_grows_with_errors():
+    steady_tracker = _track([(100 + 10 * i, 100) for i in range(8)])
+    erratic_tracker = _track([(100 + 10 * i, 100 + (i % 2) * 60) for i in range(8)])
+
+    _, steady_radius = steady_tracker.predict(8)
+    _, erratic_radius = erratic_tracker.predict(8)
+
+    assert erratic_radius > steady_radius
+
+
+def test_miss_requires_new_updates():
+    positions = [(100 + 10 * i, 100) for i in range(5)] + [None]
+    tracker = _track(positions)
+    assert tracker.predict(6) is None
+
+    for i in range(6, 6 + TRACKER_MIN_UPDATES):
+        assert tracker.predict(i) is None
+        tracker.update((100 + 10 * i, 100), i)
+
+    position, _ = tracker.predict(6 + TRACKER_MIN_UPDATES)
+    assert np.allclose(position, (100 + 10 * (6 + TRACKER_MIN_UPDATES), 100), atol=1)
+
+
+def test_no_prediction_for_past():
+    tracker = _track([(100 + 10 * i, 100) for i in range(5)])
+    assert tracker.predict(None) is None
+    assert tracker.predict(4) is None
+    assert tracker.last_measurement == (140, 100)
@@ -0,0 +1,174 @@
+# pylint: disable=redefined-outer-name
+from functools import lru_cache
+
+import cv2
+import numpy as np
+import pytest
+
+from pubgis.minimap_iterators.video import VideoIterator, FrameSkip, MIN_SEEK_FRAMES
+
+TEST_VIDEO_FPS = 10
+TEST_VIDEO_FRAMES = 40
+TEST_VIDEO_SIZE = (1920, 1080)
+# Long enough that FrameSkip.AUTO seeks when resuming near the end.
+LONG_VIDEO_FRAMES = MIN_SEEK_FRAMES + 50
+
+# The frame number is split into two flat colors, above and below FRAME_SPLIT_ROW, which is in
+# the middle of the minimap (at the 8 pixel block boundary of MJPG).
+FRAME_SPLIT_ROW = 920
+FRAME_COLORS = 64
+
+
+def _create_video(video_file, frames):
+    # Each frame of the video is flat colors, so the minimap can be used to tell which frame of
+    # the video it came from.
+    writer = cv2.VideoWriter(video_file,
+                             cv2.VideoWriter_fourcc(*'MJPG'),
+                             TEST_VIDEO_FPS,
+                             TEST_VIDEO_SIZE)
+
+    for i in range(frames):
+        frame = np.full(TEST_VIDEO_SIZE[::-1] + (3,), (i % FRAME_COLORS) * 4, np.uint8)
+        frame[FRAME_SPLIT_ROW:] = (i // FRAME_COLORS) * 4
+        writer.write(frame)
+
+    writer.release()
+    return video_file
+
+
+@pytest.fixture(scope="module")
+def test_video(tmpdir_factory):
+    return _create_video(str(tmpdir_factory.mktemp("video").join("test_video.avi")),
+                         TEST_VIDEO_FRAMES)
+
+
+@pytest.fixture(scope="module")
+def long_test_video(tmpdir_factory):
+    return _create_video(str(tmpdir_factory.mktemp("video").join("long_test_video.avi")),
+                         LONG_VIDEO_FRAMES)
+
+
+def _frame_number(minimap):
+    # Rows near FRAME_SPLIT_ROW are left out, in case they are blurred together.
+    quarter = len(minimap) // 4
+    return int(round(np.mean(minimap[:quarter]) / 4)) + \
+        int(round(np.mean(minimap[-quarter:]) / 4)) * FRAME_COLORS
+
+
+def _iterate(video_iter):
+    return [(timestamp, _frame_number(minimap)) for _, timestamp, minimap in video_iter]
+
+
+@lru_cache(maxsize=None)
+def _iterate_uninterrupted(video_file, landing_time, time_step, death_time):
+    return _iterate(VideoIterator(video_file=video_file,
+                                  landing_time=landing_time,
+                                  time_step=time_step,
+                                  death_time=death_time,
+                                  frame_skip=FrameSkip.GRAB))
+
+
+VIDEO_ITER_CASES = [
+    (0, 1, 0),
+    (0, 0.1, 0),
+    (2, 0.5, 0),
+    (1.5, 1, 4),
+]
+
+
+@pytest.mark.parametrize("frame_skip", [FrameSkip.GRAB, FrameSkip.SEEK, FrameSkip.AUTO])
+@pytest.mark.parametrize("landing_time, time_step, death_time", VIDEO_ITER_CASES)
+def test_video_iterator_frames(test_video, frame_skip, landing_time, time_step, death_time):
+    video_iter = VideoIterator(video_file=test_video,
+                               landing_time=landing_time,
+                               time_step=time_step,
+                               death_time=death_time,
+                               frame_skip=frame_skip)
+
+    step_frames = max(int(time_step * TEST_VIDEO_FPS), 1)
+    landing_frame = int(landing_time * TEST_VIDEO_FPS)
+    death_frame = int(death_time * TEST_VIDEO_FPS) if death_time else TEST_VIDEO_FRAMES
+    expected_frames = list(range(landing_frame, death_frame - 1, step_frames))
+
+    assert _iterate(video_iter) == [((frame - landing_frame) / TEST_VIDEO_FPS, frame)
+                                    for frame in expected_frames]
+
+
+def test_video_iterator_seek_used(test_video):
+    video_iter = VideoIterator(video_file=test_video,
+                               landing_time=2,
+                               frame_skip=FrameSkip.SEEK)
+    _iterate(video_iter)
+    assert video_iter.frame_skip_used == FrameSkip.SEEK
+
+
+def test_video_iterator_grab_used(test_video):
+    video_iter = VideoIterator(video_file=test_video,
+                               landing_time=2,
+                               frame_skip=FrameSkip.GRAB)
+    _iterate(video_iter)
+    assert video_iter.frame_skip_used == FrameSkip.GRAB
+
+
+def test_video_inaccurate_seek(test_video, monkeypatch):
+    video_iter = VideoIterator(video_file=test_video,
+                               landing_time=2,
+                               frame_skip=FrameSkip.SEEK)
+    monkeypatch.setattr(video_iter, "_is_frame_time_correct", lambda frame_number: False)
+
+    assert _iterate(video_iter)[:2] == [(0, 20), (1, 30)]
+    assert video_iter.frame_skip_used == FrameSkip.GRAB
+
+
+def test_video_adaptive_step(test_video):
+    # The time step doubles while the player doesn't move, up to max_time_step, and drops back
+    # to time_step when the player isn't found or moves quickly.
+    video_iter = VideoIterator(video_file=test_video,
+                               time_step=0.1,
+                               max_time_step=1,
+                               frame_skip=FrameSkip.GRAB)
+    movements = [(0, 0.1), (0, 0.2), (0, 0.4), (0, 0.8), (0, 1), (None, None), (5, 0.1),
+                 (500, 0.2)]
+    results = []
+
+    for (_, timestamp, minimap), movement in zip(video_iter, movements):
+        results.append((timestamp, _frame_number(minimap)))
+        video_iter.report_movement(*movement)
+
+    assert results == [(0, 0), (0.2, 2), (0.6, 6), (1.4, 14), (2.4, 24), (3.4, 34), (3.5, 35),
+                       (3.7, 37)]
+    assert video_iter.current_time_step == 0.1
+
+    with pytest.raises(ValueError):
+        VideoIterator(video_file=test_video, time_step=1, max_time_step=0.5)
+
+
+@pytest.mark.parametrize("frame_skip", [FrameSkip.GRAB, FrameSkip.SEEK, FrameSkip.AUTO])
+@pytest.mark.parametrize("landing_time, time_step, death_time, resume_index", [
+    (0, 0.3, 4, 2),
+    (1.5, 0.5, 4, 2),
+    # With FrameSkip.AUTO, these seek to the frame after the step from the resumed one.
+    (0, 1, 0, 26),
+    (26, 0.5, 0, 2),
+])
+def test_video_iterator_resume(long_test_video,  # pylint: disable=too-many-arguments
+                               frame_skip,
+                               landing_time,
+                               time_step,
+                               death_time,
+                               resume_index):
+    full_results = _iterate_uninterrupted(long_test_video, landing_time, time_step, death_time)
+
+    video_iter = VideoIterator(video_file=long_test_video,
+                               landing_time=landing_time,
+                               time_step=time_step,
+                               death_time=death_time,
+                               frame_skip=frame_skip)
+    frame_number = video_iter.get_frame_number(full_results[resume_index][0])
+    video_iter.resume_after(frame_number)
+
+    assert frame_number == full_results[resume_index][1]
+    assert _iterate(video_iter) == full_results[resume_index + 1:]
+    if frame_skip == FrameSkip.AUTO and frame_number >= MIN_SEEK_FRAMES:
+        assert video_iter.frame_skip_used == FrameSkip.SEEK
+        assert video_iter.seek_accurate